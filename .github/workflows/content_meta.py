@@ -1,10 +1,17 @@
 import os
+import sys
 import json
 import gspread
 import requests
 import gdown
 from oauth2client.service_account import ServiceAccountCredentials
 
+# Shared helpers live in the repo root
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+from sheet_io import SheetWriteBuffer
+from video_cache import VIDEO_CACHE, cache_key_for_url
+from streaming_upload import post_multipart
+
 SHEET_NAME = "Content_Sheet" # <--- Content Sheet
 
 # Placeholder IDs (આ આપણે પછી શીટમાં અથવા સિક્રેટમાં મેનેજ કરીશું)
@@ -35,6 +42,7 @@ def main():
     # --- 2. FIND ONE PENDING POST ---
     rows = sheet.get_all_records()
     post_processed = False
+    writer = SheetWriteBuffer(sheet)
 
     for i, row in enumerate(rows):
         row_num = i + 2
@@ -49,7 +57,7 @@ def main():
             insta_id = CONTENT_IDS.get(account_name)
             if not insta_id or insta_id == "PAGE_ID_HERE":
                 print(f"❌ ID Missing for {account_name}")
-                sheet.update_cell(row_num, 8, "ID ERROR")
+                writer.update_cell(row_num, 8, "ID ERROR")
                 continue
 
             video_url = row.get('Video URL', '')
@@ -62,13 +70,19 @@ def main():
             access_token = os.environ.get('FB_ACCESS_TOKEN')
             if not access_token:
                 print("❌ Secret Missing: FB_ACCESS_TOKEN")
+                writer.flush()
                 return
 
-            temp_file = "content_reel.mp4"
-            sheet.update_cell(row_num, 8, "Downloading...")
+            writer.update_cell(row_num, 8, "Downloading...")
+            writer.flush() # Claim the row before the long download
             
             try:
-                gdown.download(video_url, temp_file, quiet=False, fuzzy=True)
+                # Shared cache: the same Drive reel is downloaded once for every platform
+                temp_file = VIDEO_CACHE.fetch(
+                    cache_key_for_url(video_url),
+                    lambda dest: bool(gdown.download(video_url, dest, quiet=False, fuzzy=True)),
+                )
+                if not temp_file: raise Exception("Download failed")
                 
                 # Upload Logic (Simple Reels)
                 url = f"https://graph.facebook.com/v19.0/{insta_id}/media"
@@ -77,10 +91,9 @@ def main():
                     'caption': final_caption,
                     'media_type': 'REELS'
                 }
-                files = {'video_file': open(temp_file, 'rb')}
                 
                 # Upload
-                response = requests.post(url, params=params, files=files).json()
+                response = post_multipart(requests, url, 'video_file', temp_file, params=params).json()
                 creation_id = response.get('id')
                 
                 if creation_id:
@@ -90,25 +103,25 @@ def main():
                     pub_res = requests.post(pub_url, params=pub_params).json()
                     
                     if pub_res.get('id'):
-                        sheet.update_cell(row_num, 8, "DONE")
+                        writer.update_cell(row_num, 8, "DONE")
                         print("✅ Posted Successfully!")
                     else:
                         print(f"❌ Publish Error: {pub_res}")
-                        sheet.update_cell(row_num, 8, "PUB ERROR")
+                        writer.update_cell(row_num, 8, "PUB ERROR")
                 else:
                     print(f"❌ Upload Error: {response}")
-                    sheet.update_cell(row_num, 8, "UPLOAD ERROR")
-
-                if os.path.exists(temp_file): os.remove(temp_file)
+                    writer.update_cell(row_num, 8, "UPLOAD ERROR")
                 
                 post_processed = True
                 break # <--- એક પોસ્ટ કરીને અટકી જશે
 
             except Exception as e:
                 print(f"❌ Error: {e}")
-                sheet.update_cell(row_num, 8, "ERROR")
+                writer.update_cell(row_num, 8, "ERROR")
                 break
 
+    writer.flush()
+
     if not post_processed:
         print("😴 No pending posts for Content Meta.")
 
@@ -1,4 +1,5 @@
 import os
+import sys
 import json
 import gspread
 import requests
@@ -6,7 +7,12 @@ import gdown
 from oauth2client.service_account import ServiceAccountCredentials
 from google.oauth2.credentials import Credentials
 from googleapiclient.discovery import build
-from googleapiclient.http import MediaFileUpload
+
+# Shared helpers live in the repo root
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+from sheet_io import SheetWriteBuffer
+from video_cache import VIDEO_CACHE, cache_key_for_url
+from youtube_resume import resumable_insert, has_pending_upload
 
 # --- CONFIGURATION ---
 SHEET_NAME = "Content_Sheet"  # <--- આ અલગ શીટ છે
@@ -32,14 +38,18 @@ def main():
     # --- 2. FIND ONE PENDING POST ---
     rows = sheet.get_all_records()
     post_processed = False
+    writer = SheetWriteBuffer(sheet)
 
     for i, row in enumerate(rows):
         row_num = i + 2
         platform = str(row.get('Platform', '')).strip().lower()
         status = str(row.get('Status', '')).strip().upper()
         
+        # Rows left mid-run with a journaled session were cut off mid-upload: resume them
+        resumable = status in ("DOWNLOADING...", "UPLOADING...") and has_pending_upload(f"{SHEET_NAME}:{row_num}")
+
         # Check: YouTube & PENDING
-        if "youtube" in platform and status == "PENDING":
+        if "youtube" in platform and (status == "PENDING" or resumable):
             account_name = str(row.get('Account Name', '')).strip()
             print(f"🚀 Processing: {account_name} (Row {row_num})")
             
@@ -47,28 +57,35 @@ def main():
             title = row.get('Caption', 'Relaxing ASMR')
             tags = row.get('Tags', '#ASMR #Shorts')
 
-            temp_file = "content_video.mp4"
-            sheet.update_cell(row_num, 8, "Downloading...")
+            writer.update_cell(row_num, 8, "Downloading...")
+            writer.flush() # Claim the row before the long download
             
             try:
                 # Download
-                if "drive" in video_url:
-                    gdown.download(video_url, temp_file, quiet=False, fuzzy=True)
-                else:
-                    with open(temp_file, 'wb') as f:
+                def _download(dest):
+                    if "drive" in video_url:
+                        return bool(gdown.download(video_url, dest, quiet=False, fuzzy=True))
+                    with open(dest, 'wb') as f:
                         f.write(requests.get(video_url).content)
+                    return True
+
+                # Shared cache: the same Drive reel is downloaded once for every platform
+                temp_file = VIDEO_CACHE.fetch(cache_key_for_url(video_url), _download)
+                if not temp_file: raise Exception("Download failed")
                 
                 # YouTube Login (From Secret)
                 token_env = os.environ.get('YOUTUBE_TOKEN_JSON')
                 if not token_env:
                     print("❌ Secret Missing: YOUTUBE_TOKEN_JSON")
+                    writer.flush()
                     return
 
                 creds_yt = Credentials.from_authorized_user_info(json.loads(token_env))
                 youtube = build('youtube', 'v3', credentials=creds_yt)
                 
                 # Upload Logic
-                sheet.update_cell(row_num, 8, "Uploading...")
+                writer.update_cell(row_num, 8, "Uploading...")
+                writer.flush() # A killed upload must leave "Uploading..." behind to be resumed
                 description = f"{title}\n\nSubscribe for more satisfying videos!\n\n{tags}"
 
                 body = {
@@ -81,29 +98,24 @@ def main():
                     'status': {'privacyStatus': 'public'}
                 }
                 
-                media = MediaFileUpload(temp_file, chunksize=-1, resumable=True)
-                req = youtube.videos().insert(part=",".join(body.keys()), body=body, media_body=media)
-                
-                resp = None
-                while resp is None:
-                    stat, resp = req.next_chunk()
-                    if stat: print(f"Uploading... {int(stat.progress()*100)}%")
+                # Chunked + journaled: a killed run continues from the last acked byte
+                resp = resumable_insert(youtube, body, temp_file, f"{SHEET_NAME}:{row_num}", part=",".join(body.keys()))
                 
                 # Success
-                sheet.update_cell(row_num, 8, "DONE")
-                sheet.update_cell(row_num, 9, f"https://youtu.be/{resp['id']}")
+                writer.update_cell(row_num, 8, "DONE")
+                writer.update_cell(row_num, 9, f"https://youtu.be/{resp['id']}")
                 print(f"✅ Success! Video ID: {resp['id']}")
                 
-                if os.path.exists(temp_file): os.remove(temp_file)
-                
                 post_processed = True
                 break # <--- મહત્વનું: એક પોસ્ટ કરીને અટકી જશે
 
             except Exception as e:
                 print(f"❌ Error: {e}")
-                sheet.update_cell(row_num, 8, f"ERROR: {e}")
+                writer.update_cell(row_num, 8, f"ERROR: {e}")
                 break
 
+    writer.flush()
+
     if not post_processed:
         print("😴 No pending posts for Content YouTube.")
 
@@ -0,0 +1,153 @@
+import os
+import time
+import sqlite3
+import threading
+from run_state import state_path
+
+# ==============================================================================
+# 📊 AGE-DECAYED ANALYTICS SCHEDULE (FRESH POSTS OFTEN, OLD POSTS DAILY)
+# ==============================================================================
+
+# (post younger than, refresh at most every) in seconds. 0 = every run.
+REFRESH_TIERS = [
+    (3600, 0),                                                      # First hour: every run
+    (86400, int(os.environ.get("ANALYTICS_HOURLY_MIN", "60")) * 60),  # First day: hourly
+]
+REFRESH_OLD = int(os.environ.get("ANALYTICS_DAILY_HOURS", "24")) * 3600  # After that: daily
+
+# Posts not seen in the sheet for this long (row deleted) are dropped
+FORGET_AFTER = 7 * 86400
+
+# Posts that come back without numbers (deleted video, unknown brand, API
+# error) are retried after 1h, 2h, 4h... at most daily, and given up on
+# after this many empty refreshes in a row
+MISS_BACKOFF = 3600
+MAX_MISSES = int(os.environ.get("ANALYTICS_MAX_MISSES", "10"))
+
+def post_key(link):
+    """
+    Stable key for a posted link: "yt:<video id>" or "fb:<video id>".
+    None for links we don't pull numbers for.
+    """
+    link = str(link or "").strip()
+    if "youtu.be" in link or "youtube.com" in link:
+        if "v=" in link:
+            vid = link.split("v=")[1].split("&")[0]
+        else:
+            vid = link.rstrip("/").split("/")[-1].split("?")[0]
+        return f"yt:{vid}" if vid else None
+    if "facebook.com" in link and "/videos/" in link:
+        vid = link.split("/videos/")[1].split("?")[0].replace("/", "")
+        return f"fb:{vid}" if vid else None
+    return None
+
+def refresh_interval(age, misses=0):
+    """How often a post of this age (seconds, None = unknown) should be refreshed"""
+    if misses: return min(MISS_BACKOFF * 2 ** (misses - 1), REFRESH_OLD)
+    if age is None: return REFRESH_OLD
+    for younger_than, every in REFRESH_TIERS:
+        if age < younger_than: return every
+    return REFRESH_OLD
+
+class AnalyticsSchedule:
+    """
+    Per-post refresh bookkeeping in SQLite. The bot tells it when it posts
+    something (posted), asks which sheet links are due (due), and reports
+    what it refreshed (refreshed) or asked for without getting numbers
+    back (missed). Posts the bot didn't make itself have no known post time
+    and are treated as old, i.e. refreshed once a day.
+    """
+
+    def __init__(self, bot, path=None):
+        self.bot = bot
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path or state_path("analytics.db"), check_same_thread=False, isolation_level=None)
+        self.db.row_factory = sqlite3.Row
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS posts (
+                bot TEXT, key TEXT,
+                posted_at REAL, last_refreshed REAL, last_seen REAL,
+                misses INTEGER DEFAULT 0,
+                PRIMARY KEY (bot, key)
+            )
+        """)
+        # analytics.db files from before misses were tracked
+        if "misses" not in [r["name"] for r in self.db.execute("PRAGMA table_info(posts)")]:
+            self.db.execute("ALTER TABLE posts ADD COLUMN misses INTEGER DEFAULT 0")
+        self.db.execute(
+            "DELETE FROM posts WHERE bot = ? AND last_seen < ?", (self.bot, time.time() - FORGET_AFTER)
+        )
+
+    def posted(self, link, when=None):
+        """A post just went live: refreshed every run for its first hour"""
+        key = post_key(link)
+        if not key: return
+        now = when or time.time()
+        with self.lock:
+            self.db.execute(
+                """INSERT INTO posts (bot, key, posted_at, last_refreshed, last_seen) VALUES (?, ?, ?, 0, ?)
+                   ON CONFLICT (bot, key) DO UPDATE SET posted_at = excluded.posted_at, last_seen = excluded.last_seen""",
+                (self.bot, key, now, now),
+            )
+
+    def due(self, keys, now=None):
+        """The subset of keys whose refresh interval has passed (unknown keys are due)"""
+        now = now or time.time()
+        keys = list(dict.fromkeys(k for k in keys if k))
+        if not keys: return set()
+        with self.lock:
+            known = {}
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                rows = self.db.execute(
+                    f"SELECT * FROM posts WHERE bot = ? AND key IN ({','.join('?' * len(chunk))})", [self.bot] + chunk
+                ).fetchall()
+                known.update((r["key"], r) for r in rows)
+            self.db.executemany(
+                """INSERT INTO posts (bot, key, posted_at, last_refreshed, last_seen) VALUES (?, ?, NULL, 0, ?)
+                   ON CONFLICT (bot, key) DO UPDATE SET last_seen = excluded.last_seen""",
+                [(self.bot, k, now) for k in keys],
+            )
+
+        due = set()
+        for key in keys:
+            row = known.get(key)
+            if row is None:
+                due.add(key)
+                continue
+            if row["misses"] >= MAX_MISSES: continue
+            age = now - row["posted_at"] if row["posted_at"] else None
+            if now - row["last_refreshed"] >= refresh_interval(age, row["misses"]):
+                due.add(key)
+        return due
+
+    def refreshed(self, keys, now=None):
+        now = now or time.time()
+        with self.lock:
+            self.db.executemany(
+                "UPDATE posts SET last_refreshed = ?, misses = 0 WHERE bot = ? AND key = ?",
+                [(now, self.bot, k) for k in keys],
+            )
+
+    def missed(self, keys, now=None):
+        """Asked for these but got no numbers: back off, and retire after MAX_MISSES"""
+        now = now or time.time()
+        with self.lock:
+            self.db.executemany(
+                "UPDATE posts SET last_refreshed = ?, misses = misses + 1 WHERE bot = ? AND key = ?",
+                [(now, self.bot, k) for k in keys],
+            )
+
+    def next_due(self):
+        """Epoch when the next tracked post needs a refresh, None if nothing is tracked"""
+        now = time.time()
+        with self.lock:
+            rows = self.db.execute(
+                "SELECT posted_at, last_refreshed, misses FROM posts WHERE bot = ? AND misses < ?", (self.bot, MAX_MISSES)
+            ).fetchall()
+        times = [
+            r["last_refreshed"] + refresh_interval(now - r["posted_at"] if r["posted_at"] else None, r["misses"])
+            for r in rows
+        ]
+        return min(times) if times else None
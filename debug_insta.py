@@ -1,7 +1,7 @@
 import os
 import requests
-import time
 from dotenv import load_dotenv
+from graph_api import wait_for_container, get_container_status
 
 # 1. Load Secrets form .env file
 load_dotenv()
@@ -59,19 +59,15 @@ def debug_instagram_upload():
     creation_id = r.json().get('id')
     print(f"✅ Success! Container ID: {creation_id}")
     
-    # 3. Wait for Processing
-    print("⏳ Waiting 30 seconds for processing...")
-    for i in range(30, 0, -1):
-        print(f"{i}...", end="\r")
-        time.sleep(1)
-    print("\n")
+    # 3. Wait for Processing (polls status_code instead of a fixed countdown)
+    print("⏳ Waiting for processing...")
+    result = wait_for_container(creation_id, ACCESS_TOKEN, domain="https://graph.facebook.com/v18.0")
     
     # 4. Check Status
-    status_url = f"https://graph.facebook.com/v18.0/{creation_id}?fields=status_code,status&access_token={ACCESS_TOKEN}"
-    stat = requests.get(status_url).json()
-    print(f"📊 Processing Status: {stat.get('status_code')} ({stat.get('status')})")
+    status_code, status = get_container_status(creation_id, ACCESS_TOKEN, domain="https://graph.facebook.com/v18.0")
+    print(f"📊 Processing Status: {status_code} ({status})")
     
-    if stat.get('status_code') == 'ERROR':
+    if result != "FINISHED":
         print("❌ Video Processing Failed. Instagram doesn't like this video format.")
         return
 
@@ -0,0 +1,98 @@
+import os
+import time
+import random
+import threading
+
+# ==============================================================================
+# 🚦 RATE-LIMITED DM DISPATCH (TOKEN BUCKET PER IG ACCOUNT + THROTTLE RETRIES)
+# ==============================================================================
+
+# Meta allows about 750 private replies to comments per IG account per hour.
+# The bucket refills at (DM_PER_HOUR - DM_BURST) an hour, so even a full burst
+# up front keeps any hour at DM_PER_HOUR. A webhook and a poller running as
+# separate processes each have their own bucket: split the budget between them.
+DM_PER_HOUR = int(os.environ.get("DM_PER_HOUR", "750"))
+DM_BURST = int(os.environ.get("DM_BURST", "10"))
+DM_RATE = float(os.environ.get("DM_RATE_PER_SEC") or max(DM_PER_HOUR - DM_BURST, 1) / 3600)
+
+# Comments answered in parallel (the buckets still hold each account to DM_RATE)
+DM_WORKERS = int(os.environ.get("DM_WORKERS", "8"))
+DM_RETRIES = int(os.environ.get("DM_RETRIES", "4"))
+
+# HTTP 429 + Graph "slow down" codes: app / user / page / messaging rate limits
+THROTTLE_CODES = {429, 4, 17, 32, 613}
+
+# Errors no retry fixes: no permission / private reply window closed or already
+# used (10), comment gone or invalid (100), user can't be messaged (551)
+PERMANENT_DM_CODES = {10, 100, 551}
+
+class TokenBucket:
+    """
+    Thread-safe token bucket: `rate` tokens a second, up to `burst` saved up.
+    pause() empties it for a while, so every thread sending for the same
+    account backs off together after a throttle error.
+    """
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.capacity = max(1, burst)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Blocks until a token is free"""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + max(0, now - self.updated) * self.rate)
+                self.updated = max(self.updated, now)
+                # The epsilon stops float rounding (0.9999999...) from spinning on sub-ns sleeps
+                if self.tokens >= 1 - 1e-9 and now >= self.updated:
+                    self.tokens = max(0.0, self.tokens - 1)
+                    return
+                wait = max(self.updated - now, (1 - self.tokens) / self.rate)
+            time.sleep(wait)
+
+    def pause(self, seconds):
+        with self.lock:
+            self.tokens = 0
+            self.updated = max(self.updated, time.monotonic() + seconds)
+
+class DMDispatcher:
+    """
+    Wraps a send(ig_id, comment_id, text) -> Graph response function with a
+    per-account TokenBucket and backoff retries on throttle errors. Other
+    errors (and exceptions, where the DM may already have gone out) are
+    returned as they are. Shared by the polling scan and dm_webhook.py.
+    """
+
+    def __init__(self, send, rate=DM_RATE, burst=DM_BURST, retries=DM_RETRIES):
+        self._send = send
+        self.rate = rate
+        self.burst = burst
+        self.retries = retries
+        self.lock = threading.Lock()
+        self.buckets = {}
+
+    def bucket(self, ig_id):
+        with self.lock:
+            if ig_id not in self.buckets:
+                self.buckets[ig_id] = TokenBucket(self.rate, self.burst)
+            return self.buckets[ig_id]
+
+    def send(self, ig_id, comment_id, text):
+        bucket = self.bucket(ig_id)
+        for attempt in range(self.retries + 1):
+            bucket.acquire()
+            try:
+                result = self._send(ig_id, comment_id, text)
+            except Exception as e:
+                return {"error": {"message": str(e)}}
+            code = (result.get("error") or {}).get("code")
+            if code not in THROTTLE_CODES or attempt == self.retries:
+                return result
+            delay = min(2 ** attempt * 5, 120) * random.uniform(1, 1.5)
+            print(f"      ⏳ {ig_id} throttled (code {code}), retry {attempt + 1}/{self.retries} in {delay:.0f}s...")
+            bucket.pause(delay)
+        return result
@@ -0,0 +1,126 @@
+import os
+import re
+import sys
+import json
+import time
+import random
+
+# ==============================================================================
+# 🎯 AUTO-DM KEYWORD RULES (ONE COMPILED REGEX PER BRAND, WHOLE WORDS ONLY)
+# ==============================================================================
+
+# Used by every brand unless DM_RULES_JSON says otherwise
+DEFAULT_KEYWORDS = [
+    # English
+    "buy", "link", "links", "shop", "price", "prices", "order", "want", "pp", "interested",
+    "how much",
+    # Hindi / Gujarati typed in English
+    "kitna", "kitne", "kimat", "keemat", "daam", "bhav", "kharidna", "chahiye", "joiye", "levu",
+    # Hindi (Devanagari)
+    "लिंक", "कीमत", "दाम", "खरीदना", "चाहिए", "ऑर्डर",
+    # Gujarati
+    "લિંક", "કિંમત", "ભાવ", "ખરીદવું", "જોઈએ", "ઓર્ડર",
+]
+DEFAULT_TEMPLATE = "Hey {username}! 👋 Here is the link you asked for: {link}"
+
+# Indic letters + vowel signs (matras are not \w in Python's re, so a plain
+# \b would split "कीमत" in the middle). Devanagari through Sinhala.
+_WORD_CHARS = r"\w\u0900-\u0DFF"
+
+def compile_keywords(keywords):
+    """
+    One regex for a whole keyword list, matching whole words only
+    ("PP" no longer fires inside "happy"). Longest keywords go first so
+    "how much" wins over "how", spaces match any run of whitespace.
+    """
+    words = sorted({k.strip().lower() for k in keywords if k and k.strip()}, key=len, reverse=True)
+    if not words: return None
+    alternatives = "|".join(r"\s+".join(re.escape(part) for part in w.split()) for w in words)
+    # Word edges by hand: \b would treat Indic vowel signs as word breaks
+    return re.compile(rf"(?:^|[^{_WORD_CHARS}])(?P<keyword>{alternatives})(?![{_WORD_CHARS}])", re.IGNORECASE)
+
+class DMRules:
+    """
+    Per-brand keyword sets and message templates.
+    rules = {"*": {"keywords": [...], "template": "..."}, "BRAND": {...}}
+    A brand entry replaces the "*" keywords unless it sets "extend": true,
+    a missing template falls back to "*" and then DEFAULT_TEMPLATE.
+    Templates can use {username}, {link} and {brand}.
+    """
+
+    def __init__(self, rules=None):
+        rules = {k.strip().upper(): v for k, v in (rules or {}).items()}
+        base = rules.pop("*", {})
+        self.default_keywords = base.get("keywords", DEFAULT_KEYWORDS)
+        self.default_template = base.get("template", DEFAULT_TEMPLATE)
+        self.default_pattern = compile_keywords(self.default_keywords)
+
+        self.patterns = {}
+        self.templates = {}
+        for brand, rule in rules.items():
+            if "keywords" in rule:
+                keywords = rule["keywords"] + (self.default_keywords if rule.get("extend") else [])
+                self.patterns[brand] = compile_keywords(keywords)
+            if "template" in rule:
+                self.templates[brand] = rule["template"]
+
+    @classmethod
+    def from_env(cls):
+        """DM_RULES_JSON (inline JSON or a path to a .json file), defaults if unset"""
+        raw = os.environ.get("DM_RULES_JSON", "").strip()
+        if not raw: return cls()
+        try:
+            if not raw.startswith("{"):
+                with open(raw, "r", encoding="utf-8") as f: raw = f.read()
+            return cls(json.loads(raw))
+        except Exception as e:
+            print(f"⚠️ DM_RULES_JSON Error, using default keywords: {e}")
+            return cls()
+
+    def match(self, brand, text):
+        """The keyword found in the comment (lowercase), or None"""
+        pattern = self.patterns.get((brand or "").strip().upper(), self.default_pattern)
+        found = pattern.search(text or "") if pattern else None
+        return found.group("keyword").lower() if found else None
+
+    def message(self, brand, username, link):
+        template = self.templates.get((brand or "").strip().upper(), self.default_template)
+        return template.format(username=username, link=link, brand=brand)
+
+# ==============================================================================
+# 📏 THROUGHPUT BENCHMARK: python dm_rules.py --bench [COMMENTS]
+# ==============================================================================
+
+def _bench(count):
+    filler = ["nice", "wow", "happy", "shopping", "ordered", "super", "🔥", "😍", "love", "beautiful",
+              "bahu saras", "mast", "sundar", "सुंदर", "सुपर", "સરસ", "ખૂબ", "wanted", "upper", "linking"]
+    asks = ["buy", "LINK?", "price pls", "kitna ka hai", "कीमत बताओ", "કિંમત શું છે", "how  much", "PP", "order kaise kare"]
+    rng = random.Random(7)
+    comments = []
+    for _ in range(count):
+        words = rng.sample(filler, 3)
+        if rng.random() < 0.2: words.insert(rng.randrange(4), rng.choice(asks))
+        comments.append(" ".join(words))
+
+    old_keywords = ["BUY", "LINK", "SHOP", "PRICE", "ORDER", "WANT", "PP", "INTERESTED"]
+    all_keywords = [k.upper() for k in DEFAULT_KEYWORDS]
+    rules = DMRules()
+
+    def run(label, matches):
+        started = time.perf_counter()
+        hits = sum(1 for c in comments if matches(c))
+        secs = time.perf_counter() - started
+        print(f"   {label:<34}: {hits:>8,} matches  {count / secs:>12,.0f} comments/s")
+
+    print(f"💬 {count:,} comments")
+    run(f"Substring loop, old {len(old_keywords)} keywords", lambda c: any(k in c.upper() for k in old_keywords))
+    run(f"Substring loop, {len(all_keywords)} keywords", lambda c: any(k in c.upper() for k in all_keywords))
+    run(f"Compiled rules, {len(all_keywords)} keywords", lambda c: rules.match("ANY", c))
+    print("   (Substring matches include words like 'happy', 'shopping', 'upper')")
+
+if __name__ == "__main__":
+    if "--bench" in sys.argv:
+        counts = [int(a) for a in sys.argv[1:] if a.isdigit()] or [200000]
+        for n in counts: _bench(n)
+    else:
+        print("Usage: python dm_rules.py --bench [COMMENTS ...]")
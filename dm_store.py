@@ -0,0 +1,208 @@
+import time
+import sqlite3
+import threading
+from datetime import datetime
+from run_state import state_path
+
+# ==============================================================================
+# 💬 AUTO-DM STATE (PER-MEDIA COMMENT HIGH-WATER MARKS)
+# ==============================================================================
+
+class DMStore:
+    """
+    SQLite state for the auto-DM scan (.bot_state/dm.db).
+    Per IG media it remembers the comments_count and the newest comment
+    timestamp already handled, so a run only asks for comments on media
+    whose count moved, and only reads them down to that timestamp. A burst
+    bigger than one run's page budget leaves a resume cursor instead: the
+    next run carries on from there, the mark moves up only once caught up.
+    It also holds every comment ID already answered (primary-key lookups
+    instead of scanning the DM_Logs column), see DMLogMirror for the sheet.
+    """
+
+    def __init__(self, path=None):
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path or state_path("dm.db"), check_same_thread=False, isolation_level=None)
+        self.db.row_factory = sqlite3.Row
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.executescript("""
+            CREATE TABLE IF NOT EXISTS media (
+                media_id TEXT PRIMARY KEY, ig_id TEXT, shortcode TEXT,
+                comments_count INTEGER, last_comment_ts TEXT,
+                updated REAL, resume_after TEXT, resume_newest TEXT
+            );
+            CREATE TABLE IF NOT EXISTS replied (
+                comment_id TEXT PRIMARY KEY, username TEXT, message TEXT,
+                sent_at TEXT, mirrored INTEGER DEFAULT 0
+            );
+            CREATE INDEX IF NOT EXISTS replied_unmirrored ON replied (mirrored);
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+        """)
+        # dm.db files from before resume cursors
+        columns = [r["name"] for r in self.db.execute("PRAGMA table_info(media)")]
+        for column in ("resume_after", "resume_newest"):
+            if column not in columns: self.db.execute(f"ALTER TABLE media ADD COLUMN {column} TEXT")
+
+    def media_marks(self, media_ids):
+        """{media_id: {"comments_count", "last_comment_ts", ...}} for the media we have seen"""
+        media_ids = list(media_ids)
+        found = {}
+        with self.lock:
+            for start in range(0, len(media_ids), 500):
+                chunk = media_ids[start:start + 500]
+                rows = self.db.execute(
+                    f"SELECT * FROM media WHERE media_id IN ({','.join('?' * len(chunk))})", chunk
+                ).fetchall()
+                found.update((r["media_id"], dict(r)) for r in rows)
+        return found
+
+    def advance(self, ig_id, media_id, shortcode, comments_count, last_comment_ts=None,
+                resume_after=None, resume_newest=None):
+        """
+        Everything up to last_comment_ts on this media has been handled.
+        resume_after = Graph cursor of older comments still to read (None = caught up),
+        resume_newest = the mark to move to once they are.
+        """
+        with self.lock:
+            self.db.execute(
+                """INSERT INTO media VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                   ON CONFLICT (media_id) DO UPDATE SET
+                       comments_count = excluded.comments_count,
+                       last_comment_ts = MAX(COALESCE(last_comment_ts, ''), COALESCE(excluded.last_comment_ts, '')),
+                       updated = excluded.updated,
+                       resume_after = excluded.resume_after, resume_newest = excluded.resume_newest""",
+                (media_id, ig_id, shortcode, comments_count, last_comment_ts, time.time(), resume_after, resume_newest),
+            )
+
+    def shortcode(self, media_id):
+        """Shortcode of a media seen by an earlier scan, else None"""
+        with self.lock:
+            found = self.db.execute("SELECT shortcode FROM media WHERE media_id = ?", (media_id,)).fetchone()
+        return found["shortcode"] if found else None
+
+    # ==========================================================================
+    # ✅ DEDUP INDEX (SOURCE OF TRUTH FOR "ALREADY REPLIED", DM_Logs IS A MIRROR)
+    # ==========================================================================
+
+    def log_rows_synced(self):
+        """DM_Logs data rows already imported by import_logged()"""
+        with self.lock:
+            found = self.db.execute("SELECT value FROM meta WHERE key = 'log_rows_synced'").fetchone()
+        return int(found["value"]) if found else 0
+
+    def import_logged(self, comment_ids, rows_synced):
+        """
+        Comment IDs found in DM_Logs (answered by this bot, or by a webhook /
+        poller with its own dm.db) count as replied and mirrored.
+        rows_synced = how many DM_Logs data rows have been read so far.
+        """
+        with self.lock:
+            self.db.execute("BEGIN")
+            try:
+                cur = self.db.executemany(
+                    "INSERT OR IGNORE INTO replied (comment_id, mirrored) VALUES (?, 1)",
+                    [(c,) for c in comment_ids if c],
+                )
+                self.db.execute("INSERT OR REPLACE INTO meta VALUES ('log_rows_synced', ?)", (str(rows_synced),))
+                self.db.execute("COMMIT")
+            except Exception:
+                self.db.execute("ROLLBACK")
+                raise
+            return max(cur.rowcount, 0)
+
+    def replied_among(self, comment_ids):
+        """The subset of comment_ids that already got a DM (or are being sent one)"""
+        comment_ids = list(comment_ids)
+        found = set()
+        with self.lock:
+            for start in range(0, len(comment_ids), 500):
+                chunk = comment_ids[start:start + 500]
+                found.update(r[0] for r in self.db.execute(
+                    f"SELECT comment_id FROM replied WHERE comment_id IN ({','.join('?' * len(chunk))})", chunk
+                ))
+        return found
+
+    def claim_reply(self, comment_id, username):
+        """
+        Reserves a comment before its DM goes out (mirrored = -1 until
+        confirm_reply). False if it was already answered or another worker
+        holds it. A run killed mid-send keeps the claim, so no second DM.
+        """
+        with self.lock:
+            cur = self.db.execute(
+                "INSERT OR IGNORE INTO replied VALUES (?, ?, 'Sending', ?, -1)",
+                (comment_id, username, str(datetime.now())),
+            )
+            return cur.rowcount == 1
+
+    def confirm_reply(self, comment_id, message="Sent", sent_at=None):
+        """The claimed DM went out, the row can now be mirrored to DM_Logs"""
+        with self.lock:
+            self.db.execute(
+                "UPDATE replied SET message = ?, sent_at = ?, mirrored = 0 WHERE comment_id = ? AND mirrored = -1",
+                (message, sent_at or str(datetime.now()), comment_id),
+            )
+
+    def release_reply(self, comment_id):
+        """The send failed: drop the claim so a later scan can try again"""
+        with self.lock:
+            self.db.execute("DELETE FROM replied WHERE comment_id = ? AND mirrored = -1", (comment_id,))
+
+    def unmirrored(self, limit=500):
+        with self.lock:
+            return [dict(r) for r in self.db.execute(
+                "SELECT * FROM replied WHERE mirrored = 0 ORDER BY rowid LIMIT ?", (limit,)
+            )]
+
+    def mark_mirrored(self, comment_ids):
+        with self.lock:
+            self.db.executemany("UPDATE replied SET mirrored = 1 WHERE comment_id = ?", [(c,) for c in comment_ids])
+
+# ==============================================================================
+# 🪞 DM_Logs MIRROR (BATCHED append_rows FROM A BACKGROUND THREAD)
+# ==============================================================================
+
+class DMLogMirror:
+    """
+    Copies new replies from DMStore to the DM_Logs tab every `interval`
+    seconds with one append_rows per batch, so sending DMs never waits on
+    the sheet. Rows that fail to go out stay unmirrored and are retried on
+    the next flush (or the next run). stop() does a final flush.
+    """
+
+    def __init__(self, store, log_sheet, interval=5, batch_size=500):
+        self.store = store
+        self.log_sheet = log_sheet
+        self.interval = interval
+        self.batch_size = batch_size
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self._run, name="dm-log-mirror", daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def _run(self):
+        while not self.stop_event.wait(self.interval):
+            self.flush()
+        self.flush()
+
+    def flush(self):
+        """Sends everything unmirrored. Returns False if the sheet refused."""
+        while True:
+            rows = self.store.unmirrored(self.batch_size)
+            if not rows: return True
+            try:
+                self.log_sheet.append_rows(
+                    [[r["comment_id"], r["username"], r["message"], r["sent_at"]] for r in rows],
+                    value_input_option="RAW",
+                )
+            except Exception as e:
+                print(f"      ⚠️ DM_Logs Mirror Error (will retry): {e}")
+                return False
+            self.store.mark_mirrored(r["comment_id"] for r in rows)
+            print(f"      🪞 DM_Logs: {len(rows)} rows mirrored.")
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread.is_alive(): self.thread.join()
@@ -0,0 +1,288 @@
+import os
+import sys
+import hmac
+import json
+import time
+import queue
+import signal
+import hashlib
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+from urllib.request import Request, urlopen
+import master_bot as mb
+from dm_store import DMStore, DMLogMirror
+from dm_dispatch import DMDispatcher, DM_WORKERS
+from graph_api import fetch_objects
+from run_state import state_path
+
+# ==============================================================================
+# 📡 INSTAGRAM COMMENT WEBHOOK (DMs IN SECONDS, POLLING STAYS AS BACKUP)
+# ==============================================================================
+# Meta app -> Webhooks -> Instagram -> subscribe to "comments", callback URL
+# pointing here. The normal master_bot.py DM scan keeps running and picks up
+# anything the webhook missed. Best run next to `master_bot.py --daemon` on
+# the same machine / volume (same BOT_STATE_DIR): one dm.db, nobody gets the
+# DM twice. A poller elsewhere (e.g. the GH Actions cron with its own cached
+# dm.db) learns about webhook replies from DM_Logs, imported every run, so
+# only a comment answered in the few seconds before the mirror flushes can be
+# tried twice (Meta refuses a second private reply, see PERMANENT_DM_CODES: it
+# is logged, not retried). This server re-reads DM_Logs the same way.
+#
+#   python dm_webhook.py                     # serve on DM_WEBHOOK_PORT
+#   python dm_webhook.py --dry-run           # same, but print DMs instead of sending
+#   python dm_webhook.py --send-test-event   # signed fake comment to a running server
+
+APP_SECRET = os.environ.get("FB_APP_SECRET", "")
+VERIFY_TOKEN = os.environ.get("DM_WEBHOOK_VERIFY_TOKEN", "")
+PORT = int(os.environ.get("DM_WEBHOOK_PORT", "8080"))
+
+# Product links (and DM_Logs rows from other pollers) come from the sheet, re-read at most this often
+PRODUCT_MAP_TTL = int(os.environ.get("PRODUCT_MAP_TTL_MIN", "10")) * 60
+
+def sign(body, secret=None):
+    """X-Hub-Signature-256 value Meta sends for this body"""
+    secret = APP_SECRET if secret is None else secret
+    return "sha256=" + hmac.new(secret.encode("utf-8"), body, hashlib.sha256).hexdigest()
+
+def signature_ok(body, header, secret=None):
+    secret = APP_SECRET if secret is None else secret
+    if not secret or not header: return False
+    return hmac.compare_digest(sign(body, secret), header)
+
+def comment_events(payload):
+    """Webhook payload -> [(ig_id, comment, media_id)] for every new comment in it"""
+    events = []
+    if payload.get("object") != "instagram": return events
+    for entry in payload.get("entry", []):
+        ig_id = str(entry.get("id", ""))
+        for change in entry.get("changes", []):
+            value = change.get("value") or {}
+            if change.get("field") != "comments" or not value.get("id"): continue
+            sender = value.get("from") or {}
+            # The account's own comments (e.g. replies) come back as events too
+            if str(sender.get("id", "")) == ig_id: continue
+            comment = {"id": value["id"], "text": value.get("text", ""), "username": sender.get("username", "Unknown")}
+            events.append((ig_id, comment, (value.get("media") or {}).get("id")))
+    return events
+
+def dry_run_send(ig_id, comment_id, text):
+    print(f"      🧪 DRY RUN: would DM comment {comment_id} from {ig_id}: {text}")
+    return {"recipient_id": "dry-run"}
+
+# ==============================================================================
+# 👷 WORKER (HTTP THREAD ONLY ENQUEUES, DMs GO OUT HERE)
+# ==============================================================================
+
+class CommentWorker:
+    """
+    Answers queued webhook comments with master_bot.handle_comment, the
+    same keyword/dedup/send logic the polling scan uses. Meta wants a 200
+    within seconds, so the request handler never waits on Graph calls.
+    `threads` workers drain the queue, `send` (a DMDispatcher.send) keeps
+    every account under its rate limit however big the burst.
+    """
+
+    def __init__(self, store, sheet=None, send=None, threads=DM_WORKERS, log_sheet=None):
+        self.store = store
+        self.sheet = sheet
+        self.log_sheet = log_sheet
+        self.send = send or mb.DM_DISPATCH.send
+        self.queue = queue.Queue()
+        self.lock = threading.Lock()  # Product map / shortcode cache refreshes
+        self.brands = {str(c["ig_id"]): brand for brand, c in mb.BRAND_CONFIG.items() if c.get("ig_id")}
+        self._products = {}
+        self._products_at = 0
+        self._shortcodes = {}
+        self.threads = [
+            threading.Thread(target=self._run, name=f"dm-webhook-worker-{n}", daemon=True)
+            for n in range(max(1, threads))
+        ]
+
+    def start(self):
+        for thread in self.threads: thread.start()
+        return self
+
+    def stop(self):
+        for _ in self.threads: self.queue.put(None)
+        for thread in self.threads: thread.join()
+
+    def product_map(self):
+        with self.lock:
+            if self.sheet is not None and time.time() - self._products_at >= PRODUCT_MAP_TTL:
+                try:
+                    self._products = mb.load_product_map(self.sheet)
+                    print(f"   📊 Loaded {len(self._products)} products from sheet.")
+                except Exception as e:
+                    print(f"   ⚠️ Sheet Read Error (keeping old product map): {e}")
+                # Replies a poller with its own dm.db sent since the last look
+                if self.log_sheet is not None: mb.sync_dm_store(self.store, self.log_sheet)
+                self._products_at = time.time()
+            return self._products
+
+    def shortcode(self, media_id):
+        """Events carry the media ID, the product map is keyed by shortcode"""
+        if not media_id: return None
+        if media_id not in self._shortcodes:
+            code = self.store.shortcode(media_id)
+            if not code:
+                found = fetch_objects([media_id], "shortcode", mb.IG_ACCESS_TOKEN, session=mb.HTTP)
+                code = found.get(media_id, {}).get("shortcode")
+            if not code: return None  # Not cached, so the next event asks again
+            self._shortcodes[media_id] = code
+        return self._shortcodes[media_id]
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            if item is None: break
+            ig_id, comment, media_id = item
+            try:
+                brand = self.brands.get(ig_id)
+                if not brand:
+                    print(f"   ⚠️ Comment for unknown IG account {ig_id}, ignored.")
+                    continue
+                mb.handle_comment(self.store, brand, ig_id, comment, self.shortcode(media_id), self.product_map(), send=self.send)
+            except Exception as e:
+                print(f"   ⚠️ Webhook Comment Error: {e}")
+            finally:
+                self.queue.task_done()
+
+# ==============================================================================
+# 🌐 HTTP RECEIVER
+# ==============================================================================
+
+def make_handler(worker):
+    class WebhookHandler(BaseHTTPRequestHandler):
+        def _reply(self, code, text):
+            body = text.encode("utf-8")
+            self.send_response(code)
+            self.send_header("Content-Type", "text/plain")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            """Meta's subscription check: echo hub.challenge if the verify token matches"""
+            query = parse_qs(urlparse(self.path).query)
+            if (query.get("hub.mode") == ["subscribe"] and VERIFY_TOKEN
+                    and hmac.compare_digest(query.get("hub.verify_token", [""])[0], VERIFY_TOKEN)):
+                print("   ✅ Webhook subscription verified.")
+                self._reply(200, query.get("hub.challenge", [""])[0])
+            else:
+                self._reply(403, "Forbidden")
+
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+            if not signature_ok(body, self.headers.get("X-Hub-Signature-256")):
+                print("   ⛔ Webhook with bad signature rejected.")
+                self._reply(401, "Bad signature")
+                return
+            try:
+                payload = json.loads(body)
+            except ValueError:
+                self._reply(400, "Bad JSON")
+                return
+            events = comment_events(payload)
+            for event in events: worker.queue.put(event)
+            if events: print(f"   📥 {len(events)} comment event(s) queued.")
+            self._reply(200, "EVENT_RECEIVED")
+
+        def log_message(self, format, *args):
+            pass  # We print our own one-liners above
+
+    return WebhookHandler
+
+def serve(port=PORT, dry_run=False):
+    if not APP_SECRET:
+        print("❌ FB_APP_SECRET is not set, can't verify webhook signatures.")
+        return 1
+    if not VERIFY_TOKEN:
+        print("⚠️ DM_WEBHOOK_VERIFY_TOKEN is not set, Meta's subscription check will fail.")
+
+    # Dry runs get their own dedup DB so fake DMs never block real ones
+    store = DMStore(state_path("dm_dryrun.db")) if dry_run else mb.get_dm_store()
+    sheet, _ = mb.get_services()
+    mirror = log_sheet = None
+    if sheet is None:
+        print("⚠️ No sheet connection, every DM uses the default store link.")
+    elif not dry_run:
+        log_sheet = mb.get_dm_log_sheet(sheet)
+        if not mb.sync_dm_store(store, log_sheet): return 1
+        mirror = DMLogMirror(store, log_sheet).start()
+
+    # Dry runs still go through a dispatcher, so rate limiting shows up in local tests
+    send = DMDispatcher(dry_run_send).send if dry_run else mb.DM_DISPATCH.send
+    worker = CommentWorker(store, sheet, send=send, log_sheet=log_sheet).start()
+    server = ThreadingHTTPServer(("", port), make_handler(worker))
+
+    def _stop(signum, frame):
+        print(f"🛑 Signal {signum} received, stopping webhook...")
+        threading.Thread(target=server.shutdown).start()
+
+    signal.signal(signal.SIGTERM, _stop)
+    signal.signal(signal.SIGINT, _stop)
+
+    print(f"📡 DM webhook listening on :{port}{' (DRY RUN)' if dry_run else ''}")
+    server.serve_forever()
+    server.server_close()
+    worker.stop()
+    if mirror: mirror.stop()
+    print("👋 Webhook stopped.")
+    return 0
+
+# ==============================================================================
+# 🧪 STAND-IN EVENT SENDER (LOCAL TESTING)
+# ==============================================================================
+
+def send_test_event(url, ig_id, text, media_id, username="test_user"):
+    """POSTs a signed comment event shaped like Meta's to a running receiver"""
+    if not APP_SECRET:
+        print("❌ Set FB_APP_SECRET (same value as the server) so the event can be signed.")
+        return 1
+    comment_id = f"test_{int(time.time() * 1000)}"
+    payload = {
+        "object": "instagram",
+        "entry": [{
+            "id": ig_id,
+            "time": int(time.time()),
+            "changes": [{
+                "field": "comments",
+                "value": {
+                    "id": comment_id,
+                    "text": text,
+                    "from": {"id": "test_sender", "username": username},
+                    "media": {"id": media_id, "media_product_type": "REELS"},
+                },
+            }],
+        }],
+    }
+    body = json.dumps(payload).encode("utf-8")
+    request = Request(url, data=body, method="POST", headers={
+        "Content-Type": "application/json",
+        "X-Hub-Signature-256": sign(body),
+    })
+    try:
+        with urlopen(request, timeout=10) as r:
+            print(f"📨 Test comment {comment_id} sent: {r.status} {r.read().decode()}")
+        return 0
+    except Exception as e:
+        print(f"❌ Test Event Failed: {e}")
+        return 1
+
+if __name__ == "__main__":
+    first_ig = next((c["ig_id"] for c in mb.BRAND_CONFIG.values() if c.get("ig_id")), "")
+    parser = argparse.ArgumentParser(description="Instagram comment webhook for auto-DMs")
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--dry-run", action="store_true", help="Print DMs instead of sending them")
+    parser.add_argument("--send-test-event", action="store_true", help="Send a signed fake comment to --url and exit")
+    parser.add_argument("--url", help="Receiver URL for --send-test-event (default: this machine, --port)")
+    parser.add_argument("--ig-id", default=first_ig, help="IG account the fake comment is on")
+    parser.add_argument("--media-id", default="test_media")
+    parser.add_argument("--text", default="BUY please")
+    args = parser.parse_args()
+
+    if args.send_test_event:
+        sys.exit(send_test_event(args.url or f"http://127.0.0.1:{args.port}/", args.ig_id, args.text, args.media_id))
+    sys.exit(serve(args.port, args.dry_run))
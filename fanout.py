@@ -0,0 +1,48 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+# ==============================================================================
+# 🌐 FAN-OUT PUBLISHING (ONE VIDEO -> ALL TARGETS IN PARALLEL)
+# ==============================================================================
+
+# Max uploads running at once per platform (shared by every fan-out in the process)
+PLATFORM_LIMITS = {
+    "Instagram": int(os.environ.get("IG_MAX_PARALLEL", "3")),
+    "Facebook": int(os.environ.get("FB_MAX_PARALLEL", "2")),
+    "Youtube": int(os.environ.get("YT_MAX_PARALLEL", "2")),
+}
+
+_semaphores = {}
+_semaphores_lock = threading.Lock()
+
+def _platform_slot(platform):
+    with _semaphores_lock:
+        if platform not in _semaphores:
+            _semaphores[platform] = threading.BoundedSemaphore(max(1, PLATFORM_LIMITS.get(platform, 1)))
+        return _semaphores[platform]
+
+def _run_target(target):
+    with _platform_slot(target["platform"]):
+        try:
+            return target["upload"]()
+        except Exception as e:
+            print(f"      ❌ {target['platform']} Exception: {e}")
+            return target.get("failed")
+
+def fan_out(targets):
+    """
+    Runs every target's upload() concurrently, within the per-platform limits.
+    targets = [{"key": ..., "platform": "Instagram", "upload": fn, "failed": (False, "", 0)}]
+    Returns {key: upload result}, so callers can report back to the right row.
+    """
+    if not targets: return {}
+    if len(targets) == 1:
+        return {targets[0]["key"]: _run_target(targets[0])}
+
+    results = {}
+    with ThreadPoolExecutor(max_workers=len(targets)) as pool:
+        futures = {pool.submit(_run_target, t): t["key"] for t in targets}
+        for future in as_completed(futures):
+            results[futures[future]] = future.result()
+    return results
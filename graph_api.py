@@ -0,0 +1,469 @@
+import os
+import json
+import time
+import base64
+import hashlib
+import threading
+import requests
+from collections import namedtuple
+from urllib.parse import urlencode
+from run_state import load_state, save_state, state_path
+
+try:
+    from cryptography.fernet import Fernet, InvalidToken  # Optional: only for the on-disk token cache
+except ImportError:
+    Fernet = None
+
+# ==============================================================================
+# 📡 SHARED GRAPH API HELPERS (META: INSTAGRAM + FACEBOOK)
+# ==============================================================================
+
+GRAPH_DOMAIN = "https://graph.facebook.com/v19.0"
+
+# Hard limit for one reel's server-side processing before we give up
+IG_PROCESSING_TIMEOUT = int(os.environ.get("IG_PROCESSING_TIMEOUT", "240"))
+
+# 1 = upload every due reel first, then publish them as IG finishes processing
+IG_BATCH_PUBLISH = os.environ.get("IG_BATCH_PUBLISH", "1") == "1"
+
+# 1 = FB videos go up in resumable start/transfer/finish phases
+FB_CHUNKED = os.environ.get("FB_CHUNKED", "1") == "1"
+# Upper bound per transfer request (FB may ask for less via end_offset)
+FB_CHUNK_SIZE = int(os.environ.get("FB_CHUNK_MB", "8")) * 1024 * 1024
+# Older upload sessions are started over instead of resumed
+FB_SESSION_TTL = int(os.environ.get("FB_SESSION_TTL_HOURS", "6")) * 3600
+
+# Page tokens from a long-lived user token last long, re-checked after this anyway
+PAGE_TOKEN_TTL = int(os.environ.get("PAGE_TOKEN_TTL_HOURS", "24")) * 3600
+
+# ==============================================================================
+# ⏳ INSTAGRAM CONTAINER READINESS (REPLACES FIXED time.sleep(60))
+# ==============================================================================
+
+def get_container_status(container_id, access_token, domain=GRAPH_DOMAIN, session=None):
+    """Returns (status_code, status) of an IG media container"""
+    try:
+        r = (session or requests).get(
+            f"{domain}/{container_id}",
+            params={"fields": "status_code,status", "access_token": access_token},
+            timeout=30,
+        ).json()
+        return r.get("status_code"), r.get("status") or r.get("error", {}).get("message")
+    except Exception as e:
+        return None, str(e)
+
+def already_published_link(container_id):
+    """Sheet link for a container a killed run published (IG doesn't say which media it became)"""
+    return f"Container:{container_id}"
+
+def wait_for_container(container_id, access_token, timeout=IG_PROCESSING_TIMEOUT,
+                       first_delay=2, max_delay=15, factor=1.5, domain=GRAPH_DOMAIN, session=None):
+    """
+    Polls status_code fast at first, then slower, until FINISHED, ERROR or
+    the deadline. Returns "FINISHED", "PUBLISHED" (a killed run already
+    published it, don't publish again), "ERROR", "EXPIRED" or "TIMEOUT".
+    """
+    deadline = time.time() + timeout
+    delay = first_delay
+    while True:
+        status_code, status = get_container_status(container_id, access_token, domain, session)
+        if status_code == "PUBLISHED":
+            print(f"      ♻️ IG container {container_id} is already live (killed run), not publishing again.")
+            return "PUBLISHED"
+        if status_code == "FINISHED":
+            return "FINISHED"
+        if status_code in ("ERROR", "EXPIRED"):
+            print(f"      ❌ IG Processing {status_code}: {status}")
+            return status_code
+
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            print(f"      ⌛ IG Processing still {status_code} after {timeout}s.")
+            return "TIMEOUT"
+        print(f"      ⏳ IG Processing: {status_code or status}... next check in {int(min(delay, remaining))}s")
+        time.sleep(min(delay, remaining))
+        delay = min(delay * factor, max_delay)
+
+# ==============================================================================
+# 🧺 GRAPH /batch CLIENT (UP TO 50 CALLS PER HTTP REQUEST)
+# ==============================================================================
+
+GRAPH_BATCH_LIMIT = 50
+
+# Per-item errors worth another try: unknown/service errors and rate limits
+TRANSIENT_ERROR_CODES = {1, 2, 4, 17, 32, 341, 613}
+
+def _transient(data):
+    error = data.get("error") if isinstance(data, dict) else None
+    return data is None or (isinstance(error, dict) and error.get("code") in TRANSIENT_ERROR_CODES)
+
+class GraphBatch:
+    """
+    Collects Graph calls and sends them as /batch POSTs of up to 50 each.
+    add() returns the call's index, execute() returns one parsed body per
+    call in the same order ({"error": ...} for calls that failed for good).
+    Transient per-item errors are retried; POSTs are not, as they may
+    already have taken effect.
+    """
+
+    def __init__(self, access_token, domain=GRAPH_DOMAIN, session=None, retries=2):
+        self.access_token = access_token
+        self.domain = domain
+        self.session = session
+        self.retries = retries
+        self.calls = []
+
+    def __len__(self):
+        return len(self.calls)
+
+    def add(self, relative_url, method="GET", body=None):
+        """relative_url like "123?fields=likes", body = dict of form fields for POSTs"""
+        call = {"method": method, "relative_url": relative_url}
+        if body: call["body"] = urlencode(body)
+        self.calls.append(call)
+        return len(self.calls) - 1
+
+    def _send(self, calls):
+        """One /batch POST -> list of parsed bodies (None where FB gave no answer)"""
+        try:
+            r = (self.session or requests).post(
+                self.domain,
+                data={"access_token": self.access_token, "batch": json.dumps(calls), "include_headers": "false"},
+                timeout=120,
+            ).json()
+        except Exception as e:
+            print(f"      ⚠️ Graph Batch Error: {e}")
+            return [None] * len(calls)
+        if isinstance(r, dict):
+            # The whole batch was refused (bad token etc.): same error for every call
+            return [r] * len(calls)
+
+        results = []
+        for resp in r:
+            if not resp:
+                results.append(None)  # Timed out inside FB
+                continue
+            try: results.append(json.loads(resp.get("body") or "{}"))
+            except ValueError: results.append({"error": {"message": resp.get("body"), "code": resp.get("code")}})
+        return results
+
+    def execute(self):
+        calls, self.calls = self.calls, []
+        results = [None] * len(calls)
+        todo = list(range(len(calls)))
+        for attempt in range(self.retries + 1):
+            retry = []
+            for start in range(0, len(todo), GRAPH_BATCH_LIMIT):
+                chunk = todo[start:start + GRAPH_BATCH_LIMIT]
+                for index, data in zip(chunk, self._send([calls[i] for i in chunk])):
+                    results[index] = data
+                    if _transient(data) and calls[index]["method"] == "GET":
+                        retry.append(index)
+            if not retry or attempt == self.retries: break
+            print(f"      🔁 Graph Batch: retrying {len(retry)} of {len(calls)} calls...")
+            time.sleep(2 ** attempt)
+            todo = retry
+        return [r if r is not None else {"error": {"message": "No response from Graph batch"}} for r in results]
+
+def fetch_objects(object_ids, fields, access_token, domain=GRAPH_DOMAIN, session=None):
+    """{id: body} for many Graph objects, GRAPH_BATCH_LIMIT per HTTP request"""
+    batch = GraphBatch(access_token, domain, session)
+    ids = list(dict.fromkeys(str(i) for i in object_ids if i))
+    for object_id in ids:
+        batch.add(f"{object_id}?fields={fields}")
+    return dict(zip(ids, batch.execute())) if ids else {}
+
+# ==============================================================================
+# 📦 BATCH REEL PUBLISHING (ALL CONTAINERS PROCESS AT THE SAME TIME)
+# ==============================================================================
+
+# Batch mode upload result: the container is uploaded, ReelPublisher publishes it later
+QueuedReel = namedtuple("QueuedReel", "container_id started")
+
+class ReelPublisher:
+    """
+    Phase 2 + 3 of batch publishing. Containers that are already uploaded
+    are added here (with their ig_user_id). Each poll checks every due
+    container in one /batch call, then publishes all FINISHED ones and
+    looks up their shortcodes in one more batch each. Containers that are
+    already PUBLISHED (a killed run got that far) finish as a success with
+    already_published_link(), media_publish is never sent twice.
+    on_done(success, link) is called from the thread running poll_once().
+    """
+
+    def __init__(self, access_token, timeout=IG_PROCESSING_TIMEOUT,
+                 first_delay=2, max_delay=15, factor=1.5, domain=GRAPH_DOMAIN, session=None):
+        self.access_token = access_token
+        self.timeout = timeout
+        self.first_delay = first_delay
+        self.max_delay = max_delay
+        self.factor = factor
+        self.domain = domain
+        self.session = session
+        self.pending = []
+        self.lock = threading.Lock()  # add() may be called from fan-out threads
+
+    def __len__(self):
+        with self.lock:
+            return len(self.pending)
+
+    def add(self, container_id, on_done, **info):
+        now = time.time()
+        item = dict(info, container_id=container_id, on_done=on_done,
+                    deadline=now + self.timeout, delay=self.first_delay, next_check=now + self.first_delay)
+        with self.lock:
+            self.pending.append(item)
+        print(f"      📦 Container {container_id} queued for publishing ({len(self.pending)} processing).")
+
+    def _finish(self, item, success, link=""):
+        with self.lock:
+            self.pending.remove(item)
+        try:
+            item["on_done"](success, link)
+        except Exception as e:
+            print(f"      ❌ Publish Callback Error: {e}")
+
+    def _batch(self):
+        return GraphBatch(self.access_token, self.domain, self.session)
+
+    def _publish(self, ready):
+        """media_publish for every ready container, then one shortcode lookup batch"""
+        batch = self._batch()
+        for item in ready:
+            batch.add(f"{item['ig_user_id']}/media_publish", method="POST", body={"creation_id": item["container_id"]})
+
+        live = []
+        for item, data in zip(ready, batch.execute()):
+            if "id" in data:
+                live.append((item, data["id"]))
+            else:
+                print(f"      ❌ IG Publish Failed ({item['container_id']}): {data.get('error', data)}")
+                self._finish(item, False)
+
+        shortcodes = fetch_objects([media_id for _, media_id in live], "shortcode",
+                                   self.access_token, self.domain, self.session)
+        for item, media_id in live:
+            shortcode = shortcodes.get(media_id, {}).get("shortcode", "")
+            link = f"https://www.instagram.com/reel/{shortcode}/" if shortcode else f"ID:{media_id}"
+            print(f"      ✅ IG Published: {media_id}")
+            self._finish(item, True, link)
+
+    def poll_once(self):
+        """Checks every container whose next check is due, publishes the ready ones"""
+        with self.lock:
+            due = [item for item in self.pending if item["next_check"] <= time.time()]
+        if not due: return
+
+        statuses = fetch_objects([item["container_id"] for item in due], "status_code,status",
+                                 self.access_token, self.domain, self.session)
+        ready = []
+        for item in due:
+            container_id = item["container_id"]
+            data = statuses.get(str(container_id), {})
+            status_code = data.get("status_code")
+            status = data.get("status") or data.get("error", {}).get("message")
+            if status_code == "PUBLISHED":
+                print(f"      ♻️ IG container {container_id} is already live (killed run), not publishing again.")
+                self._finish(item, True, already_published_link(container_id))
+            elif status_code == "FINISHED":
+                ready.append(item)
+            elif status_code in ("ERROR", "EXPIRED"):
+                print(f"      ❌ IG Processing {status_code} ({container_id}): {status}")
+                self._finish(item, False)
+            elif time.time() >= item["deadline"]:
+                print(f"      ⌛ IG Processing still {status_code} after {self.timeout}s ({container_id}).")
+                self._finish(item, False)
+            else:
+                item["next_check"] = time.time() + item["delay"]
+                item["delay"] = min(item["delay"] * self.factor, self.max_delay)
+
+        if ready:
+            try:
+                self._publish(ready)
+            except Exception as e:
+                print(f"      ❌ IG Publish Error: {e}")
+                for item in ready:
+                    if item in self.pending: self._finish(item, False)
+
+    def drain(self):
+        """Polls until every queued container is published or has failed"""
+        if self.pending:
+            print(f"\n📦 Waiting on {len(self.pending)} IG container(s) to finish processing...")
+        while True:
+            self.poll_once()
+            with self.lock:
+                if not self.pending: return
+                wake = min(item["next_check"] for item in self.pending)
+            time.sleep(max(0.5, wake - time.time()))
+
+# ==============================================================================
+# 📘 FACEBOOK RESUMABLE VIDEO UPLOAD (SURVIVES cancel-in-progress KILLS)
+# ==============================================================================
+
+FB_SESSIONS_STATE = "fb_upload_sessions"
+_fb_sessions_lock = threading.Lock()
+
+def _fb_session(key, value=None, drop=False):
+    """Read/update one persisted upload session (page:md5 -> session info)"""
+    with _fb_sessions_lock:
+        sessions = load_state(FB_SESSIONS_STATE)
+        if value is None and not drop:
+            return sessions.get(key)
+        now = time.time()
+        sessions = {k: v for k, v in sessions.items() if now - v.get("created", 0) < FB_SESSION_TTL}
+        if drop: sessions.pop(key, None)
+        else: sessions[key] = value
+        save_state(FB_SESSIONS_STATE, sessions)
+
+def _fb_session_gone(data):
+    """True if FB rejected the upload session itself (expired/unknown), not a passing error"""
+    error = data.get("error") if isinstance(data, dict) else None
+    if not isinstance(error, dict) or _transient(data) or is_token_error(data): return False
+    message = str(error.get("message", "")).lower()
+    return error.get("code") in (100, 6000, 6001) or "session" in message
+
+def upload_video_chunked(page_id, page_token, file_path, description, file_hash,
+                         chunk_size=FB_CHUNK_SIZE, domain=GRAPH_DOMAIN, session=None, on_error=None):
+    """
+    start -> transfer chunks -> finish on /{page_id}/videos. Returns video_id or None.
+    The session id and next offset are saved after every chunk, so a killed
+    run resumes from the last acknowledged byte. Chunks go one after another:
+    FB hands out the next start_offset only after the previous chunk lands.
+    on_error(response) sees every failed phase (e.g. to drop a dead token).
+    """
+    http = session or requests
+    url = f"{domain}/{page_id}/videos"
+    file_size = os.path.getsize(file_path)
+    key = f"{page_id}:{file_hash}"
+
+    saved = _fb_session(key)
+    if saved and time.time() - saved.get("created", 0) < FB_SESSION_TTL and saved.get("file_size") == file_size:
+        print(f"      ⏩ Resuming FB upload at {int(saved['start_offset']) * 100 // max(file_size, 1)}%")
+    else:
+        r = http.post(url, data={"upload_phase": "start", "file_size": file_size, "access_token": page_token}, timeout=60).json()
+        if "upload_session_id" not in r:
+            print(f"      ❌ FB Upload Start Failed: {r}")
+            if on_error: on_error(r)
+            return None
+        saved = {"upload_session_id": r["upload_session_id"], "video_id": r["video_id"],
+                 "start_offset": r["start_offset"], "end_offset": r["end_offset"],
+                 "file_size": file_size, "created": time.time()}
+        _fb_session(key, saved)
+
+    with open(file_path, "rb") as f:
+        start, end = int(saved["start_offset"]), int(saved["end_offset"])
+        while start < end:
+            f.seek(start)
+            chunk = f.read(min(end - start, chunk_size))
+            r = http.post(url, data={"upload_phase": "transfer", "upload_session_id": saved["upload_session_id"],
+                                     "start_offset": start, "access_token": page_token},
+                          files={"video_file_chunk": ("chunk", chunk, "application/octet-stream")}, timeout=300).json()
+            if "start_offset" not in r:
+                print(f"      ❌ FB Chunk Failed at {start}: {r}")
+                if on_error: on_error(r)
+                # Only a session FB no longer knows about starts over next time,
+                # throttling/temporary errors keep the offsets to resume from
+                if _fb_session_gone(r): _fb_session(key, drop=True)
+                return None
+            start, end = int(r["start_offset"]), int(r["end_offset"])
+            saved.update(start_offset=start, end_offset=end)
+            _fb_session(key, saved)
+            print(f"      📤 FB Chunk OK: {start * 100 // max(file_size, 1)}%")
+
+    r = http.post(url, data={"upload_phase": "finish", "upload_session_id": saved["upload_session_id"],
+                             "description": description, "access_token": page_token}, timeout=60).json()
+    if not r.get("success"):
+        print(f"      ❌ FB Upload Finish Failed: {r}")
+        if on_error: on_error(r)
+        return None
+    _fb_session(key, drop=True)
+    return saved["video_id"]
+
+# ==============================================================================
+# 🔑 PAGE TOKEN CACHE (ONE BATCHED FETCH, ENCRYPTED ON DISK)
+# ==============================================================================
+
+def is_token_error(data):
+    """True for Graph errors that mean the access token itself is dead (OAuthException 190/102)"""
+    error = (data or {}).get("error") if isinstance(data, dict) else None
+    return isinstance(error, dict) and error.get("type") == "OAuthException" and error.get("code") in (102, 190)
+
+class PageTokenCache:
+    """
+    page_id -> page access token, derived from the user token.
+    All pages are fetched in one request, kept in memory, and saved to
+    .bot_state encrypted with a key derived from the user token (needs
+    the optional `cryptography` package, without it nothing is written).
+    A new user token can't decrypt the old file, so it simply refetches.
+    """
+
+    def __init__(self, user_token, name="page_tokens", ttl=PAGE_TOKEN_TTL, domain=GRAPH_DOMAIN, session=None):
+        self.user_token = user_token
+        self.path = state_path(f"{name}.enc")
+        self.ttl = ttl
+        self.domain = domain
+        self.session = session
+        self.lock = threading.Lock()
+        self.fernet = None
+        if Fernet and user_token:
+            key = hashlib.sha256(f"page-token-cache:{user_token}".encode("utf-8")).digest()
+            self.fernet = Fernet(base64.urlsafe_b64encode(key))
+        self.tokens = self._load()  # page_id -> {"token": ..., "fetched": ...}
+
+    def _load(self):
+        if not self.fernet or not os.path.exists(self.path): return {}
+        try:
+            with open(self.path, "rb") as f:
+                return json.loads(self.fernet.decrypt(f.read()))
+        except (InvalidToken, ValueError, OSError):
+            return {}  # Other user token or broken file: refetch
+
+    def _save(self):
+        if not self.fernet: return
+        tmp = f"{self.path}.tmp"
+        try:
+            with open(tmp, "wb") as f:
+                f.write(self.fernet.encrypt(json.dumps(self.tokens).encode("utf-8")))
+            os.replace(tmp, self.path)
+        except Exception as e:
+            print(f"⚠️ Page Token Cache Save Error: {e}")
+
+    def _fresh(self, page_id):
+        entry = self.tokens.get(str(page_id))
+        return entry and time.time() - entry.get("fetched", 0) < self.ttl
+
+    def prefetch(self, page_ids):
+        """One /batch request for every page that has no fresh token yet"""
+        with self.lock:
+            missing = sorted({str(p) for p in page_ids if p and not self._fresh(p)})
+            if not missing: return
+            found = fetch_objects(missing, "access_token", self.user_token, self.domain, self.session)
+            now = time.time()
+            for page_id, data in found.items():
+                if data.get("access_token"):
+                    self.tokens[page_id] = {"token": data["access_token"], "fetched": now}
+                else:
+                    print(f"⚠️ Page Token Fetch Failed ({page_id}): {data.get('error', {}).get('message')}")
+            fetched = sum(1 for p in missing if p in self.tokens)
+            print(f"🔑 Page tokens fetched for {fetched}/{len(missing)} pages.")
+            if fetched: self._save()
+
+    def get(self, page_id):
+        """Cached page token, fetched on a miss. None if FB won't give one."""
+        if not self._fresh(page_id):
+            self.prefetch([page_id])
+        entry = self.tokens.get(str(page_id))
+        return entry["token"] if entry else None
+
+    def invalidate(self, page_id):
+        with self.lock:
+            if self.tokens.pop(str(page_id), None):
+                print(f"🔑 Page token for {page_id} dropped, refetching on next use.")
+                self._save()
+
+    def check(self, page_id, data):
+        """Drops the page's token if `data` is a dead-token error. Returns True if it was."""
+        if is_token_error(data):
+            self.invalidate(page_id)
+            return True
+        return False
@@ -0,0 +1,160 @@
+import os
+import time
+import sqlite3
+import threading
+from run_state import state_path
+
+# ==============================================================================
+# 📒 WRITE-AHEAD JOB JOURNAL (NO DOUBLE POSTS AFTER A KILLED RUN)
+# ==============================================================================
+
+# One (row, platform) job moves through these states in order
+CLAIMED = "claimed"        # Picked up by a run
+DOWNLOADED = "downloaded"  # Video is on local disk
+UPLOADED = "uploaded"      # Platform has the bytes (IG: container id, not live yet)
+PUBLISHED = "published"    # Live on the platform, sheet not updated yet
+SYNCED = "synced"          # Sheet says POSTED, nothing left to do
+
+# IG containers can only be published for 24h after creation
+CONTAINER_TTL = 23 * 3600
+
+# Jobs untouched this long are pruned (unsynced publishes are always kept)
+KEEP_DAYS = int(os.environ.get("JOURNAL_KEEP_DAYS", "14"))
+
+# A row that keeps failing waits 5, 10, 20... mins (capped) and goes FAILED_* after N tries
+FAIL_MAX_TRIES = int(os.environ.get("FAIL_MAX_TRIES", "5"))
+FAIL_BACKOFF = int(os.environ.get("FAIL_BACKOFF_MIN", "5")) * 60
+FAIL_BACKOFF_MAX = int(os.environ.get("FAIL_BACKOFF_MAX_MIN", "360")) * 60
+
+class JobJournal:
+    """
+    SQLite log of every job's progress. Each state is written before the
+    run moves on, so after a kill the next run knows exactly what already
+    happened: published posts only get their sheet write finished, and an
+    uploaded IG container is published instead of uploaded again.
+    """
+
+    def __init__(self, bot, path=None):
+        self.bot = bot
+        self.lock = threading.Lock()  # Fan-out threads share one connection
+        self.db = sqlite3.connect(path or state_path("jobs.db"), check_same_thread=False, isolation_level=None)
+        self.db.row_factory = sqlite3.Row
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                bot TEXT, row INTEGER, platform TEXT,
+                video_url TEXT, state TEXT,
+                platform_id TEXT, link TEXT, duration INTEGER,
+                updated REAL,
+                PRIMARY KEY (bot, row, platform)
+            )
+        """)
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS failures (
+                bot TEXT, row INTEGER, video_id TEXT,
+                reason TEXT, attempts INTEGER,
+                last_failed REAL, next_try REAL,
+                PRIMARY KEY (bot, row, video_id)
+            )
+        """)
+        self.prune()
+
+    def claim(self, row, platform, video_url):
+        """Starts (or restarts) a job, forgetting anything from an older video"""
+        with self.lock:
+            old = self._get(row, platform)
+            if old and old["video_url"] == video_url and old["state"] in (UPLOADED, PUBLISHED):
+                return dict(old)  # Keep progress that a retry can reuse
+            self.db.execute(
+                "INSERT OR REPLACE INTO jobs (bot, row, platform, video_url, state, updated) VALUES (?, ?, ?, ?, ?, ?)",
+                (self.bot, row, platform, video_url, CLAIMED, time.time()),
+            )
+            return None
+
+    def mark(self, row, platform, state, platform_id=None, link=None, duration=None):
+        with self.lock:
+            self.db.execute(
+                """UPDATE jobs SET state = ?, updated = ?,
+                       platform_id = COALESCE(?, platform_id), link = COALESCE(?, link), duration = COALESCE(?, duration)
+                   WHERE bot = ? AND row = ? AND platform = ?""",
+                (state, time.time(), platform_id, link, duration, self.bot, row, platform),
+            )
+
+    def _get(self, row, platform):
+        return self.db.execute(
+            "SELECT * FROM jobs WHERE bot = ? AND row = ? AND platform = ?", (self.bot, row, platform)
+        ).fetchone()
+
+    def get(self, row, platform):
+        with self.lock:
+            found = self._get(row, platform)
+            return dict(found) if found else None
+
+    def reusable_container(self, row, platform, video_url):
+        """IG container id uploaded by an earlier run for this same video, if still publishable"""
+        job = self.get(row, platform)
+        if not job or job["state"] != UPLOADED or not job["platform_id"]: return None
+        if job["video_url"] != video_url or time.time() - job["updated"] > CONTAINER_TTL: return None
+        return job["platform_id"]
+
+    def unsynced(self):
+        """Jobs that went live but whose sheet write never happened"""
+        with self.lock:
+            rows = self.db.execute(
+                "SELECT * FROM jobs WHERE bot = ? AND state = ? ORDER BY row", (self.bot, PUBLISHED)
+            ).fetchall()
+            return [dict(r) for r in rows]
+
+    def forget(self, row, platform):
+        with self.lock:
+            self.db.execute("DELETE FROM jobs WHERE bot = ? AND row = ? AND platform = ?", (self.bot, row, platform))
+
+    def prune(self):
+        with self.lock:
+            self.db.execute(
+                "DELETE FROM jobs WHERE bot = ? AND state != ? AND updated < ?",
+                (self.bot, PUBLISHED, time.time() - KEEP_DAYS * 86400),
+            )
+            self.db.execute(
+                "DELETE FROM failures WHERE bot = ? AND last_failed < ?",
+                (self.bot, time.time() - KEEP_DAYS * 86400),
+            )
+
+    # ==========================================================================
+    # ⛔ FAILURE CACHE (EXPONENTIAL BACKOFF PER ROW + VIDEO)
+    # ==========================================================================
+
+    def record_failure(self, row, video_id, reason):
+        """Counts one more failed try -> (attempts, next_try epoch)"""
+        with self.lock:
+            found = self.db.execute(
+                "SELECT attempts FROM failures WHERE bot = ? AND row = ? AND video_id = ?", (self.bot, row, video_id)
+            ).fetchone()
+            attempts = (found["attempts"] if found else 0) + 1
+            now = time.time()
+            next_try = now + min(FAIL_BACKOFF * 2 ** (attempts - 1), FAIL_BACKOFF_MAX)
+            self.db.execute(
+                "INSERT OR REPLACE INTO failures VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (self.bot, row, video_id, reason, attempts, now, next_try),
+            )
+            return attempts, next_try
+
+    def backoff(self, row, video_id):
+        """
+        Failure record if the row must still wait, else None.
+        A row that already hit FAIL_MAX_TRIES but is PENDING again was
+        re-queued by hand, so its record is cleared for a fresh start.
+        """
+        with self.lock:
+            found = self.db.execute(
+                "SELECT * FROM failures WHERE bot = ? AND row = ? AND video_id = ?", (self.bot, row, video_id)
+            ).fetchone()
+        if not found: return None
+        if found["attempts"] >= FAIL_MAX_TRIES:
+            self.clear_failure(row, video_id)
+            return None
+        return dict(found) if found["next_try"] > time.time() else None
+
+    def clear_failure(self, row, video_id):
+        with self.lock:
+            self.db.execute("DELETE FROM failures WHERE bot = ? AND row = ? AND video_id = ?", (self.bot, row, video_id))
@@ -1,13 +1,28 @@
 import os
 import time
 import json
+import argparse
 import requests
 import io
 import gspread
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from google.oauth2.service_account import Credentials
 from googleapiclient.discovery import build
 from googleapiclient.http import MediaIoBaseDownload
+from sheet_io import SheetWriteBuffer, scan_columns, fetch_rows
+from scheduler import JobScheduler, run_daemon
+from fanout import fan_out
+from streaming_upload import post_multipart
+from analytics import AnalyticsSchedule, post_key
+from metrics_store import MetricsStore
+from dm_store import DMStore, DMLogMirror
+from dm_rules import DMRules
+from dm_dispatch import DMDispatcher, DM_WORKERS, PERMANENT_DM_CODES
+from job_journal import JobJournal, DOWNLOADED, UPLOADED, PUBLISHED, SYNCED, FAIL_MAX_TRIES
+from graph_api import GRAPH_DOMAIN, IG_BATCH_PUBLISH, FB_CHUNKED, ReelPublisher, QueuedReel, PageTokenCache, already_published_link, GraphBatch, wait_for_container, upload_video_chunked, fetch_objects
+from video_cache import VIDEO_CACHE, extract_drive_id, file_md5
+from run_state import load_state, save_state, get_sheet_modified_time, should_skip_run, analytics_stale, next_due_time
 
 # =======================================================
 # 💎 CONFIGURATION (DROPSHIPPING)
@@ -53,6 +68,36 @@ BRAND_CONFIG = {
 
 SCOPES = ["https://www.googleapis.com/auth/spreadsheets", "https://www.googleapis.com/auth/drive"]
 
+# Keep-alive HTTP session for Graph API calls (stays warm across daemon cycles)
+HTTP = requests.Session()
+POLL_INTERVAL = int(os.environ.get("POLL_INTERVAL_SEC", "60"))
+
+# Credentials, gspread client and Drive service are built once per process
+_CLIENTS = {}
+STATE_NAME = "dropshipping_bot" # .bot_state/dropshipping_bot.json
+
+# Page tokens: one batched fetch at startup, encrypted in .bot_state between runs
+PAGE_TOKENS = PageTokenCache(IG_ACCESS_TOKEN, session=HTTP)
+
+# Phase-1 scan reads only these columns, full rows are fetched just for due posts
+SCAN_COLUMNS = {
+    "Status": ["Status"],
+    "Date": ["Date"],
+    "Schedule_Time": ["Schedule_Time"],
+    "Platform": ["Platform"],
+}
+ANALYTICS_COLUMNS = {
+    "Status": ["Status"],
+    "Link": ["Link"],
+    "Account Name": ["Account Name"],
+    "Likes": ["Likes"],
+}
+PRODUCT_COLUMNS = {
+    "Link": ["Link"],
+    "Product Link": ["Product Link"],
+    "Product_Link": ["Product_Link"],
+}
+
 # =======================================================
 # 🧠 SNIPER TIME LOGIC (SMART WAIT + AM/PM)
 # =======================================================
@@ -62,77 +107,59 @@ def get_ist_time():
     ist_now = utc_now + timedelta(hours=5, minutes=30)
     return ist_now
 
-def check_time_and_wait(sheet_date_str, sheet_time_str):
+SNIPER_WINDOW = 300 # Rows due within 5 mins are picked up in this run
+
+def parse_schedule_time(sheet_date_str, sheet_time_str):
     """
-    Checks time. If < 5 mins remain, it WAITS (Sleeps).
+    Sheet Date + Time -> datetime (IST). None if blank or unknown format.
     """
-    try:
-        ist_now = get_ist_time()
-        
-        # Clean Inputs
-        date_clean = str(sheet_date_str).strip()
-        time_clean = str(sheet_time_str).strip().upper()
-        
-        if not date_clean or not time_clean: return False
-
-        full_time_str = f"{date_clean} {time_clean}"
-        
-        # 👇 UPDATED DATE PARSING LOGIC (Handles US & Indian Formats)
-        formats_to_try = [
-            "%d/%m/%Y %I:%M %p",  # 21/12/2025 2:30 PM (Indian)
-            "%m/%d/%Y %I:%M %p",  # 12/21/2025 2:30 PM (US Style - Sheet Default)
-            "%d/%m/%Y %I:%M%p",   # 21/12/2025 2:30PM
-            "%m/%d/%Y %I:%M%p",   # 12/21/2025 2:30PM
-            "%d/%m/%Y %H:%M",     # 24 Hour format
-            "%Y-%m-%d %H:%M:%S"   # ISO Format
-        ]
-        
-        scheduled_dt = None
-        for fmt in formats_to_try:
-            try:
-                scheduled_dt = datetime.strptime(full_time_str, fmt)
-                break # Match found, stop checking
-            except ValueError:
-                continue
-                
-        if not scheduled_dt:
-            print(f"      ⚠️ Date Format Unknown: {full_time_str}")
-            return False
-
-        # Time Difference
-        time_diff = (scheduled_dt - ist_now).total_seconds()
-        
-        print(f"      🕒 Scheduled: {scheduled_dt.strftime('%d/%m %H:%M')} | Now: {ist_now.strftime('%d/%m %H:%M')} | Gap: {int(time_diff)}s")
+    # Clean Inputs
+    date_clean = str(sheet_date_str).strip()
+    time_clean = str(sheet_time_str).strip().upper()
+    
+    if not date_clean or not time_clean: return None
 
-        # LOGIC 1: Time Thai Gayo Che (Already Late or Exact)
-        if time_diff <= 0:
-            return True 
-        
-        # LOGIC 2: SNIPER WAIT (Within 5 Mins)
-        elif 0 < time_diff <= 300:
-            print(f"      👀 TARGET LOCKED! Waiting {int(time_diff)}s to hit exact time...")
-            time.sleep(time_diff + 2) 
-            print("      🔫 BOOM! Exact Time. Uploading...")
-            return True
+    full_time_str = f"{date_clean} {time_clean}"
+    
+    # 👇 UPDATED DATE PARSING LOGIC (Handles US & Indian Formats)
+    formats_to_try = [
+        "%d/%m/%Y %I:%M %p",  # 21/12/2025 2:30 PM (Indian)
+        "%m/%d/%Y %I:%M %p",  # 12/21/2025 2:30 PM (US Style - Sheet Default)
+        "%d/%m/%Y %I:%M%p",   # 21/12/2025 2:30PM
+        "%m/%d/%Y %I:%M%p",   # 12/21/2025 2:30PM
+        "%d/%m/%Y %H:%M",     # 24 Hour format
+        "%Y-%m-%d %H:%M:%S"   # ISO Format
+    ]
+    
+    for fmt in formats_to_try:
+        try:
+            return datetime.strptime(full_time_str, fmt) # Match found, stop checking
+        except ValueError:
+            continue
             
-        # LOGIC 3: Too Early
-        else:
-            print(f"      💤 Too early. Sleeping.")
-            return False
-
-    except Exception as e:
-        print(f"      ⚠️ Date/Time Error: {e}")
-        return False
+    print(f"      ⚠️ Date Format Unknown: {full_time_str}")
+    return None
 
 # =======================================================
 # ⚙️ SYSTEM CORE & ANALYTICS
 # =======================================================
 
-def get_services():
+def get_credentials():
+    if "creds" in _CLIENTS: return _CLIENTS["creds"]
     creds_json = os.environ.get("GCP_CREDENTIALS")
-    if not creds_json: return None, None
+    if not creds_json: return None
+    try:
+        _CLIENTS["creds"] = Credentials.from_service_account_info(json.loads(creds_json), scopes=SCOPES)
+        return _CLIENTS["creds"]
+    except Exception as e:
+        print(f"❌ Credentials Error: {e}")
+        return None
+
+def get_services(creds=None):
+    if "sheet" in _CLIENTS: return _CLIENTS["sheet"], _CLIENTS["drive"]
+    creds = creds or get_credentials()
+    if not creds: return None, None
     try:
-        creds = Credentials.from_service_account_info(json.loads(creds_json), scopes=SCOPES)
         client = gspread.authorize(creds)
         try:
             sheet = client.open_by_key(DROPSHIPPING_SHEET_ID).sheet1
@@ -141,6 +168,7 @@ def get_services():
             print("❌ Sheet ID Invalid.")
             return None, None
         drive_service = build('drive', 'v3', credentials=creds)
+        _CLIENTS["sheet"], _CLIENTS["drive"] = sheet, drive_service
         return sheet, drive_service
     except Exception as e:
         print(f"❌ Connection Error: {e}")
@@ -149,80 +177,108 @@ def get_services():
 def get_page_access_token(page_id):
     """
     🔥 FIX: Exchanges User Token for Page Token (Fixes Permission Error)
+    Served from PAGE_TOKENS, so the Graph call happens once, not per upload/comment.
     """
-    try:
-        url = f"https://graph.facebook.com/v19.0/{page_id}?fields=access_token&access_token={IG_ACCESS_TOKEN}"
-        r = requests.get(url).json()
-        if "access_token" in r:
-            return r["access_token"]
-        return IG_ACCESS_TOKEN 
-    except: return IG_ACCESS_TOKEN
-
-def get_facebook_metrics(video_id):
-    """Fetches Likes for FB Video"""
-    try:
-        url = f"https://graph.facebook.com/v19.0/{video_id}?fields=likes.summary(true)&access_token={IG_ACCESS_TOKEN}"
-        r = requests.get(url).json()
-        likes = r.get("likes", {}).get("summary", {}).get("total_count", 0)
-        return likes
-    except: return 0
+    return PAGE_TOKENS.get(page_id) or IG_ACCESS_TOKEN
+
+def get_facebook_likes(video_ids):
+    """Likes for many FB videos -> {video_id: likes}, 50 videos per /batch request"""
+    found = fetch_objects(video_ids, "likes.summary(true)", IG_ACCESS_TOKEN, session=HTTP)
+    return {
+        vid: data.get("likes", {}).get("summary", {}).get("total_count", 0)
+        for vid, data in found.items() if "error" not in data
+    }
 
 def download_video_securely(drive_service, drive_url):
-    print("      ⬇️ Downloading video...")
-    temp_filename = "temp_drop_video.mp4"
-    if os.path.exists(temp_filename): os.remove(temp_filename)
-    file_id = None
-    if "/d/" in drive_url: file_id = drive_url.split('/d/')[1].split('/')[0]
-    elif "id=" in drive_url: file_id = drive_url.split('id=')[1].split('&')[0]
+    """Returns a local path from the shared video cache (downloads on a miss)"""
+    file_id = extract_drive_id(drive_url)
     if not file_id: return None
+
+    # Drive's md5/size let the cache reuse a copy another row already downloaded
     try:
-        request = drive_service.files().get_media(fileId=file_id)
-        fh = io.FileIO(temp_filename, 'wb')
-        downloader = MediaIoBaseDownload(fh, request)
-        done = False
-        while done is False: status, done = downloader.next_chunk()
-        return temp_filename
-    except: return None
+        meta = drive_service.files().get(fileId=file_id, fields="md5Checksum,size", supportsAllDrives=True).execute()
+    except Exception as e:
+        print(f"      ⚠️ Drive Metadata Error: {e}")
+        meta = {}
+
+    def _download(dest):
+        print("      ⬇️ Downloading video...")
+        try:
+            request = drive_service.files().get_media(fileId=file_id)
+            with io.FileIO(dest, 'wb') as fh:
+                downloader = MediaIoBaseDownload(fh, request)
+                done = False
+                while done is False: status, done = downloader.next_chunk()
+            return True
+        except Exception as e:
+            print(f"      ❌ Download Error: {e}")
+            return False
+
+    return VIDEO_CACHE.fetch(file_id, _download, md5=meta.get("md5Checksum"), size=meta.get("size"))
 
 # =======================================================
 # 🔧 UPLOAD FUNCTIONS (WITH TIMER, LINK & AUTO-COMMENT)
 # =======================================================
 
-def upload_to_instagram_resumable(brand_name, ig_user_id, file_path, caption):
+def start_instagram_upload(brand_name, ig_user_id, file_path, caption):
+    """Phase 1: creates the REELS container and uploads the bytes -> container_id or None"""
     print(f"      📸 Instagram Upload ({brand_name})...")
-    start_t = time.time()
     if not ig_user_id: 
         print(f"      ⚠️ No IG ID for {brand_name}")
-        return False, "", 0
+        return None
     
-    domain = "https://graph.facebook.com/v19.0"
     try:
-        url = f"{domain}/{ig_user_id}/media"
+        url = f"{GRAPH_DOMAIN}/{ig_user_id}/media"
         params = { "upload_type": "resumable", "media_type": "REELS", "caption": caption, "access_token": IG_ACCESS_TOKEN }
-        init = requests.post(url, params=params).json()
+        init = HTTP.post(url, params=params).json()
         
-        if "uri" not in init: return False, "", 0
+        if "uri" not in init: return None
         
         with open(file_path, "rb") as f:
             headers = { "Authorization": f"OAuth {IG_ACCESS_TOKEN}", "offset": "0", "file_size": str(os.path.getsize(file_path)) }
-            requests.post(init["uri"], data=f, headers=headers)
-        
-        time.sleep(60)
-        pub = requests.post(f"{domain}/{ig_user_id}/media_publish", params={"creation_id": init["id"], "access_token": IG_ACCESS_TOKEN}).json()
-        
-        end_t = time.time()
-        duration = int(end_t - start_t)
-        
+            HTTP.post(init["uri"], data=f, headers=headers)
+        return init["id"]
+    except: return None
+
+def publish_instagram_container(ig_user_id, container_id):
+    """Phase 3: publishes a FINISHED container -> (success, link)"""
+    try:
+        pub = HTTP.post(f"{GRAPH_DOMAIN}/{ig_user_id}/media_publish", params={"creation_id": container_id, "access_token": IG_ACCESS_TOKEN}).json()
         if "id" in pub:
             try:
                 # Fetch Shortcode for Link
-                r_get = requests.get(f"{domain}/{pub['id']}?fields=shortcode&access_token={IG_ACCESS_TOKEN}").json()
+                r_get = HTTP.get(f"{GRAPH_DOMAIN}/{pub['id']}?fields=shortcode&access_token={IG_ACCESS_TOKEN}").json()
                 shortcode = r_get.get("shortcode", "")
                 link = f"https://www.instagram.com/reel/{shortcode}/" if shortcode else f"ID:{pub['id']}"
             except: link = "Link Error"
-            return True, link, duration
+            return True, link
+        return False, ""
+    except: return False, ""
+
+def upload_to_instagram_resumable(brand_name, ig_user_id, file_path, caption, container_id=None):
+    """One reel start to finish (used when IG_BATCH_PUBLISH is off)"""
+    start_t = time.time()
+    container_id = container_id or start_instagram_upload(brand_name, ig_user_id, file_path, caption)
+    if not container_id: return False, "", 0
+
+    # Publish the moment IG says the container is ready
+    status = wait_for_container(container_id, IG_ACCESS_TOKEN, session=HTTP)
+    if status == "PUBLISHED":
+        return True, already_published_link(container_id), int(time.time() - start_t)
+    if status != "FINISHED":
         return False, "", 0
-    except: return False, "", 0
+    success, link = publish_instagram_container(ig_user_id, container_id)
+    return success, link, (int(time.time() - start_t) if success else 0)
+
+def queue_instagram_reel(brand_name, ig_user_id, file_path, caption):
+    """
+    Batch mode: only phase 1 runs here. Returns a QueuedReel the caller
+    hands to the ReelPublisher, (False, "", 0) if the upload failed.
+    """
+    start_t = time.time()
+    container_id = start_instagram_upload(brand_name, ig_user_id, file_path, caption)
+    if not container_id: return False, "", 0
+    return QueuedReel(container_id, start_t)
 
 def upload_to_facebook(brand_name, fb_page_id, file_path, caption):
     print(f"      📘 Facebook Upload ({brand_name})...")
@@ -235,8 +291,15 @@ def upload_to_facebook(brand_name, fb_page_id, file_path, caption):
     try:
         url = f"https://graph.facebook.com/v19.0/{fb_page_id}/videos"
         params = { "description": caption, "access_token": page_token } # Uses Page Token
-        with open(file_path, "rb") as f:
-            r = requests.post(url, params=params, files={"source": f}).json()
+        if FB_CHUNKED:
+            # Resumable: a cancelled run picks up at the last uploaded chunk
+            video_id = upload_video_chunked(fb_page_id, page_token, file_path, caption, file_md5(file_path), session=HTTP,
+                                            on_error=lambda data: PAGE_TOKENS.check(fb_page_id, data))
+            r = {"id": video_id} if video_id else {}
+        else:
+            # Streamed from disk: a 300 MB reel never sits in RAM
+            r = post_multipart(HTTP, url, "source", file_path, params=params).json()
+            PAGE_TOKENS.check(fb_page_id, r)
         
         end_t = time.time()
         duration = int(end_t - start_t)
@@ -253,11 +316,14 @@ def post_facebook_comment(object_id, message, page_id):
     🔥 NEW: Posts a comment on the video with the link
     """
     print(f"      💬 Posting Auto-Comment on FB...")
-    page_token = get_page_access_token(page_id)
     try:
         url = f"https://graph.facebook.com/v19.0/{object_id}/comments"
-        params = { "message": message, "access_token": page_token }
-        r = requests.post(url, params=params).json()
+        params = { "message": message, "access_token": get_page_access_token(page_id) }
+        r = HTTP.post(url, params=params).json()
+        if PAGE_TOKENS.check(page_id, r):
+            # Cached token went stale: one retry with a freshly fetched one
+            params["access_token"] = get_page_access_token(page_id)
+            r = HTTP.post(url, params=params).json()
         if "id" in r:
             print("      ✅ Comment Posted Successfully!")
             return True
@@ -268,112 +334,389 @@ def post_facebook_comment(object_id, message, page_id):
         print(f"      ❌ Comment Error: {e}")
         return False
 
+def publish_facebook_with_comment(job, local_file, journal=None):
+    """FB upload + product-link auto-comment -> (success, link, duration)"""
+    s, l, d, vid_id = upload_to_facebook(job["brand"], job["fb_id"], local_file, job["fb_caption"])
+    # Live now: journal it before the 10s comment wait
+    if s and journal: journal.mark(job["row"], "Facebook", PUBLISHED, platform_id=vid_id, link=l, duration=d)
+    
+    # 🔥 AUTO-COMMENT FEATURE
+    if s and job["product_link"] and vid_id:
+        print("      ⏳ Waiting 10s before commenting...")
+        time.sleep(10)
+        comment_msg = f"🛍️ Grab yours here! 👇\n{job['product_link']}\n\n🔥 Limited Stock!"
+        post_facebook_comment(vid_id, comment_msg, job["fb_id"])
+    return s, l, d
+
+def publish_instagram(job, local_file, journal):
+    """IG upload (batch: phase 1 only) with the outcome journaled as soon as it is known"""
+    container_id = job.get("container_id")  # Uploaded by a run that got killed
+    if IG_BATCH_PUBLISH:
+        if container_id: return QueuedReel(container_id, time.time())
+        result = queue_instagram_reel(job["brand"], job["ig_id"], local_file, job["ig_caption"])
+    else:
+        result = upload_to_instagram_resumable(job["brand"], job["ig_id"], local_file, job["ig_caption"], container_id)
+
+    if isinstance(result, QueuedReel):
+        journal.mark(job["row"], "Instagram", UPLOADED, platform_id=result.container_id)
+        return result
+    s, l, d = result
+    if s:
+        journal.mark(job["row"], "Instagram", PUBLISHED, link=l, duration=d)
+    elif container_id:
+        journal.mark(job["row"], "Instagram", DOWNLOADED)  # Old container is no good, upload fresh
+    return result
+
+def get_journal():
+    if "journal" not in _CLIENTS: _CLIENTS["journal"] = JobJournal(STATE_NAME)
+    return _CLIENTS["journal"]
+
+def get_analytics_schedule():
+    if "analytics" not in _CLIENTS: _CLIENTS["analytics"] = AnalyticsSchedule(STATE_NAME)
+    return _CLIENTS["analytics"]
+
+def get_metrics_store():
+    if "metrics" not in _CLIENTS: _CLIENTS["metrics"] = MetricsStore(STATE_NAME)
+    return _CLIENTS["metrics"]
+
+def save_metrics(samples):
+    """Appends this pass's numbers to the local history (metrics_store.py reports on it)"""
+    try:
+        if get_metrics_store().record(samples):
+            print(f"   📈 {len(samples)} metric samples saved locally.")
+    except Exception as e:
+        print(f"   ⚠️ Metrics History Error: {e}")
+
+def reconcile_journal(journal, sheet, headers, pending, writer, col_status, col_link, col_duration):
+    """
+    Posts a killed run already published but never wrote back get their
+    sheet write now, instead of being uploaded a second time. Only rows
+    still Pending with the same video are touched. Returns rows fixed.
+    """
+    jobs = journal.unsynced()
+    if not jobs: return 0
+
+    rows = fetch_rows(sheet, headers, [j["row"] for j in jobs if j["row"] in pending])
+    by_row = {}
+    for j in jobs:
+        i = j["row"]
+        if i not in pending:
+            journal.mark(i, j["platform"], SYNCED)  # Sheet has moved on already
+        elif rows.get(i, {}).get("Video_Drive_Link", "") != j["video_url"]:
+            print(f"   ⚠️ Row {i}: video changed since last run, ignoring journaled post.")
+            journal.forget(i, j["platform"])
+        else:
+            by_row.setdefault(i, {})[j["platform"]] = j
+
+    for i, live in by_row.items():
+        # Same rule as a normal run: the FB link wins when both platforms posted
+        j = live.get("Facebook") or live["Instagram"]
+        writer.update_cell(i, col_status, "POSTED")
+        writer.update_cell(i, col_link, j["link"])
+        writer.update_cell(i, col_duration, f"{j['duration'] or 0} sec")
+        print(f"   🩹 Row {i}: already live on {', '.join(live)}, only updating sheet.")
+        pending.pop(i, None)  # Never upload again, even if the write below fails
+
+    if by_row and writer.flush():
+        for live in by_row.values():
+            for j in live.values(): journal.mark(j["row"], j["platform"], SYNCED)
+    return len(by_row)
+
 # =======================================================
 # 🧠 SMART INSTAGRAM AUTO-DM (FIXED: SPREADSHEET ERROR)
 # =======================================================
 
+# Per-brand keywords + message templates (DM_RULES_JSON), compiled once
+DM_RULES = DMRules.from_env()
+DEFAULT_PRODUCT_LINK = "https://solanki-art.myshopify.com"
+
+# Latest media checked per brand, and how deep we page into one media's new comments
+DM_MEDIA_LIMIT = 50
+DM_COMMENT_PAGES = int(os.environ.get("DM_COMMENT_PAGES", "5"))
+
+def get_dm_store():
+    if "dm" not in _CLIENTS: _CLIENTS["dm"] = DMStore()
+    return _CLIENTS["dm"]
+
+COMMENT_FIELDS = "comments?fields=id,text,username,timestamp&limit=50"
+
+def read_comment_pages(r, since):
+    """
+    Newest-first comment pages down to `since`, at most DM_COMMENT_PAGES of them
+    -> (comments, after cursor if the page budget ran out first, error or None)
+    """
+    comments, pages = [], 0
+    while "data" in r:
+        fresh = [c for c in r["data"] if c.get("timestamp", "") > since]
+        comments.extend(fresh)
+        pages += 1
+        paging = r.get("paging", {})
+        # An already handled comment on this page means we have caught up
+        if len(fresh) < len(r["data"]) or not paging.get("next"): return comments, None, None
+        if pages >= DM_COMMENT_PAGES:
+            cursor = paging.get("cursors", {}).get("after")
+            if cursor: return comments, cursor, None
+        try: r = HTTP.get(paging["next"], timeout=30).json()
+        except Exception as e:
+            r = {"error": {"message": str(e)}}
+    return comments, None, (r.get("error") or {}).get("message", "No comment data")
+
+def scan_new_comments(brands, store):
+    """
+    Incremental comment scan -> [(brand, ig_id, media, [new comments], new mark)].
+    1 /batch: every brand's latest media with comments_count only.
+    1 /batch: comments of the media whose count went up, read newest first
+    down to the timestamp already handled (more pages only if still new).
+    A burst deeper than DM_COMMENT_PAGES keeps the old mark plus a resume
+    cursor, the next run reads on from the cursor before anything newer.
+    Comments dm.db already has a reply for are dropped here, in one lookup.
+    The caller saves the new mark with store.advance(**mark) once the DMs went out.
+    """
+    media_batch = GraphBatch(IG_ACCESS_TOKEN, session=HTTP)
+    for _, ig_id in brands:
+        media_batch.add(f"{ig_id}/media?fields=id,shortcode,comments_count&limit={DM_MEDIA_LIMIT}")
+
+    changed = []  # (brand, ig_id, media, stored mark)
+    for (brand, ig_id), r in zip(brands, media_batch.execute() if brands else []):
+        if "data" not in r:
+            print(f"      ⚠️ Media Fetch Failed ({brand}): {r.get('error', {}).get('message')}")
+            continue
+        marks = store.media_marks(m["id"] for m in r["data"])
+        for media in r["data"]:
+            count = media.get("comments_count", 0)
+            mark = marks.get(media["id"]) or {}
+            if mark.get("resume_after"):
+                changed.append((brand, ig_id, media, mark))  # Unfinished burst from last run
+                continue
+            if mark and count <= mark["comments_count"]:
+                # Nothing new (fewer = comments deleted, remember the lower count)
+                if count < mark["comments_count"]: store.advance(ig_id, media["id"], media.get("shortcode"), count)
+                continue
+            if not count:
+                store.advance(ig_id, media["id"], media.get("shortcode"), 0)
+                continue
+            changed.append((brand, ig_id, media, mark))
+
+    print(f"   🔍 {len(changed)} media with new comments across {len(brands)} brands.")
+    comment_batch = GraphBatch(IG_ACCESS_TOKEN, session=HTTP)
+    for _, _, media, mark in changed:
+        after = f"&after={mark['resume_after']}" if mark.get("resume_after") else ""
+        comment_batch.add(f"{media['id']}/{COMMENT_FIELDS}{after}")
+
+    found = []
+    for (brand, ig_id, media, mark), r in zip(changed, comment_batch.execute() if changed else []):
+        since = mark.get("last_comment_ts") or ""
+        resuming = bool(mark.get("resume_after"))
+        comments, cursor, error = read_comment_pages(r, since)
+        new_mark = {"ig_id": ig_id, "media_id": media["id"], "shortcode": media.get("shortcode"),
+                    "comments_count": media.get("comments_count", 0)}
+        if error and resuming:
+            # Cursor no longer valid: count 0 makes the next run read down from the newest
+            # comment again (dm.db skips the ones already answered)
+            print(f"      ⚠️ Comments Resume Failed ({brand} {media.get('shortcode')}): {error}, rescanning.")
+            store.advance(**dict(new_mark, comments_count=0))
+            continue
+        if error:
+            # Mark stays put, so this media is read again next run
+            print(f"      ⚠️ Comments Fetch Failed ({brand} {media.get('shortcode')}): {error}")
+            continue
+
+        newest = mark.get("resume_newest") if resuming else max((c.get("timestamp", "") for c in comments), default=None)
+        if cursor:
+            # Older new comments are still unread: keep the mark, continue from the cursor next run
+            print(f"      📚 {brand} {media.get('shortcode')}: burst deeper than {DM_COMMENT_PAGES} pages, continuing next run.")
+            new_mark.update(resume_after=cursor, resume_newest=newest)
+        else:
+            new_mark.update(last_comment_ts=newest)
+            # Comments that came in during the burst are above the mark: count 0 = top scan next run
+            if resuming: new_mark["comments_count"] = 0
+        found.append((brand, ig_id, media, comments, new_mark))
+
+    # One dm.db lookup for everything read: comments answered already (this run's
+    # resume overlap, the webhook, DM_Logs imports) never reach the DM workers
+    answered = store.replied_among(c["id"] for _, _, _, comments, _ in found for c in comments)
+    if answered: print(f"   ⏭️ {len(answered)} comments already answered, skipping.")
+    return [(brand, ig_id, media, [c for c in comments if c["id"] not in answered], mark)
+            for brand, ig_id, media, comments, mark in found]
+
+def load_product_map(sheet):
+    """Reel shortcode -> product link, from the Link + Product Link columns"""
+    product_map = {}
+    for row in scan_columns(sheet, sheet.row_values(1), PRODUCT_COLUMNS):
+        uploaded_link = str(row.get("Link", "")).strip()
+        # Handle "Product Link" (Space) or "Product_Link" (Underscore)
+        buying_link = str(row.get("Product Link", "")).strip()
+        if not buying_link: buying_link = str(row.get("Product_Link", "")).strip()
+
+        if uploaded_link and buying_link and "instagram.com" in uploaded_link:
+            try:
+                parts = uploaded_link.split("/reel/")
+                if len(parts) > 1:
+                    shortcode = parts[1].split("/")[0]
+                    product_map[shortcode] = buying_link
+            except: pass
+    return product_map
+
+def get_dm_log_sheet(sheet):
+    """DM_Logs tab (FIXED: Added .spreadsheet), created on first use"""
+    try:
+        # 👇 HERE WAS THE ERROR: Now we use sheet.spreadsheet to access other tabs
+        return sheet.spreadsheet.worksheet("DM_Logs")
+    except:
+        # Create if not exists (using spreadsheet object)
+        log_sheet = sheet.spreadsheet.add_worksheet(title="DM_Logs", rows="2000", cols="4")
+        log_sheet.append_row(["Comment_ID", "User", "Message_Sent", "Time"])
+        return log_sheet
+
+def sync_dm_store(store, log_sheet):
+    """
+    Imports DM_Logs rows added since the last sync into dm.db (first run: all
+    of them). A webhook or poller on another machine has its own dm.db, the
+    sheet is where they see each other's replies.
+    """
+    start = store.log_rows_synced() + 2  # Row 1 is the header
+    try:
+        rows = log_sheet.get(f"A{start}:A")
+        added = store.import_logged([r[0] for r in rows if r], start - 2 + len(rows))
+        if added: print(f"   📥 DM dedup index: {added} comments answered elsewhere imported from DM_Logs.")
+        return True
+    except Exception as e:
+        print(f"   ⚠️ DM_Logs Read Error: {e}")
+        return False
+
+def send_comment_dm(ig_id, comment_id, text):
+    """Private reply to a comment -> Graph response dict"""
+    reply_url = f"https://graph.facebook.com/v19.0/{ig_id}/messages"
+    payload = {
+        "recipient": {"comment_id": comment_id},
+        "message": {"text": text}
+    }
+    headers = {"Authorization": f"OAuth {IG_ACCESS_TOKEN}"}
+    r = HTTP.post(reply_url, json=payload, headers=headers, timeout=30)
+    try: data = r.json()
+    except ValueError: data = {"error": {"message": r.text[:200]}}
+    # Plain HTTP 429s count as throttling too (see DM_DISPATCH)
+    if r.status_code == 429: data.setdefault("error", {}).setdefault("code", 429)
+    return data
+
+# Every DM (polling + webhook) goes through here: per-account rate limit + throttle retries
+DM_DISPATCH = DMDispatcher(send_comment_dm)
+
+def handle_comment(store, brand, ig_id, comment, shortcode, product_map, send=None):
+    """
+    Keyword check + dedup + DM for one comment -> "sent", "skipped",
+    "undeliverable" (Graph refused for good, logged and not retried) or
+    "failed" (claim released, tried again later).
+    Shared by the polling scan and dm_webhook.py.
+    """
+    send = send or DM_DISPATCH.send
+    c_id = comment["id"]
+    c_user = comment.get("username", "Unknown")
+    keyword = DM_RULES.match(brand, comment.get("text", ""))
+    if not keyword: return "skipped"
+    # Claim first: the webhook, the polling scan and their workers may all see this comment
+    if not store.claim_reply(c_id, c_user): return "skipped"
+
+    print(f"      💡 {c_user} wants {shortcode} ({brand}, \"{keyword}\"). Sending link...")
+    link = product_map.get(shortcode, DEFAULT_PRODUCT_LINK)
+    try:
+        result = send(ig_id, c_id, DM_RULES.message(brand, c_user, link))
+    except Exception as e:
+        result = {"error": {"message": str(e)}}
+    if "recipient_id" in result:
+        print(f"      ✅ DM SENT!")
+        store.confirm_reply(c_id)
+        return "sent"
+    error = result.get("error") or {}
+    if error.get("code") in PERMANENT_DM_CODES:
+        print(f"      🚫 DM Not Possible: {error.get('message')}")
+        store.confirm_reply(c_id, f"Not sent: {error.get('message')}"[:200])
+        return "undeliverable"
+    print(f"      ⚠️ DM Failed: {error.get('message')}")
+    store.release_reply(c_id)
+    return "failed"
+
 def run_instagram_auto_dm(sheet):
-    print("\n🤖 === STARTING SMART DM CHECK (Limit 50) ===") 
+    print("\n🤖 === STARTING SMART DM CHECK (New Comments Only) ===") 
     
     # 1. Sheet Read Logic
     try:
-        all_records = sheet.get_all_records()
-        product_map = {} 
-        
-        for row in all_records:
-            uploaded_link = str(row.get("Link", "")).strip()
-            # Handle "Product Link" (Space) or "Product_Link" (Underscore)
-            buying_link = str(row.get("Product Link", "")).strip()
-            if not buying_link: buying_link = str(row.get("Product_Link", "")).strip()
-
-            if uploaded_link and buying_link and "instagram.com" in uploaded_link:
-                try:
-                    parts = uploaded_link.split("/reel/")
-                    if len(parts) > 1:
-                        shortcode = parts[1].split("/")[0]
-                        product_map[shortcode] = buying_link
-                except: pass
-                    
+        product_map = load_product_map(sheet)
         print(f"   📊 Loaded {len(product_map)} products from sheet.")
     except Exception as e:
         print(f"   ⚠️ Sheet Read Error: {e}")
         return
 
-    # 2. Log Book (FIXED: Added .spreadsheet)
+    # 2. Log Book
+    log_sheet = get_dm_log_sheet(sheet)
+    store = get_dm_store()
+    if not sync_dm_store(store, log_sheet): return
+
+    # 3. Scanning Logic (only media whose comment count moved since last run)
+    brands = [(brand, config.get("ig_id")) for brand, config in BRAND_CONFIG.items() if config.get("ig_id")]
     try:
-        # 👇 HERE WAS THE ERROR: Now we use sheet.spreadsheet to access other tabs
-        log_sheet = sheet.spreadsheet.worksheet("DM_Logs")
-    except:
-        # Create if not exists (using spreadsheet object)
-        log_sheet = sheet.spreadsheet.add_worksheet(title="DM_Logs", rows="2000", cols="4")
-        log_sheet.append_row(["Comment_ID", "User", "Message_Sent", "Time"])
-    
-    replied_ids = log_sheet.col_values(1)
-    keywords = ["BUY", "LINK", "SHOP", "PRICE", "ORDER", "WANT", "PP", "INTERESTED"]
-    default_link = "https://solanki-art.myshopify.com"
-
-    # 3. Scanning Logic
-    for brand, config in BRAND_CONFIG.items():
-        ig_id = config.get("ig_id")
-        if not ig_id: continue
-        
-        print(f"   🔍 Scanning {brand} (Limit 50)...")
-        url = f"https://graph.facebook.com/v19.0/{ig_id}/media?fields=shortcode,comments{{text,username,id}}&limit=50&access_token={IG_ACCESS_TOKEN}"
-        
-        try:
-            r = requests.get(url).json()
-            if "data" not in r: continue
-            
-            new_replies = []
-            for media in r["data"]:
-                media_shortcode = media.get("shortcode")
-                final_link = product_map.get(media_shortcode, default_link)
-                
-                if "comments" in media:
-                    for comment in media["comments"]["data"]:
-                        c_id = comment["id"]
-                        c_text = comment["text"].upper()
-                        c_user = comment.get("username", "Unknown")
-                        
-                        if any(k in c_text for k in keywords) and c_id not in replied_ids:
-                            print(f"      💡 {c_user} wants {media_shortcode}. Sending link...")
-                            reply_url = f"https://graph.facebook.com/v19.0/{ig_id}/messages"
-                            payload = {
-                                "recipient": {"comment_id": c_id},
-                                "message": {"text": f"Hey {c_user}! 👋 Here is the link you asked for: {final_link}"}
-                            }
-                            headers = {"Authorization": f"OAuth {IG_ACCESS_TOKEN}"}
-                            send = requests.post(reply_url, json=payload, headers=headers).json()
-                            
-                            if "recipient_id" in send:
-                                print(f"      ✅ DM SENT!")
-                                new_replies.append([c_id, c_user, "Sent", str(datetime.now())])
-                                replied_ids.append(c_id)
-            
-            if new_replies:
-                for row in new_replies:
-                    log_sheet.append_row(row)
-                    time.sleep(1)
-        except Exception as e:
-            print(f"      ⚠️ Error in {brand}: {e}")
+        found = scan_new_comments(brands, store)
+    except Exception as e:
+        print(f"      ⚠️ Comment Scan Error: {e}")
+        return
+
+    # New replies go to DM_Logs in batches from a background thread
+    mirror = DMLogMirror(store, log_sheet).start()
+
+    # Every brand's comments at once, DM_DISPATCH keeps each account under its rate limit
+    with ThreadPoolExecutor(max_workers=DM_WORKERS) as pool:
+        jobs = [
+            (brand, mark,
+             [pool.submit(handle_comment, store, brand, ig_id, c, media.get("shortcode"), product_map) for c in comments])
+            for brand, ig_id, media, comments, mark in found
+        ]
+        for brand, mark, futures in jobs:
+            try:
+                results = [f.result() for f in futures]
+                # A DM that may still go through keeps the mark, so this media is retried next run
+                if "failed" not in results: store.advance(**mark)
+            except Exception as e:
+                print(f"      ⚠️ Error in {brand}: {e}")
+    mirror.stop()
     print("🤖 === SMART DM FINISHED ===\n")
 
 # =======================================================
 # 🚀 MAIN EXECUTION (ULTRA SHORT CAPTION + FULL FB DESC)
 # =======================================================
 
-def start_bot():
+def start_bot(stop_event=None, window=SNIPER_WINDOW):
     print("-" * 50)
     print(f"⏰ SUPER-BOT STARTED (Ultra Short Insta + Full FB)...")
     
     # 👇 MAIN STORE LINK (For Facebook)
     MAIN_STORE_URL = "https://solanki-art.myshopify.com"
     
-    sheet, drive_service = get_services()
+    creds = get_credentials()
+    if not creds: return
+
+    # ⚡ PRE-CHECK: Sheet untouched + nothing due yet = skip uploads & analytics
+    state = load_state(STATE_NAME)
+    modified_time = get_sheet_modified_time(creds, DROPSHIPPING_SHEET_ID)
+    if should_skip_run(state, modified_time, get_ist_time(), window):
+        print(f"💤 Sheet unchanged, next post at {state.get('next_due')}. Skipping uploads.")
+        # Comments don't show up in the sheet, so the DM check still runs
+        sheet, _ = get_services(creds)
+        if sheet: run_instagram_auto_dm(sheet)
+        state["modified_time"] = modified_time
+        save_state(STATE_NAME, state)
+        return
+
+    sheet, drive_service = get_services(creds)
     if not sheet: return
 
+    # Every brand's page token in one request (none at all when the disk cache is fresh)
+    PAGE_TOKENS.prefetch(c.get("fb_id") for c in BRAND_CONFIG.values())
+
+    journal = get_journal()
+    analytics = get_analytics_schedule()
+    writer = SheetWriteBuffer(sheet)
+
     try:
-        records = sheet.get_all_records()
         headers = sheet.row_values(1)
         # Dynamic Column Finding
         try: col_status = headers.index("Status") + 1
@@ -386,47 +729,66 @@ def start_bot():
         except: col_views = 0
         try: col_likes = headers.index("Likes") + 1
         except: col_likes = 0
+
+        # PHASE 1: Status/Date/Platform columns only
+        scan = scan_columns(sheet, headers, SCAN_COLUMNS)
+        pending = {
+            r["_row"]: parse_schedule_time(r["Date"], r["Schedule_Time"]) for r in scan
+            if r["Status"].strip() == "Pending"
+            and ("Instagram" in r["Platform"] or "Facebook" in r["Platform"])
+        }
+
+        # PHASE 0: Finish what a killed run left half done (sheet write only, no re-upload)
+        reconcile_journal(journal, sheet, headers, pending, writer, col_status, col_link, col_duration)
+
+        ist_now = get_ist_time()
+        due_rows = [row for row, dt in pending.items() if dt and (dt - ist_now).total_seconds() <= window]
+        print(f"🔎 Scanned {len(scan)} rows, {len(due_rows)} due.")
+
+        # PHASE 2: Full data only for the due rows
+        records = fetch_rows(sheet, headers, due_rows)
         
-    except: return
+    except Exception as e:
+        print(f"❌ Error Reading Sheet: {e}")
+        return
 
     count = 0
 
-    # PART 1: UPLOAD
-    for i, row in enumerate(records, start=2):
-        status = str(row.get("Status", "")).strip()
+    # PART 1: UPLOAD (min-heap by schedule time, downloads run ahead)
+    scheduler = JobScheduler(
+        get_ist_time,
+        prefetch=lambda job: download_video_securely(drive_service, job["video_url"]),
+        prefetch_ahead=window,
+        stop_event=stop_event,
+    )
+
+    # Rows sharing one video + schedule time become one job: one download, parallel uploads
+    groups = {}
+    for i, row in sorted(records.items()):
+        brand = str(row.get("Account Name", "")).strip().upper()
+
+        if brand not in BRAND_CONFIG:
+            print(f"   ⚠️ Row {i}: Unknown brand '{brand}', skipping.")
+            pending.pop(i, None)  # Can't be posted, so it must not hold next_due in the past
+            continue
+
+        # ✅ FETCH FULL DETAILS
+        title = str(row.get("Title_Hook", "")).strip()
+        desc = str(row.get("Discription", "")).strip()
+        hashtags = str(row.get("Hastag", "")).strip()
+        
+        # Fetch Link (Try both spellings)
+        product_link = str(row.get("Product Link", "")).strip()
+        if not product_link:
+            product_link = str(row.get("Product_Link", "")).strip()
         
-        if status == "Pending":
-            sheet_date = str(row.get("Date", "")).strip()
-            sheet_time = str(row.get("Schedule_Time", "")).strip()
-            brand = str(row.get("Account Name", "")).strip().upper()
-
-            print(f"\n👉 Checking Row {i}: {brand}")
-
-            if check_time_and_wait(sheet_date, sheet_time):
-                if brand in BRAND_CONFIG:
-                    ig_id = BRAND_CONFIG[brand].get("ig_id")
-                    fb_id = BRAND_CONFIG[brand].get("fb_id")
-                    platform = str(row.get("Platform", "")).strip()
-                    
-                    video_url = row.get("Video_Drive_Link", "")
-                    
-                    # ✅ FETCH FULL DETAILS
-                    title = str(row.get("Title_Hook", "")).strip()
-                    desc = str(row.get("Discription", "")).strip()
-                    hashtags = str(row.get("Hastag", "")).strip()
-                    
-                    # Fetch Link (Try both spellings)
-                    product_link = str(row.get("Product Link", "")).strip()
-                    if not product_link:
-                        product_link = str(row.get("Product_Link", "")).strip()
-                    
-                    # ---------------------------------------------------------
-                    # 🔥 SMART CAPTION LOGIC (NEW STRATEGY)
-                    # ---------------------------------------------------------
-                    
-                    # 1. FACEBOOK (Title + Link + Main Link + Desc + Hashtags)
-                    # આમાં બધું જ નાખ્યું છે. ગ્રાહકને બધું મળે.
-                    fb_caption = f"""🔥 {title}
+        # ---------------------------------------------------------
+        # 🔥 SMART CAPTION LOGIC (NEW STRATEGY)
+        # ---------------------------------------------------------
+        
+        # 1. FACEBOOK (Title + Link + Main Link + Desc + Hashtags)
+        # આમાં બધું જ નાખ્યું છે. ગ્રાહકને બધું મળે.
+        fb_caption = f"""🔥 {title}
 
 🛒 BUY HERE: {product_link}
 
@@ -436,80 +798,194 @@ def start_bot():
 
 {hashtags}"""
 
-                    # 2. INSTAGRAM (Ultra Short & Punchy)
-                    # ટાઈટલ પણ કાઢી નાખ્યું. માત્ર "Buy" અને "Link".
-                    ig_caption = f"💬 Comment 'BUY' for Link! 🔗\nOr Link in Bio 🏠\n.\n{hashtags}"
-                    
-                    # ---------------------------------------------------------
-                    
-                    local_file = download_video_securely(drive_service, video_url)
-                    
-                    if local_file:
-                        success = False
-                        final_link = ""
-                        duration = 0
-
-                        # --- INSTAGRAM UPLOAD ---
-                        if "Instagram" in platform:
-                            s, l, d = upload_to_instagram_resumable(brand, ig_id, local_file, ig_caption)
-                            if s: 
-                                success = True
-                                final_link = l
-                                duration = d
-                                
-                        # --- FACEBOOK UPLOAD ---
-                        if "Facebook" in platform:
-                            s, l, d, vid_id = upload_to_facebook(brand, fb_id, local_file, fb_caption)
-                            if s:
-                                success = True
-                                final_link = l 
-                                duration = d
-                                
-                                # 🔥 AUTO-COMMENT FEATURE
-                                if product_link and vid_id:
-                                    print("      ⏳ Waiting 10s before commenting...")
-                                    time.sleep(10)
-                                    comment_msg = f"🛍️ Grab yours here! 👇\n{product_link}\n\n🔥 Limited Stock!"
-                                    post_facebook_comment(vid_id, comment_msg, fb_id)
-
-                        if os.path.exists(local_file): os.remove(local_file)
-
-                        if success:
-                            sheet.update_cell(i, col_status, "POSTED")
-                            
-                            if col_link > 0: 
-                                sheet.update_cell(i, col_link, final_link)
-                            if col_duration > 0: 
-                                sheet.update_cell(i, col_duration, f"{duration} sec")
-                                
-                            print(f"      ✅ Success! Link: {final_link}")
-                            count += 1
-                            time.sleep(10)
-            else:
-                pass 
-
-    # PART 2: ANALYTICS (Last 20)
-    print("\n📊 Checking Analytics...")
-    records = sheet.get_all_records()
-    check_limit = 0
-    for i in range(len(records), 1, -1):
-        if check_limit >= 20: break
+        # 2. INSTAGRAM (Ultra Short & Punchy)
+        # ટાઈટલ પણ કાઢી નાખ્યું. માત્ર "Buy" અને "Link".
+        ig_caption = f"💬 Comment 'BUY' for Link! 🔗\nOr Link in Bio 🏠\n.\n{hashtags}"
         
-        row = records[i-2]
+        # ---------------------------------------------------------
+
+        video_url = row.get("Video_Drive_Link", "")
+
+        # Broken rows wait out their backoff instead of eating every run's time
+        waiting = journal.backoff(i, extract_drive_id(video_url) or video_url)
+        if waiting:
+            pending[i] = get_ist_time() + timedelta(seconds=waiting["next_try"] - time.time())
+            print(f"   🔁 Row {i}: failed {waiting['attempts']}x ({waiting['reason']}), next try after {pending[i].strftime('%H:%M')}.")
+            continue
+
+        group_key = (extract_drive_id(video_url) or video_url, pending[i])
+        groups.setdefault(group_key, []).append({
+            "row": i,
+            "brand": brand,
+            "platform": str(row.get("Platform", "")).strip(),
+            "ig_id": BRAND_CONFIG[brand].get("ig_id"),
+            "fb_id": BRAND_CONFIG[brand].get("fb_id"),
+            "video_url": video_url,
+            "product_link": product_link,
+            "fb_caption": fb_caption,
+            "ig_caption": ig_caption,
+        })
+
+    for (_, when), rows in groups.items():
+        scheduler.add(when, {"video_url": rows[0]["video_url"], "rows": rows})
+
+    posted = set()  # Rows already marked POSTED in this run
+    recorded = []  # (row, platform) written to the buffer but not flushed yet
+
+    def record_post(i, platforms, final_link, duration):
+        nonlocal count
+        recorded.extend((i, p) for p in platforms)
+        writer.update_cell(i, col_status, "POSTED")
+        writer.update_cell(i, col_link, final_link)
+        writer.update_cell(i, col_duration, f"{duration} sec")
+        print(f"      ✅ Row {i} Success! Link: {final_link}")
+        analytics.posted(final_link)
+        if i not in posted: count += 1
+        posted.add(i)
+        pending.pop(i, None)
+
+    def record_failure(i, video_url, kind, reason):
+        """Backs the row off, or gives up on it with FAILED_<kind> after FAIL_MAX_TRIES"""
+        attempts, next_try = journal.record_failure(i, extract_drive_id(video_url) or video_url, reason)
+        if attempts >= FAIL_MAX_TRIES:
+            writer.update_cell(i, col_status, f"FAILED_{kind}")
+            pending.pop(i, None)
+            print(f"      ⛔ Row {i}: {reason} ({attempts} tries), marked FAILED_{kind}.")
+        else:
+            pending[i] = get_ist_time() + timedelta(seconds=next_try - time.time())
+            print(f"      🔁 Row {i}: {reason} (try {attempts}/{FAIL_MAX_TRIES}), retry after {pending[i].strftime('%H:%M')}.")
+
+    def checkpoint():
+        """Flush, then mark the flushed posts as synced in the journal"""
+        if writer.flush():
+            for i, platform in recorded: journal.mark(i, platform, SYNCED)
+            recorded.clear()
+
+    # IG phases 2 + 3: containers of every due reel process side by side
+    ig_publisher = ReelPublisher(IG_ACCESS_TOKEN, session=HTTP)
+
+    def on_ig_published(i, video_url, started):
+        def _done(success, link):
+            if not success:
+                journal.mark(i, "Instagram", DOWNLOADED)  # Container is no good, upload fresh next time
+                if i not in posted: record_failure(i, video_url, "UPLOAD", "IG processing/publish failed")
+                return
+            duration = int(time.time() - started)
+            journal.mark(i, "Instagram", PUBLISHED, link=link, duration=duration)
+            journal.clear_failure(i, extract_drive_id(video_url) or video_url)
+            if i in posted:
+                # The FB link wins when both platforms posted
+                recorded.append((i, "Instagram"))
+            else:
+                record_post(i, ["Instagram"], link, duration)
+            checkpoint()
+        return _done
+
+    def post_job(job, download):
+        fresh = []
+        for r in job["rows"]:
+            print(f"\n👉 Posting Row {r['row']}: {r['brand']} | {r['platform']}")
+            # Write-ahead: claim before any work, keep an IG container a killed run already uploaded
+            for platform in ("Instagram", "Facebook"):
+                if platform in r["platform"] and journal.claim(r["row"], platform, r["video_url"]) is None:
+                    fresh.append((r["row"], platform))
+            r["container_id"] = journal.reusable_container(r["row"], "Instagram", r["video_url"])
+            if r["container_id"]:
+                print(f"      ♻️ Reusing IG container {r['container_id']} from last run.")
+
+        local_file = download.result() if download else None
+        if not local_file:
+            print("      ⚠️ Skipping: Download failed.")
+            for r in job["rows"]: record_failure(r["row"], r["video_url"], "DOWNLOAD", "Download failed")
+            return
+        for i, platform in fresh: journal.mark(i, platform, DOWNLOADED)
+
+        # One target per (row, platform): a row can ask for both IG and FB
+        targets = []
+        for r in job["rows"]:
+            if "Instagram" in r["platform"]:
+                targets.append({"key": (r["row"], "Instagram"), "platform": "Instagram", "failed": (False, "", 0),
+                                "upload": lambda r=r: publish_instagram(r, local_file, journal)})
+            if "Facebook" in r["platform"]:
+                targets.append({"key": (r["row"], "Facebook"), "platform": "Facebook", "failed": (False, "", 0),
+                                "upload": lambda r=r: publish_facebook_with_comment(r, local_file, journal)})
+        results = fan_out(targets)
+
+        for r in job["rows"]:
+            i = r["row"]
+            success = False
+            final_link = ""
+            duration = 0
+            live = []
+            queued = False
+            # Same order as before: the FB link wins when both platforms posted
+            for platform in ("Instagram", "Facebook"):
+                result = results.get((i, platform), (False, "", 0))
+                if isinstance(result, QueuedReel):
+                    # Uploaded, IG processes it while the next reels upload
+                    ig_publisher.add(result.container_id, on_ig_published(i, r["video_url"], result.started), ig_user_id=r["ig_id"])
+                    queued = True
+                    continue
+                s, l, d = result
+                if s:
+                    success = True
+                    final_link = l
+                    duration = d
+                    live.append(platform)
+
+            if success:
+                record_post(i, live, final_link, duration)
+                journal.clear_failure(i, extract_drive_id(r["video_url"]) or r["video_url"])
+            elif not queued:
+                record_failure(i, r["video_url"], "UPLOAD", f"{' + '.join(p for p in ('Instagram', 'Facebook') if p in r['platform'])} upload failed")
+
+        # Checkpoint: posts are live, don't risk losing their status
+        checkpoint()
+
+    scheduler.run(post_job, idle=ig_publisher.poll_once)
+    ig_publisher.drain()
+
+    # PART 2: ANALYTICS (FB posts due by age, 50 per /batch request)
+    analytics_rows = []
+    if count > 0 or analytics_stale(state):
+        print("\n📊 Checking Analytics...")
+        try: analytics_rows = scan_columns(sheet, headers, ANALYTICS_COLUMNS)
+        except Exception as e:
+            print(f"   ⚠️ Analytics Read Error: {e}")
+        state["last_analytics"] = time.time()
+    else:
+        print("\n📊 Analytics refreshed recently, skipping.")
+
+    # Every run for the 1st hour after posting, hourly for a day, daily after
+    posted_rows = []
+    for row in analytics_rows:
         status = str(row.get("Status", "")).strip()
-        link = str(row.get("Link", "")).strip()
-        
-        if status == "POSTED" and link != "":
-            likes = 0
-            if "facebook.com" in link:
-                try: vid_id = link.split("/videos/")[1].replace("/","")
-                except: vid_id = ""
-                if vid_id: likes = get_facebook_metrics(vid_id)
-            
-            if likes > 0:
-                if col_likes > 0: sheet.update_cell(i, col_likes, likes)
-                print(f"   🔄 Updated Likes Row {i}: {likes}")
-            check_limit += 1
+        key = post_key(row.get("Link"))
+        if status == "POSTED" and key and key.startswith("fb:"): posted_rows.append((row, key))
+    due = analytics.due(key for _, key in posted_rows)
+    fb_videos = [(row, key[3:]) for row, key in posted_rows if key in due]
+    if analytics_rows:
+        print(f"   ⏱️ {len(fb_videos)} of {len(posted_rows)} posts due for a refresh.")
+
+    fb_likes = get_facebook_likes([vid_id for _, vid_id in fb_videos]) if fb_videos else {}
+    for row, vid_id in fb_videos:
+        likes = fb_likes.get(vid_id, 0)
+        # Only changed cells go into the batch write
+        if likes > 0 and str(likes) != str(row.get("Likes", "")).strip():
+            writer.update_cell(row["_row"], col_likes, likes)
+            print(f"   🔄 Updated Likes Row {row['_row']}: {likes}")
+
+    # Local history of every sample (FB gives us likes only)
+    samples = [(f"fb:{vid_id}", row.get("Account Name"), None, fb_likes[vid_id])
+               for row, vid_id in fb_videos if vid_id in fb_likes]
+    save_metrics(samples)
+    # Posts that came back empty (deleted, unknown brand, API error) back off instead
+    got = {key for key, _, _, _ in samples}
+    analytics.refreshed(got)
+    analytics.missed(set(due) - got)
+    state["analytics_due"] = analytics.next_due()
+
+    checkpoint()
 
     if count == 0:
         print("💤 No new posts. Analytics updated.")
@@ -519,5 +995,21 @@ def start_bot():
     # 🔥 RUN AUTO-DM BOT (INSTAGRAM ONLY)
     run_instagram_auto_dm(sheet)
 
+    # Remember when to wake up (failed rows stay past-due, so they retry next run)
+    state["next_due"] = next_due_time(pending.values())
+    # The time read *before* the run: edits made while we ran must trigger the next run.
+    # Our own writes cost one extra full run, which is fine.
+    state["modified_time"] = modified_time
+    save_state(STATE_NAME, state)
+
 if __name__ == "__main__":
-    start_bot()
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--daemon", action="store_true", help="Keep running and poll the sheet every --interval seconds")
+    parser.add_argument("--interval", type=int, default=POLL_INTERVAL)
+    args = parser.parse_args()
+
+    if args.daemon:
+        # Only rows due before the next poll are scheduled, so a poll is never blocked for long
+        run_daemon(lambda stop_event: start_bot(stop_event, window=args.interval), args.interval)
+    else:
+        start_bot()
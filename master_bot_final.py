@@ -1,15 +1,26 @@
 import os
 import time
 import json
+import argparse
 import requests
 import io
 import gspread
 from datetime import datetime, timedelta
 from google.oauth2.service_account import Credentials
 from googleapiclient.discovery import build
-from googleapiclient.http import MediaIoBaseDownload, MediaFileUpload
-from google.oauth2.credentials import Credentials as UserCredentials
-from google.auth.transport.requests import Request
+from googleapiclient.http import MediaIoBaseDownload
+from sheet_io import SheetWriteBuffer, scan_columns, fetch_rows
+from scheduler import JobScheduler, run_daemon
+from fanout import fan_out
+from streaming_upload import post_multipart
+from youtube_resume import resumable_insert
+from youtube_clients import YouTubeClientPool
+from analytics import AnalyticsSchedule, post_key
+from metrics_store import MetricsStore
+from job_journal import JobJournal, DOWNLOADED, UPLOADED, PUBLISHED, SYNCED, FAIL_MAX_TRIES
+from graph_api import GRAPH_DOMAIN, IG_BATCH_PUBLISH, FB_CHUNKED, ReelPublisher, QueuedReel, PageTokenCache, already_published_link, wait_for_container, upload_video_chunked, fetch_objects
+from video_cache import VIDEO_CACHE, extract_drive_id, file_md5
+from run_state import load_state, save_state, get_sheet_modified_time, should_skip_run, analytics_stale, next_due_time
 
 # =======================================================
 # 💎 CONFIGURATION (IG + FB + YOUTUBE)
@@ -51,6 +62,36 @@ BRAND_CONFIG = {
 SPREADSHEET_ID = "1Kdd01UAt5rz-9VYDhjFYL4Dh35gaofLipbsjyl8u8hY"
 SCOPES = ["https://www.googleapis.com/auth/spreadsheets", "https://www.googleapis.com/auth/drive"]
 
+# Keep-alive HTTP session for Graph API calls (stays warm across daemon cycles)
+HTTP = requests.Session()
+POLL_INTERVAL = int(os.environ.get("POLL_INTERVAL_SEC", "60"))
+
+# Credentials, gspread client and Drive service are built once per process
+_CLIENTS = {}
+STATE_NAME = "content_bot" # .bot_state/content_bot.json
+
+# One YouTube login + client per brand, shared by uploads and analytics
+YT_CLIENTS = YouTubeClientPool(YOUTUBE_CONFIG)
+
+# Page tokens: one batched fetch at startup, encrypted in .bot_state between runs
+PAGE_TOKENS = PageTokenCache(IG_ACCESS_TOKEN, session=HTTP)
+
+# Phase-1 scan reads only these columns, full rows are fetched just for due posts
+SCAN_COLUMNS = {
+    "Status": ["Status"],
+    "Schedule_Date": ["Schedule_Date"],
+    "Schedule_Time": ["Schedule_Time"],
+    "Platform": ["Platform"],
+}
+ANALYTICS_COLUMNS = {
+    "Status": ["Status"],
+    "Link": ["Link"],
+    "Brand_Name": ["Brand_Name"],
+    "Views": ["Views"],
+    "Likes": ["Likes"],
+}
+SUPPORTED_PLATFORMS = ["Instagram", "Facebook", "Youtube"]
+
 # =======================================================
 # 🧠 SNIPER TIME LOGIC (UPDATED FOR ALL DATE FORMATS)
 # =======================================================
@@ -60,78 +101,59 @@ def get_ist_time():
     ist_now = utc_now + timedelta(hours=5, minutes=30)
     return ist_now
 
-def check_time_and_wait(sheet_date_str, sheet_time_str):
+SNIPER_WINDOW = 300 # Rows due within 5 mins are picked up in this run
+
+def parse_schedule_time(sheet_date_str, sheet_time_str):
     """
-    Checks time. If < 5 mins remain, it WAITS (Sleeps).
+    Sheet Date + Time -> datetime (IST). None if blank or unknown format.
     """
-    try:
-        ist_now = get_ist_time()
-        
-        # Clean Inputs
-        date_clean = str(sheet_date_str).strip()
-        time_clean = str(sheet_time_str).strip().upper() 
-        
-        if not date_clean or not time_clean:
-            return False
-
-        full_time_str = f"{date_clean} {time_clean}"
-        
-        # 👇 UPDATED DATE PARSING LOGIC (Handles US & Indian Formats)
-        formats_to_try = [
-            "%d/%m/%Y %I:%M %p",  # 21/12/2025 2:30 PM (Indian)
-            "%m/%d/%Y %I:%M %p",  # 12/21/2025 2:30 PM (US Style - Sheet Default)
-            "%d/%m/%Y %I:%M%p",   # 21/12/2025 2:30PM
-            "%m/%d/%Y %I:%M%p",   # 12/21/2025 2:30PM
-            "%d/%m/%Y %H:%M",     # 24 Hour format
-            "%Y-%m-%d %H:%M:%S"   # ISO Format
-        ]
-        
-        scheduled_dt = None
-        for fmt in formats_to_try:
-            try:
-                scheduled_dt = datetime.strptime(full_time_str, fmt)
-                break # Jo format match thay to loop stop karo
-            except ValueError:
-                continue
-                
-        if not scheduled_dt:
-            print(f"      ⚠️ Date Format Unknown: {full_time_str}")
-            return False
-
-        # Time Difference
-        time_diff = (scheduled_dt - ist_now).total_seconds()
-        
-        print(f"      🕒 Scheduled: {scheduled_dt.strftime('%d/%m %H:%M')} | Now: {ist_now.strftime('%d/%m %H:%M')} | Gap: {int(time_diff)}s")
-
-        if time_diff <= 0:
-            return True 
-        elif 0 < time_diff <= 300:
-            print(f"      👀 TARGET LOCKED! Waiting {int(time_diff)}s...")
-            time.sleep(time_diff + 2) 
-            return True
-        else:
-            print(f"      💤 Too early.")
-            return False 
+    # Clean Inputs
+    date_clean = str(sheet_date_str).strip()
+    time_clean = str(sheet_time_str).strip().upper() 
+    
+    if not date_clean or not time_clean:
+        return None
 
-    except Exception as e:
-        print(f"      ⚠️ Time Check Error: {e}")
-        return False 
+    full_time_str = f"{date_clean} {time_clean}"
+    
+    # 👇 UPDATED DATE PARSING LOGIC (Handles US & Indian Formats)
+    formats_to_try = [
+        "%d/%m/%Y %I:%M %p",  # 21/12/2025 2:30 PM (Indian)
+        "%m/%d/%Y %I:%M %p",  # 12/21/2025 2:30 PM (US Style - Sheet Default)
+        "%d/%m/%Y %I:%M%p",   # 21/12/2025 2:30PM
+        "%m/%d/%Y %I:%M%p",   # 12/21/2025 2:30PM
+        "%d/%m/%Y %H:%M",     # 24 Hour format
+        "%Y-%m-%d %H:%M:%S"   # ISO Format
+    ]
+    
+    for fmt in formats_to_try:
+        try:
+            return datetime.strptime(full_time_str, fmt) # Jo format match thay to loop stop karo
+        except ValueError:
+            continue
+            
+    print(f"      ⚠️ Date Format Unknown: {full_time_str}")
+    return None
 
 # =======================================================
 # ⚙️ SYSTEM CORE (SECURE CONNECT)
 # =======================================================
 
 def get_credentials():
+    if "creds" in _CLIENTS: return _CLIENTS["creds"]
+    creds = None
     creds_json = os.environ.get("GCP_CREDENTIALS") or os.environ.get("GOOGLE_APPLICATION_CREDENTIALS_JSON")
     if creds_json:
         creds_dict = json.loads(creds_json)
-        return Credentials.from_service_account_info(creds_dict, scopes=SCOPES)
+        creds = Credentials.from_service_account_info(creds_dict, scopes=SCOPES)
     elif os.path.exists("gkey.json"):
-        return Credentials.from_service_account_file("gkey.json", scopes=SCOPES)
-    return None
+        creds = Credentials.from_service_account_file("gkey.json", scopes=SCOPES)
+    if creds: _CLIENTS["creds"] = creds
+    return creds
 
-def get_services():
-    creds = get_credentials()
+def get_services(creds=None):
+    if "sheet" in _CLIENTS: return _CLIENTS["sheet"], _CLIENTS["drive"]
+    creds = creds or get_credentials()
     if not creds: return None, None
     client = gspread.authorize(creds)
     
@@ -143,6 +165,7 @@ def get_services():
         sheet = client.open("Content").sheet1
 
     drive_service = build('drive', 'v3', credentials=creds)
+    _CLIENTS["sheet"], _CLIENTS["drive"] = sheet, drive_service
     return sheet, drive_service
 
 # =======================================================
@@ -152,121 +175,152 @@ def get_services():
 def get_page_access_token(page_id):
     """
     🔥 FIX: Exchanges User Token for Page Token to solve Permission Error
+    Served from PAGE_TOKENS, so the Graph call happens once, not per upload.
     """
-    try:
-        url = f"https://graph.facebook.com/v19.0/{page_id}?fields=access_token&access_token={IG_ACCESS_TOKEN}"
-        r = requests.get(url).json()
-        if "access_token" in r:
-            return r["access_token"]
-        print(f"      ⚠️ Page Token Fetch Failed: {r.get('error', {}).get('message')}")
-        return IG_ACCESS_TOKEN # Fallback
-    except: return IG_ACCESS_TOKEN
-
-def get_facebook_metrics(video_id):
-    """Fetches Likes for FB Video"""
-    try:
-        url = f"https://graph.facebook.com/v19.0/{video_id}?fields=likes.summary(true)&access_token={IG_ACCESS_TOKEN}"
-        r = requests.get(url).json()
-        return r.get("likes", {}).get("summary", {}).get("total_count", 0)
-    except: return 0
-
-def get_youtube_metrics(video_id, brand_name):
-    """Fetches Views and Likes for YT Video"""
-    try:
-        # 👇 KEY FIX: Use Uppercase to match normalized config
-        brand_key = brand_name.strip().upper()
-        
-        if brand_key not in YOUTUBE_CONFIG: return 0, 0
-        
-        creds_data = YOUTUBE_CONFIG[brand_key]
-        creds = UserCredentials(None, refresh_token=creds_data["refresh_token"], client_id=creds_data["client_id"], client_secret=creds_data["client_secret"], token_uri="https://oauth2.googleapis.com/token")
-        if not creds.valid: creds.refresh(Request())
-        
-        youtube = build("youtube", "v3", credentials=creds)
-        response = youtube.videos().list(part="statistics", id=video_id).execute()
-        
-        if "items" in response and len(response["items"]) > 0:
-            stats = response["items"][0]["statistics"]
-            return stats.get("viewCount", 0), stats.get("likeCount", 0)
-    except: pass
-    return 0, 0
+    token = PAGE_TOKENS.get(page_id)
+    if token: return token
+    print(f"      ⚠️ Page Token Fetch Failed for {page_id}, using user token.")
+    return IG_ACCESS_TOKEN # Fallback
+
+def get_facebook_likes(video_ids):
+    """Likes for many FB videos -> {video_id: likes}, 50 videos per /batch request"""
+    found = fetch_objects(video_ids, "likes.summary(true)", IG_ACCESS_TOKEN, session=HTTP)
+    return {
+        vid: data.get("likes", {}).get("summary", {}).get("total_count", 0)
+        for vid, data in found.items() if "error" not in data
+    }
+
+def get_youtube_stats(brand_name, video_ids):
+    """
+    Views and Likes for many videos of one brand -> {video_id: (views, likes)}.
+    videos().list takes 50 IDs per call (1 quota unit each call).
+    """
+    # 👇 KEY FIX: Use Uppercase to match normalized config
+    brand_key = brand_name.strip().upper()
+    if brand_key not in YOUTUBE_CONFIG: return {}
+
+    stats = {}
+    for start in range(0, len(video_ids), 50):
+        batch = video_ids[start:start + 50]
+        try:
+            with YT_CLIENTS.client(brand_key) as youtube:
+                response = youtube.videos().list(part="statistics", id=",".join(batch)).execute()
+        except Exception as e:
+            print(f"   ⚠️ YT Stats Error ({brand_key}): {e}")
+            continue
+        for item in response.get("items", []):
+            s = item.get("statistics", {})
+            # The API returns counts as strings
+            stats[item["id"]] = (int(s.get("viewCount", 0)), int(s.get("likeCount", 0)))
+    return stats
 
 # =======================================================
 # 🔧 UPLOAD FUNCTIONS (UPDATED FOR DURATION & LINK)
 # =======================================================
 
 def download_video_securely(drive_service, drive_url):
-    print("      ⬇️ Downloading video securely via API...")
-    temp_filename = "temp_upload_video.mp4"
-    if os.path.exists(temp_filename): os.remove(temp_filename)
-
-    file_id = None
-    if "/d/" in drive_url: file_id = drive_url.split('/d/')[1].split('/')[0]
-    elif "id=" in drive_url: file_id = drive_url.split('id=')[1].split('&')[0]
-    
+    """Returns a local path from the shared video cache (downloads on a miss)"""
+    file_id = extract_drive_id(drive_url)
     if not file_id: return None
 
+    # Drive's md5/size let the cache reuse a copy another row already downloaded
     try:
-        request = drive_service.files().get_media(fileId=file_id)
-        fh = io.FileIO(temp_filename, 'wb')
-        downloader = MediaIoBaseDownload(fh, request)
-        done = False
-        while done is False: status, done = downloader.next_chunk()
-        return temp_filename
+        meta = drive_service.files().get(fileId=file_id, fields="md5Checksum,size", supportsAllDrives=True).execute()
     except Exception as e:
-        print(f"      ❌ Download Error: {e}")
-        return None
+        print(f"      ⚠️ Drive Metadata Error: {e}")
+        meta = {}
+
+    def _download(dest):
+        print("      ⬇️ Downloading video securely via API...")
+        try:
+            request = drive_service.files().get_media(fileId=file_id)
+            with io.FileIO(dest, 'wb') as fh:
+                downloader = MediaIoBaseDownload(fh, request)
+                done = False
+                while done is False: status, done = downloader.next_chunk()
+            return True
+        except Exception as e:
+            print(f"      ❌ Download Error: {e}")
+            return False
 
-def upload_to_instagram_resumable(brand_name, ig_user_id, file_path, caption):
+    return VIDEO_CACHE.fetch(file_id, _download, md5=meta.get("md5Checksum"), size=meta.get("size"))
+
+def start_instagram_upload(brand_name, ig_user_id, file_path, caption):
+    """Phase 1: creates the REELS container and uploads the bytes -> container_id or None"""
     print(f"      📸 Instagram Upload ({brand_name})...")
-    start_time = time.time() # ⏱️ START TIMER
-    
+
     if not ig_user_id or "AHIYA" in ig_user_id: 
         print("      ⚠️ IG ID Invalid/Missing.")
-        return False, "", 0
+        return None
     
-    domain = "https://graph.facebook.com/v19.0"
     try:
-        url_init = f"{domain}/{ig_user_id}/media"
+        url_init = f"{GRAPH_DOMAIN}/{ig_user_id}/media"
         params = { "upload_type": "resumable", "media_type": "REELS", "caption": caption, "access_token": IG_ACCESS_TOKEN }
-        r_init = requests.post(url_init, params=params)
+        r_init = HTTP.post(url_init, params=params)
         data_init = r_init.json()
         
-        if "id" not in data_init: return False, "", 0
+        if "id" not in data_init: return None
         upload_uri = data_init["uri"]
         container_id = data_init["id"]
 
         file_size = os.path.getsize(file_path)
         with open(file_path, "rb") as f:
             headers = { "Authorization": f"OAuth {IG_ACCESS_TOKEN}", "offset": "0", "file_size": str(file_size) }
-            r_upload = requests.post(upload_uri, data=f, headers=headers)
+            r_upload = HTTP.post(upload_uri, data=f, headers=headers)
         
-        if r_upload.status_code != 200: return False, "", 0
+        if r_upload.status_code != 200: return None
+        return container_id
+    except Exception as e:
+        print(f"      ❌ IG Error: {e}")
+        return None
 
-        print("      ⏳ Processing IG (60s)...")
-        time.sleep(60)
-        url_pub = f"{domain}/{ig_user_id}/media_publish"
-        r_pub = requests.post(url_pub, params={"creation_id": container_id, "access_token": IG_ACCESS_TOKEN})
+def publish_instagram_container(ig_user_id, container_id):
+    """Phase 3: publishes a FINISHED container -> (success, link)"""
+    try:
+        url_pub = f"{GRAPH_DOMAIN}/{ig_user_id}/media_publish"
+        r_pub = HTTP.post(url_pub, params={"creation_id": container_id, "access_token": IG_ACCESS_TOKEN})
         data_pub = r_pub.json()
         
-        end_time = time.time() # ⏱️ END TIMER
-        duration = int(end_time - start_time)
-        
         if "id" in data_pub:
             # Shortcode fetch karva mate (For Link)
             try:
-                r_get = requests.get(f"{domain}/{data_pub['id']}?fields=shortcode&access_token={IG_ACCESS_TOKEN}").json()
+                r_get = HTTP.get(f"{GRAPH_DOMAIN}/{data_pub['id']}?fields=shortcode&access_token={IG_ACCESS_TOKEN}").json()
                 shortcode = r_get.get("shortcode", "")
                 link = f"https://www.instagram.com/reel/{shortcode}/" if shortcode else f"ID:{data_pub['id']}"
             except: link = "Link Error"
             
             print(f"      ✅ IG Published: {data_pub['id']}")
-            return True, link, duration
-        else:
-            return False, "", 0
+            return True, link
+        return False, ""
     except Exception as e:
         print(f"      ❌ IG Error: {e}")
+        return False, ""
+
+def upload_to_instagram_resumable(brand_name, ig_user_id, file_path, caption, container_id=None):
+    """One reel start to finish (used when IG_BATCH_PUBLISH is off)"""
+    start_time = time.time() # ⏱️ START TIMER
+    container_id = container_id or start_instagram_upload(brand_name, ig_user_id, file_path, caption)
+    if not container_id: return False, "", 0
+
+    # Publish the moment IG says the container is ready
+    status = wait_for_container(container_id, IG_ACCESS_TOKEN, session=HTTP)
+    if status == "PUBLISHED":
+        return True, already_published_link(container_id), int(time.time() - start_time)
+    if status != "FINISHED":
         return False, "", 0
+    success, link = publish_instagram_container(ig_user_id, container_id)
+    duration = int(time.time() - start_time) # ⏱️ END TIMER
+    return success, link, (duration if success else 0)
+
+def queue_instagram_reel(brand_name, ig_user_id, file_path, caption):
+    """
+    Batch mode: only phase 1 runs here. Returns a QueuedReel the caller
+    hands to the ReelPublisher, (False, "", 0) if the upload failed.
+    """
+    start_time = time.time()
+    container_id = start_instagram_upload(brand_name, ig_user_id, file_path, caption)
+    if not container_id: return False, "", 0
+    return QueuedReel(container_id, start_time)
 
 def upload_to_facebook(brand_name, fb_page_id, file_path, caption):
     print(f"      📘 Facebook Upload ({brand_name})...")
@@ -280,10 +334,16 @@ def upload_to_facebook(brand_name, fb_page_id, file_path, caption):
     url = f"https://graph.facebook.com/v19.0/{fb_page_id}/videos"
     try:
         params = { "description": caption, "access_token": page_token }
-        with open(file_path, "rb") as f:
-            files = {"source": f}
-            r = requests.post(url, params=params, files=files)
-        data = r.json()
+        if FB_CHUNKED:
+            # Resumable: a cancelled run picks up at the last uploaded chunk
+            video_id = upload_video_chunked(fb_page_id, page_token, file_path, caption, file_md5(file_path), session=HTTP,
+                                            on_error=lambda data: PAGE_TOKENS.check(fb_page_id, data))
+            data = {"id": video_id} if video_id else {"error": "chunked upload failed"}
+        else:
+            # Streamed from disk: a 300 MB reel never sits in RAM
+            r = post_multipart(HTTP, url, "source", file_path, params=params)
+            data = r.json()
+            PAGE_TOKENS.check(fb_page_id, data)
         
         end_time = time.time() # ⏱️ END TIMER
         duration = int(end_time - start_time)
@@ -299,7 +359,7 @@ def upload_to_facebook(brand_name, fb_page_id, file_path, caption):
         print(f"      ❌ FB Exception: {e}")
         return False, "", 0
 
-def upload_to_youtube(brand_name, file_path, title, description, tags=[]):
+def upload_to_youtube(brand_name, file_path, title, description, tags=[], row_key=None):
     print(f"      🔴 YouTube Upload ({brand_name})...")
     start_time = time.time() # ⏱️ START TIMER
     
@@ -311,18 +371,6 @@ def upload_to_youtube(brand_name, file_path, title, description, tags=[]):
         return False, "", 0
 
     try:
-        creds_data = YOUTUBE_CONFIG[brand_key]
-        creds = UserCredentials(
-            None, 
-            refresh_token=creds_data["refresh_token"],
-            client_id=creds_data["client_id"],
-            client_secret=creds_data["client_secret"],
-            token_uri="https://oauth2.googleapis.com/token"
-        )
-        if not creds.valid: creds.refresh(Request())
-
-        youtube = build("youtube", "v3", credentials=creds)
-
         body = {
             "snippet": {
                 "title": title[:100], 
@@ -336,14 +384,9 @@ def upload_to_youtube(brand_name, file_path, title, description, tags=[]):
             }
         }
 
-        media = MediaFileUpload(file_path, chunksize=-1, resumable=True)
-        request = youtube.videos().insert(part="snippet,status", body=body, media_body=media)
-        
-        response = None
-        while response is None:
-            status, response = request.next_chunk()
-            if status:
-                print(f"      🚀 YT Uploading: {int(status.progress() * 100)}%")
+        # Chunked + journaled: a killed run continues from the last acked byte
+        with YT_CLIENTS.client(brand_key) as youtube:
+            response = resumable_insert(youtube, body, file_path, row_key or f"{brand_key}:{os.path.basename(file_path)}")
 
         end_time = time.time() # ⏱️ END TIMER
         duration = int(end_time - start_time)
@@ -360,19 +403,123 @@ def upload_to_youtube(brand_name, file_path, title, description, tags=[]):
         print(f"      ❌ YouTube Exception: {e}")
         return False, "", 0
 
+def publish_target(target, local_file):
+    """
+    Uploads one row's post to its platform -> (success, link, duration).
+    In IG batch mode a QueuedReel: the container is uploaded, not yet published.
+    """
+    brand, platform = target["brand"], target["platform"]
+
+    # Platform Selection Logic
+    if "Instagram" in platform:
+        container_id = target.get("container_id")  # Uploaded by a run that got killed
+        if IG_BATCH_PUBLISH:
+            if container_id: return QueuedReel(container_id, time.time())
+            return queue_instagram_reel(brand, target["ig_id"], local_file, target["caption"])
+        return upload_to_instagram_resumable(brand, target["ig_id"], local_file, target["caption"], container_id)
+    elif "Facebook" in platform:
+        return upload_to_facebook(brand, target["fb_id"], local_file, target["caption"])
+    elif "Youtube" in platform:
+        # YouTube will use title separately and caption as description
+        return upload_to_youtube(brand, local_file, target["title"], target["caption"], target["yt_tags"],
+                                 row_key=f"{SPREADSHEET_ID}:{target['row']}")
+    return False, "", 0
+
+def publish_and_journal(target, local_file, journal):
+    """publish_target(), with the outcome written to the journal the moment it is known"""
+    result = publish_target(target, local_file)
+    if isinstance(result, QueuedReel):
+        journal.mark(target["row"], target["platform_key"], UPLOADED, platform_id=result.container_id)
+        return result
+    success, link, duration = result
+    if success:
+        journal.mark(target["row"], target["platform_key"], PUBLISHED, link=link, duration=duration)
+    elif target.get("container_id"):
+        journal.mark(target["row"], target["platform_key"], DOWNLOADED)  # Old container is no good, upload fresh
+    return result
+
+def get_journal():
+    if "journal" not in _CLIENTS: _CLIENTS["journal"] = JobJournal(STATE_NAME)
+    return _CLIENTS["journal"]
+
+def get_analytics_schedule():
+    if "analytics" not in _CLIENTS: _CLIENTS["analytics"] = AnalyticsSchedule(STATE_NAME)
+    return _CLIENTS["analytics"]
+
+def get_metrics_store():
+    if "metrics" not in _CLIENTS: _CLIENTS["metrics"] = MetricsStore(STATE_NAME)
+    return _CLIENTS["metrics"]
+
+def save_metrics(samples):
+    """Appends this pass's numbers to the local history (metrics_store.py reports on it)"""
+    try:
+        if get_metrics_store().record(samples):
+            print(f"   📈 {len(samples)} metric samples saved locally.")
+    except Exception as e:
+        print(f"   ⚠️ Metrics History Error: {e}")
+
+def reconcile_journal(journal, sheet, headers, pending, writer, col_status, col_link, col_duration):
+    """
+    Posts a killed run already published but never wrote back get their
+    sheet write now, instead of being uploaded a second time. Only rows
+    still PENDING with the same video are touched. Returns rows fixed.
+    """
+    jobs = journal.unsynced()
+    if not jobs: return 0
+
+    rows = fetch_rows(sheet, headers, [j["row"] for j in jobs if j["row"] in pending])
+    fixed = []
+    for j in jobs:
+        i = j["row"]
+        if i not in pending:
+            journal.mark(i, j["platform"], SYNCED)  # Sheet has moved on already
+            continue
+        video_url = rows.get(i, {}).get("Video_URL") or rows.get(i, {}).get("Video Link", "")
+        if video_url != j["video_url"]:
+            print(f"   ⚠️ Row {i}: video changed since last run, ignoring journaled post.")
+            journal.forget(i, j["platform"])
+            continue
+
+        writer.update_cell(i, col_status, "POSTED")
+        writer.update_cell(i, col_link, j["link"])
+        writer.update_cell(i, col_duration, f"{j['duration'] or 0} sec")
+        print(f"   🩹 Row {i}: already live on {j['platform']} ({j['link']}), only updating sheet.")
+        pending.pop(i, None)  # Never upload again, even if the write below fails
+        fixed.append(j)
+
+    if fixed and writer.flush():
+        for j in fixed: journal.mark(j["row"], j["platform"], SYNCED)
+    return len(fixed)
+
 # =======================================================
 # 🚀 MAIN EXECUTION (UPDATED WITH REPORTING)
 # =======================================================
 
-def start_bot():
+def start_bot(stop_event=None, window=SNIPER_WINDOW):
     print("-" * 50)
     print(f"⏰ SUPER-BOT STARTED (Upload + Analytics + Description)...")
     
-    sheet, drive_service = get_services()
+    creds = get_credentials()
+    if not creds: return
+
+    # ⚡ PRE-CHECK: Sheet untouched + nothing due yet = nothing to do
+    state = load_state(STATE_NAME)
+    modified_time = get_sheet_modified_time(creds, SPREADSHEET_ID)
+    if should_skip_run(state, modified_time, get_ist_time(), window):
+        print(f"💤 Sheet unchanged, next post at {state.get('next_due')}. Skipping run.")
+        return
+
+    sheet, drive_service = get_services(creds)
     if not sheet or not drive_service: return
 
+    # Every brand's page token in one request (none at all when the disk cache is fresh)
+    PAGE_TOKENS.prefetch(c.get("fb_id") for c in BRAND_CONFIG.values())
+
+    journal = get_journal()
+    analytics = get_analytics_schedule()
+    writer = SheetWriteBuffer(sheet)
+
     try:
-        records = sheet.get_all_records()
         headers = sheet.row_values(1)
         try: col_status = headers.index("Status") + 1
         except: col_status = 5
@@ -386,6 +533,24 @@ def start_bot():
         except: col_views = 0
         try: col_likes = headers.index("Likes") + 1
         except: col_likes = 0
+
+        # PHASE 1: Status/Schedule/Platform columns only
+        scan = scan_columns(sheet, headers, SCAN_COLUMNS)
+        pending = {
+            r["_row"]: parse_schedule_time(r["Schedule_Date"], r["Schedule_Time"]) for r in scan
+            if r["Status"].strip().upper() == "PENDING"
+            and any(p in r["Platform"] for p in SUPPORTED_PLATFORMS)
+        }
+
+        # PHASE 0: Finish what a killed run left half done (sheet write only, no re-upload)
+        reconcile_journal(journal, sheet, headers, pending, writer, col_status, col_link, col_duration)
+
+        ist_now = get_ist_time()
+        due_rows = [row for row, dt in pending.items() if dt and (dt - ist_now).total_seconds() <= window]
+        print(f"🔎 Scanned {len(scan)} rows, {len(due_rows)} due.")
+
+        # PHASE 2: Full data only for the due rows
+        records = fetch_rows(sheet, headers, due_rows)
         
     except Exception as e:
         print(f"❌ Error Reading Sheet: {e}")
@@ -393,111 +558,226 @@ def start_bot():
 
     processed_count = 0
 
-    # PART 1: UPLOAD NEW POSTS
-    for i, row in enumerate(records, start=2):
+    # PART 1: UPLOAD NEW POSTS (min-heap by schedule time, downloads run ahead)
+    scheduler = JobScheduler(
+        get_ist_time,
+        prefetch=lambda job: download_video_securely(drive_service, job["video_url"]),
+        prefetch_ahead=window,
+        stop_event=stop_event,
+    )
+
+    # Rows sharing one video + schedule time become one job: one download, parallel uploads
+    groups = {}
+    for i, row in sorted(records.items()):
         brand = str(row.get("Brand_Name") or row.get("Account_Name") or row.get("Account Name", "")).strip().upper()
-        status = str(row.get("Status", "")).strip().upper()
         platform = str(row.get("Platform", "")).strip() # New Column check
-        
-        if status == "PENDING":
-            sheet_date = str(row.get("Schedule_Date", "")).strip()
-            sheet_time = str(row.get("Schedule_Time", "")).strip()
-            
-            # This logic will upload immediately if the time has passed (Past Date)
-            if check_time_and_wait(sheet_date, sheet_time):
-                print(f"\n👉 Checking Row {i}: {row.get('Title_Hook') or row.get('Title')} | Brand: {brand}")
-                
-                if brand in BRAND_CONFIG:
-                    ig_id = BRAND_CONFIG[brand].get("ig_id")
-                    fb_id = BRAND_CONFIG[brand].get("fb_id")
-                    
-                    video_url = row.get("Video_URL") or row.get("Video Link", "")
-                    
-                    # ✅ FETCH ALL DATA (Updated Logic Here)
-                    title = row.get("Title_Hook") or row.get("Title", "")
-                    description_text = row.get("Description", "") # Fetch Description
-                    hashtags_str = row.get("Caption_Hashtags") or row.get("Hashtags", "")
-                    
-                    # ✅ COMBINE EVERYTHING FOR CAPTION
-                    caption = f"{title}\n\n{description_text}\n.\n{hashtags_str}"
-                    
-                    yt_tags = [tag.strip().replace("#", "") for tag in hashtags_str.split() if "#" in tag]
-                    
-                    local_file = download_video_securely(drive_service, video_url)
-                    
-                    if local_file:
-                        success = False
-                        final_link = ""
-                        duration = 0
-
-                        # Platform Selection Logic
-                        if "Instagram" in platform:
-                            success, final_link, duration = upload_to_instagram_resumable(brand, ig_id, local_file, caption)
-                        elif "Facebook" in platform:
-                            success, final_link, duration = upload_to_facebook(brand, fb_id, local_file, caption)
-                        elif "Youtube" in platform:
-                            # YouTube will use title separately and caption as description
-                            success, final_link, duration = upload_to_youtube(brand, local_file, title, caption, yt_tags)
-
-                        # Cleanup
-                        if os.path.exists(local_file): os.remove(local_file)
-
-                        # Update Sheet
-                        if success:
-                            sheet.update_cell(i, col_status, "POSTED")
-                            
-                            if col_link > 0: 
-                                sheet.update_cell(i, col_link, final_link)
-                            if col_duration > 0: 
-                                sheet.update_cell(i, col_duration, f"{duration} sec")
-                            
-                            print(f"      📝 Updated: POSTED | Link: {final_link} | Time: {duration}s")
-                            processed_count += 1
-                            time.sleep(10)
-                    else:
-                        print("      ⚠️ Skipping: Download failed.")
-            else:
-                pass 
 
-    # PART 2: UPDATE LIVE ANALYTICS (REVERSE CHECK LAST 20)
-    print("\n📊 Updating Analytics for Recent Posts...")
-    # Refresh records
-    records = sheet.get_all_records()
-    check_limit = 0
-    
-    # Loop from bottom to top (Latest posts first)
-    for i in range(len(records), 1, -1):
-        if check_limit >= 20: break # Safety Limit (Only check last 20 posts)
-        
-        row_idx = i - 2
-        row = records[row_idx]
+        if brand not in BRAND_CONFIG:
+            print(f"   ⚠️ Row {i}: Unknown brand '{brand}', skipping.")
+            pending.pop(i, None)  # Can't be posted, so it must not hold next_due in the past
+            continue
+
+        # ✅ FETCH ALL DATA (Updated Logic Here)
+        video_url = row.get("Video_URL") or row.get("Video Link", "")
+        title = row.get("Title_Hook") or row.get("Title", "")
+        description_text = row.get("Description", "") # Fetch Description
+        hashtags_str = row.get("Caption_Hashtags") or row.get("Hashtags", "")
+
+        # Broken rows wait out their backoff instead of eating every run's time
+        waiting = journal.backoff(i, extract_drive_id(video_url) or video_url)
+        if waiting:
+            pending[i] = get_ist_time() + timedelta(seconds=waiting["next_try"] - time.time())
+            print(f"   🔁 Row {i}: failed {waiting['attempts']}x ({waiting['reason']}), next try after {pending[i].strftime('%H:%M')}.")
+            continue
+
+        group_key = (extract_drive_id(video_url) or video_url, pending[i])
+        groups.setdefault(group_key, []).append({
+            "row": i,
+            "brand": brand,
+            "platform": platform,
+            "platform_key": next((p for p in SUPPORTED_PLATFORMS if p in platform), "Other"),
+            "ig_id": BRAND_CONFIG[brand].get("ig_id"),
+            "fb_id": BRAND_CONFIG[brand].get("fb_id"),
+            "video_url": video_url,
+            "title": title,
+            # ✅ COMBINE EVERYTHING FOR CAPTION
+            "caption": f"{title}\n\n{description_text}\n.\n{hashtags_str}",
+            "yt_tags": [tag.strip().replace("#", "") for tag in hashtags_str.split() if "#" in tag],
+        })
+
+    for (_, when), targets in groups.items():
+        scheduler.add(when, {"video_url": targets[0]["video_url"], "targets": targets})
+
+    recorded = []  # (row, platform) written to the buffer but not flushed yet
+
+    def record_post(i, platform_key, final_link, duration):
+        nonlocal processed_count
+        recorded.append((i, platform_key))
+        writer.update_cell(i, col_status, "POSTED")
+        writer.update_cell(i, col_link, final_link)
+        writer.update_cell(i, col_duration, f"{duration} sec")
+        print(f"      📝 Row {i} Updated: POSTED | Link: {final_link} | Time: {duration}s")
+        analytics.posted(final_link)
+        processed_count += 1
+        pending.pop(i, None)
+
+    def record_failure(i, video_url, kind, reason):
+        """Backs the row off, or gives up on it with FAILED_<kind> after FAIL_MAX_TRIES"""
+        attempts, next_try = journal.record_failure(i, extract_drive_id(video_url) or video_url, reason)
+        if attempts >= FAIL_MAX_TRIES:
+            writer.update_cell(i, col_status, f"FAILED_{kind}")
+            pending.pop(i, None)
+            print(f"      ⛔ Row {i}: {reason} ({attempts} tries), marked FAILED_{kind}.")
+        else:
+            pending[i] = get_ist_time() + timedelta(seconds=next_try - time.time())
+            print(f"      🔁 Row {i}: {reason} (try {attempts}/{FAIL_MAX_TRIES}), retry after {pending[i].strftime('%H:%M')}.")
+
+    def checkpoint():
+        """Flush, then mark the flushed posts as synced in the journal"""
+        if writer.flush():
+            for i, platform_key in recorded: journal.mark(i, platform_key, SYNCED)
+            recorded.clear()
+
+    # IG phases 2 + 3: containers of every due reel process side by side
+    ig_publisher = ReelPublisher(IG_ACCESS_TOKEN, session=HTTP)
+
+    def on_ig_published(i, video_url, started):
+        def _done(success, link):
+            if not success:
+                journal.mark(i, "Instagram", DOWNLOADED)  # Container is no good, upload fresh next time
+                record_failure(i, video_url, "UPLOAD", "IG processing/publish failed")
+                return
+            duration = int(time.time() - started)
+            journal.mark(i, "Instagram", PUBLISHED, link=link, duration=duration)
+            journal.clear_failure(i, extract_drive_id(video_url) or video_url)
+            record_post(i, "Instagram", link, duration)
+            checkpoint()
+        return _done
+
+    def post_job(job, download):
+        targets = job["targets"]
+        fresh = []
+        for t in targets:
+            print(f"\n👉 Posting Row {t['row']}: {t['title']} | Brand: {t['brand']} | {t['platform']}")
+            # Write-ahead: claim before any work, keep an IG container a killed run already uploaded
+            if journal.claim(t["row"], t["platform_key"], t["video_url"]) is None:
+                fresh.append(t)
+            t["container_id"] = journal.reusable_container(t["row"], t["platform_key"], t["video_url"])
+            if t["container_id"]:
+                print(f"      ♻️ Reusing IG container {t['container_id']} from last run.")
+
+        local_file = download.result() if download else None
+        if not local_file:
+            print("      ⚠️ Skipping: Download failed.")
+            for t in targets: record_failure(t["row"], t["video_url"], "DOWNLOAD", "Download failed")
+            return
+        for t in fresh: journal.mark(t["row"], t["platform_key"], DOWNLOADED)
+
+        results = fan_out([
+            {
+                "key": t["row"],
+                "platform": t["platform_key"],
+                "upload": lambda t=t: publish_and_journal(t, local_file, journal),
+                "failed": (False, "", 0),
+            }
+            for t in targets
+        ])
+
+        # Update Sheet
+        by_row = {t["row"]: t for t in targets}
+        for i, result in sorted(results.items()):
+            t = by_row[i]
+            if isinstance(result, QueuedReel):
+                # Uploaded, IG processes it while the next reels upload
+                ig_publisher.add(result.container_id, on_ig_published(i, t["video_url"], result.started), ig_user_id=t["ig_id"])
+                continue
+            success, final_link, duration = result
+            if success:
+                record_post(i, t["platform_key"], final_link, duration)
+                journal.clear_failure(i, extract_drive_id(t["video_url"]) or t["video_url"])
+            else:
+                record_failure(i, t["video_url"], "UPLOAD", f"{t['platform_key']} upload failed")
+
+        # Checkpoint: posts are live, don't risk losing their status
+        checkpoint()
+
+    scheduler.run(post_job, idle=ig_publisher.poll_once)
+    ig_publisher.drain()
+
+    # PART 2: UPDATE LIVE ANALYTICS (ONLY POSTS DUE BY AGE, IN 50-ID BATCHES)
+    # Only Status/Link/Brand (+ current Views/Likes) columns are needed here
+    analytics_rows = []
+    if processed_count > 0 or analytics_stale(state):
+        print("\n📊 Updating Analytics for Posted Videos...")
+        try: analytics_rows = scan_columns(sheet, headers, ANALYTICS_COLUMNS)
+        except Exception as e:
+            print(f"   ⚠️ Analytics Read Error: {e}")
+        state["last_analytics"] = time.time()
+    else:
+        print("\n📊 Analytics refreshed recently, skipping.")
+
+    def update_metrics(row, views, likes):
+        # Only changed cells go into the batch write
+        if views > 0 and str(views) != str(row.get("Views", "")).strip():
+            writer.update_cell(row["_row"], col_views, views)
+        if likes > 0 and str(likes) != str(row.get("Likes", "")).strip():
+            writer.update_cell(row["_row"], col_likes, likes)
+        if views > 0 or likes > 0:
+            print(f"   🔄 Updated Row {row['_row']}: {views} Views, {likes} Likes")
+
+    # Which posts are due: every run for the 1st hour, hourly for a day, daily after
+    posted_rows = []
+    for row in analytics_rows:
         status = str(row.get("Status", "")).strip().upper()
-        link = str(row.get("Link", "")).strip()
-        brand = str(row.get("Brand_Name", "")).strip().upper()
-        
-        if "POSTED" in status and link != "":
-            views = 0
-            likes = 0
-            
-            # YouTube Check
-            if "youtu.be" in link or "youtube.com" in link:
-                vid_id = link.split("/")[-1]
-                v, l = get_youtube_metrics(vid_id, brand)
-                views, likes = v, l
-                
-            # Facebook Check
-            elif "facebook.com" in link:
-                try: vid_id = link.split("/videos/")[1].replace("/","")
-                except: vid_id = ""
-                if vid_id: likes = get_facebook_metrics(vid_id)
-            
-            # Update Sheet if data found
-            if views > 0 or likes > 0:
-                if col_views > 0: sheet.update_cell(i, col_views, views)
-                if col_likes > 0: sheet.update_cell(i, col_likes, likes)
-                print(f"   🔄 Updated Row {i}: {views} Views, {likes} Likes")
-            
-            check_limit += 1
+        key = post_key(row.get("Link"))
+        if "POSTED" in status and key: posted_rows.append((row, key))
+    due = analytics.due(key for _, key in posted_rows)
+
+    yt_videos = {}  # brand -> {video_id: [rows]}
+    fb_videos = []
+    for row, key in posted_rows:
+        if key not in due: continue
+        platform, vid_id = key.split(":", 1)
+        if platform == "yt":
+            brand = str(row.get("Brand_Name", "")).strip().upper()
+            yt_videos.setdefault(brand, {}).setdefault(vid_id, []).append(row)
+        else:
+            fb_videos.append((row, vid_id))
+    if analytics_rows:
+        print(f"   ⏱️ {len(due)} of {len(posted_rows)} posts due for a refresh.")
+
+    samples = []  # (post key, brand, views, likes) for the local metrics history
+
+    # YouTube: one videos().list per 50 IDs per brand
+    for brand, videos in yt_videos.items():
+        stats = get_youtube_stats(brand, list(videos))
+        for vid_id, (views, likes) in stats.items():
+            for row in videos[vid_id]: update_metrics(row, views, likes)
+            samples.append((f"yt:{vid_id}", brand, views, likes))
+
+    # Facebook: every due video's likes via /batch, 50 per request (no views on FB)
+    if fb_videos:
+        fb_likes = get_facebook_likes([vid_id for _, vid_id in fb_videos])
+        for row, vid_id in fb_videos:
+            update_metrics(row, 0, fb_likes.get(vid_id, 0))
+            if vid_id in fb_likes:
+                samples.append((f"fb:{vid_id}", row.get("Brand_Name"), None, fb_likes[vid_id]))
+
+    save_metrics(samples)
+    # Posts that came back empty (deleted, unknown brand, API error) back off instead
+    got = {key for key, _, _, _ in samples}
+    analytics.refreshed(got)
+    analytics.missed(set(due) - got)
+    state["analytics_due"] = analytics.next_due()
+
+    checkpoint()
+
+    # Remember when to wake up (failed rows stay past-due, so they retry next run)
+    state["next_due"] = next_due_time(pending.values())
+    # The time read *before* the run: edits made while we ran must trigger the next run.
+    # Our own writes cost one extra full run, which is fine.
+    state["modified_time"] = modified_time
+    save_state(STATE_NAME, state)
 
     if processed_count == 0:
         print("💤 No posts ready immediately. Analytics updated.")
@@ -505,4 +785,13 @@ def start_bot():
         print(f"🎉 Job Done! Uploads in this cycle: {processed_count}")
 
 if __name__ == "__main__":
-    start_bot()
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--daemon", action="store_true", help="Keep running and poll the sheet every --interval seconds")
+    parser.add_argument("--interval", type=int, default=POLL_INTERVAL)
+    args = parser.parse_args()
+
+    if args.daemon:
+        # Only rows due before the next poll are scheduled, so a poll is never blocked for long
+        run_daemon(lambda stop_event: start_bot(stop_event, window=args.interval), args.interval)
+    else:
+        start_bot()
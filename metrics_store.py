@@ -0,0 +1,288 @@
+import os
+import sys
+import time
+import sqlite3
+import argparse
+import threading
+from datetime import datetime, timedelta
+from run_state import state_path
+
+# ==============================================================================
+# 📈 LOCAL METRICS HISTORY (EVERY SAMPLE + HOURLY/DAILY ROLLUPS, NO NETWORK)
+# ==============================================================================
+
+# Raw samples older than this are dropped, rollups and post_latest are kept
+KEEP_DAYS = int(os.environ.get("METRICS_KEEP_DAYS", "90"))
+
+# Rollup buckets follow the IST clock, so "day" means an Indian calendar day
+IST_OFFSET = int(timedelta(hours=5, minutes=30).total_seconds())
+PERIODS = {"hour": 3600, "day": 86400}
+
+METRICS = ("views", "likes")
+
+def bucket_start(ts, period):
+    size = PERIODS[period]
+    return (int(ts) + IST_OFFSET) // size * size - IST_OFFSET
+
+def ist_text(ts, fmt="%Y-%m-%d %H:%M"):
+    return (datetime.utcfromtimestamp(ts) + timedelta(seconds=IST_OFFSET)).strftime(fmt)
+
+def _gained(value, before):
+    """Growth since the previous sample, 0 if either side is missing"""
+    return value - before if value is not None and before is not None else 0
+
+class MetricsStore:
+    """
+    Append-only Views/Likes samples per post in SQLite (.bot_state/metrics.db).
+    Every record() also updates post_latest and adds the growth since the
+    previous sample to the hourly and daily rollups of the post's brand and
+    platform, so reports are single indexed reads. A post's first sample
+    only sets its baseline. Views are None for platforms we only read likes from.
+    bot=None opens the store read-only over every bot (CLI reports).
+    """
+
+    def __init__(self, bot=None, path=None):
+        self.bot = bot
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path or state_path("metrics.db"), check_same_thread=False, isolation_level=None)
+        self.db.row_factory = sqlite3.Row
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.executescript("""
+            CREATE TABLE IF NOT EXISTS samples (
+                bot TEXT, key TEXT, platform TEXT, brand TEXT,
+                ts REAL, views INTEGER, likes INTEGER
+            );
+            CREATE INDEX IF NOT EXISTS samples_by_post ON samples (bot, key, ts);
+            CREATE INDEX IF NOT EXISTS samples_by_time ON samples (ts);
+            CREATE TABLE IF NOT EXISTS post_latest (
+                bot TEXT, key TEXT, platform TEXT, brand TEXT,
+                first_ts REAL, last_ts REAL, views INTEGER, likes INTEGER,
+                PRIMARY KEY (bot, key)
+            );
+            CREATE TABLE IF NOT EXISTS rollups (
+                bot TEXT, period TEXT, bucket INTEGER, brand TEXT, platform TEXT,
+                views INTEGER, likes INTEGER, samples INTEGER,
+                PRIMARY KEY (bot, period, bucket, brand, platform)
+            );
+        """)
+        if bot:
+            self.db.execute("DELETE FROM samples WHERE bot = ? AND ts < ?", (bot, time.time() - KEEP_DAYS * 86400))
+
+    def _where(self, brand=None, platform=None):
+        """WHERE clause + params for the optional bot/brand/platform filters"""
+        clauses, params = [], []
+        for column, value in (("bot", self.bot), ("brand", brand), ("platform", platform)):
+            if value:
+                clauses.append(f"{column} = ?")
+                params.append(value.upper() if column == "brand" else value)
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    # ==========================================================================
+    # ✍️ WRITING (CALLED BY THE ANALYTICS PASS)
+    # ==========================================================================
+
+    def record(self, samples, ts=None):
+        """samples = [(post key, brand, views or None, likes or None), ...], one transaction"""
+        if not samples: return 0
+        ts = ts or time.time()
+        with self.lock:
+            self.db.execute("BEGIN")
+            try:
+                for key, brand, views, likes in samples:
+                    self._add(key, key.split(":", 1)[0], (brand or "").upper(), ts, views, likes)
+                self.db.execute("COMMIT")
+            except Exception:
+                self.db.execute("ROLLBACK")
+                raise
+        return len(samples)
+
+    def _add(self, key, platform, brand, ts, views, likes):
+        prev = self.db.execute(
+            "SELECT views, likes FROM post_latest WHERE bot = ? AND key = ?", (self.bot, key)
+        ).fetchone()
+        self.db.execute(
+            "INSERT INTO samples VALUES (?, ?, ?, ?, ?, ?, ?)", (self.bot, key, platform, brand, ts, views, likes)
+        )
+        self._set_latest(key, platform, brand, ts, views, likes)
+        if prev: self._roll(platform, brand, ts, _gained(views, prev["views"]), _gained(likes, prev["likes"]))
+
+    def _set_latest(self, key, platform, brand, ts, views, likes):
+        self.db.execute(
+            """INSERT INTO post_latest VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+               ON CONFLICT (bot, key) DO UPDATE SET
+                   brand = excluded.brand, last_ts = MAX(last_ts, excluded.last_ts),
+                   views = COALESCE(excluded.views, views), likes = COALESCE(excluded.likes, likes)""",
+            (self.bot, key, platform, brand, ts, ts, views, likes),
+        )
+
+    def _roll(self, platform, brand, ts, gained_views, gained_likes, since=None):
+        for period in PERIODS:
+            bucket = bucket_start(ts, period)
+            if since and bucket < since[period]: continue
+            self.db.execute(
+                """INSERT INTO rollups VALUES (?, ?, ?, ?, ?, ?, ?, 1)
+                   ON CONFLICT (bot, period, bucket, brand, platform) DO UPDATE SET
+                       views = views + excluded.views, likes = likes + excluded.likes, samples = samples + 1""",
+                (self.bot, period, bucket, brand, platform, gained_views, gained_likes),
+            )
+
+    def rebuild_rollups(self):
+        """
+        Recomputes the rollups the kept raw samples fully cover. When a post's
+        older samples were pruned, its oldest kept one is only a baseline, so
+        buckets up to that one are left as they are. post_latest is
+        refreshed, never emptied.
+        """
+        with self.lock:
+            self.db.execute("BEGIN")
+            try:
+                rows = self.db.execute(
+                    "SELECT * FROM samples WHERE bot = ? ORDER BY ts", (self.bot,)
+                ).fetchall()
+                first_seen = {r["key"]: r["first_ts"] for r in self.db.execute(
+                    "SELECT key, first_ts FROM post_latest WHERE bot = ?", (self.bot,)
+                )}
+                baselines = {}  # key -> ts of its oldest kept sample
+                for r in rows: baselines.setdefault(r["key"], r["ts"])
+                pruned = [ts for key, ts in baselines.items() if first_seen.get(key, ts) < ts]
+
+                since = {}
+                for period, size in (PERIODS.items() if rows else ()):
+                    since[period] = max([bucket_start(rows[0]["ts"], period)] + [bucket_start(ts, period) + size for ts in pruned])
+                    self.db.execute(
+                        "DELETE FROM rollups WHERE bot = ? AND period = ? AND bucket >= ?", (self.bot, period, since[period])
+                    )
+
+                last = {}  # key -> (views, likes) so far, a missing value keeps the older one
+                for r in rows:
+                    prev = last.get(r["key"])
+                    self._set_latest(r["key"], r["platform"], r["brand"], r["ts"], r["views"], r["likes"])
+                    if prev:
+                        self._roll(r["platform"], r["brand"], r["ts"], _gained(r["views"], prev[0]),
+                                   _gained(r["likes"], prev[1]), since)
+                    views, likes = prev or (None, None)
+                    last[r["key"]] = (views if r["views"] is None else r["views"], likes if r["likes"] is None else r["likes"])
+                self.db.execute("COMMIT")
+            except Exception:
+                self.db.execute("ROLLBACK")
+                raise
+        return len(rows)
+
+    # ==========================================================================
+    # 🔎 QUERIES (LOCAL ONLY)
+    # ==========================================================================
+
+    def top(self, metric="views", limit=10, brand=None, platform=None):
+        """Posts with the most views/likes right now"""
+        if metric not in METRICS: raise ValueError(f"metric must be one of {METRICS}")
+        where, params = self._where(brand, platform)
+        return [dict(r) for r in self.db.execute(
+            f"SELECT * FROM post_latest{where} ORDER BY COALESCE({metric}, 0) DESC LIMIT ?", params + [limit]
+        )]
+
+    def velocity(self, metric="views", hours=24, limit=10, brand=None, platform=None):
+        """Posts gaining the most views/likes per hour over the last `hours`"""
+        if metric not in METRICS: raise ValueError(f"metric must be one of {METRICS}")
+        where, params = self._where(brand, platform)
+        cutoff = time.time() - hours * 3600
+        where = (where + " AND" if where else " WHERE") + f" ts >= ? AND {metric} IS NOT NULL"
+        first, last = {}, {}
+        for r in self.db.execute(f"SELECT * FROM samples{where} ORDER BY ts", params + [cutoff]):
+            first.setdefault(r["key"], r)
+            last[r["key"]] = r
+
+        out = []
+        for key, end in last.items():
+            start = first[key]
+            span = max(end["ts"] - start["ts"], 0) / 3600
+            if span <= 0: continue
+            gained = end[metric] - start[metric]
+            out.append({"key": key, "brand": end["brand"], "platform": end["platform"],
+                        "gained": gained, "per_hour": gained / span, metric: end[metric]})
+        out.sort(key=lambda x: x["per_hour"], reverse=True)
+        return out[:limit]
+
+    def totals(self, brand=None, platform=None):
+        """Current views/likes summed per brand + platform"""
+        where, params = self._where(brand, platform)
+        return [dict(r) for r in self.db.execute(
+            f"""SELECT brand, platform, COUNT(*) AS posts, SUM(views) AS views, SUM(likes) AS likes
+                FROM post_latest{where} GROUP BY brand, platform ORDER BY SUM(COALESCE(views, 0)) DESC, SUM(likes) DESC""",
+            params,
+        )]
+
+    def rollups(self, period="day", since=None, brand=None, platform=None):
+        """Views/likes gained per hour or day bucket, per brand + platform"""
+        if period not in PERIODS: raise ValueError(f"period must be one of {tuple(PERIODS)}")
+        where, params = self._where(brand, platform)
+        where = (where + " AND" if where else " WHERE") + " period = ? AND bucket >= ?"
+        return [dict(r) for r in self.db.execute(
+            f"""SELECT bucket, brand, platform, SUM(views) AS views, SUM(likes) AS likes, SUM(samples) AS samples
+                FROM rollups{where} GROUP BY bucket, brand, platform ORDER BY bucket, brand, platform""",
+            params + [period, since or 0],
+        )]
+
+# ==============================================================================
+# 🖥️ CLI: python metrics_store.py top|velocity|totals|rollup [options]
+# ==============================================================================
+
+def _num(value):
+    return "-" if value is None else f"{value:,}" if isinstance(value, int) else f"{value:,.1f}"
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Reports from the local metrics history (no API calls)")
+    parser.add_argument("--bot", help="content_bot / dropshipping_bot (default: all)")
+    parser.add_argument("--brand")
+    parser.add_argument("--platform", choices=["yt", "fb"])
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("top", help="Posts with the most views/likes")
+    p.add_argument("--metric", choices=METRICS, default="views")
+    p.add_argument("--limit", type=int, default=10)
+
+    p = sub.add_parser("velocity", help="Fastest growing posts")
+    p.add_argument("--metric", choices=METRICS, default="views")
+    p.add_argument("--hours", type=float, default=24)
+    p.add_argument("--limit", type=int, default=10)
+
+    sub.add_parser("totals", help="Views/likes per brand + platform")
+
+    p = sub.add_parser("rollup", help="Growth per hour/day bucket")
+    p.add_argument("--period", choices=list(PERIODS), default="day")
+    p.add_argument("--days", type=float, default=7)
+    p.add_argument("--rebuild", action="store_true", help="Recompute rollups from raw samples first (needs --bot)")
+
+    args = parser.parse_args(argv)
+    store = MetricsStore(args.bot)
+    filters = {"brand": args.brand, "platform": args.platform}
+    started = time.perf_counter()
+
+    if args.command == "top":
+        print(f"🏆 Top {args.limit} by {args.metric}")
+        for r in store.top(args.metric, args.limit, **filters):
+            print(f"   {r['key']:<28} {r['brand']:<16} {_num(r['views']):>12} views {_num(r['likes']):>10} likes")
+
+    elif args.command == "velocity":
+        print(f"🚀 Fastest {args.metric} growth, last {args.hours:g}h")
+        for r in store.velocity(args.metric, args.hours, args.limit, **filters):
+            print(f"   {r['key']:<28} {r['brand']:<16} +{_num(r['gained']):>10} ({_num(r['per_hour'])}/h)")
+
+    elif args.command == "totals":
+        print("📊 Totals per brand")
+        for r in store.totals(**filters):
+            print(f"   {r['brand']:<16} {r['platform']:<3} {r['posts']:>5} posts {_num(r['views']):>14} views {_num(r['likes']):>12} likes")
+
+    elif args.command == "rollup":
+        if args.rebuild:
+            if not args.bot: parser.error("--rebuild needs --bot")
+            print(f"🔧 Rebuilt rollups from {store.rebuild_rollups()} samples.")
+        since = bucket_start(time.time() - args.days * 86400, args.period)
+        fmt = "%Y-%m-%d" if args.period == "day" else "%Y-%m-%d %H:00"
+        print(f"🗓️ Growth per {args.period} (IST), last {args.days:g} days")
+        for r in store.rollups(args.period, since, **filters):
+            print(f"   {ist_text(r['bucket'], fmt):<17} {r['brand']:<16} {r['platform']:<3} +{_num(r['views']):>10} views +{_num(r['likes']):>8} likes")
+
+    print(f"⏱️ {(time.perf_counter() - started) * 1000:.1f} ms")
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -5,6 +5,9 @@ import requests
 import re
 import gspread
 from google.oauth2.service_account import Credentials
+from sheet_io import SheetWriteBuffer
+from video_cache import VIDEO_CACHE, cache_key_for_url
+from streaming_upload import post_multipart
 
 # ==============================================================================
 # 1. CONFIGURATION & MAPPING
@@ -122,11 +125,10 @@ def upload_video_v5(access_token, file_path):
         
         # 2. Upload File
         print("📤 Uploading bytes...")
-        with open(file_path, 'rb') as f:
-            up = requests.post(upload_url, data=params, files={'file': f})
-            if up.status_code != 204:
-                print(f"❌ Upload Failed: {up.status_code}")
-                return None
+        up = post_multipart(requests, upload_url, 'file', file_path, fields=params)
+        if up.status_code != 204:
+            print(f"❌ Upload Failed: {up.status_code}")
+            return None
         
         # 3. Check Status
         print("⏳ Processing Video (Waiting 10s)...")
@@ -181,6 +183,7 @@ def run_pinterest_bot():
     print("🚀 Pinterest Bot Started...")
     sheet = get_sheet_service()
     if not sheet: return
+    writer = SheetWriteBuffer(sheet)
 
     try:
         all_values = sheet.get_all_values()
@@ -240,31 +243,33 @@ def run_pinterest_bot():
                 
                 if not video_url:
                     print("❌ No Video URL found.")
-                    sheet.update_cell(row_num, status_col, 'NO_VIDEO')
+                    writer.update_cell(row_num, status_col, 'NO_VIDEO')
                     continue
 
                 full_desc = f"{desc}\n\n{tags}"
                 
-                # Execute
-                sheet.update_cell(row_num, status_col, 'PROCESSING')
+                # Execute (claim is flushed right away, it also carries the previous row's result)
+                writer.update_cell(row_num, status_col, 'PROCESSING')
+                writer.flush()
                 
-                temp_file = "temp_pin.mp4"
-                if download_video(video_url, temp_file):
-                    media_id = upload_video_v5(token, temp_file)
+                # Shared cache: a reel already pulled for IG/FB/YT is not downloaded again
+                local_file = VIDEO_CACHE.fetch(cache_key_for_url(video_url), lambda dest: download_video(video_url, dest))
+                if local_file:
+                    media_id = upload_video_v5(token, local_file)
                     if media_id:
                         if create_pin_v5(token, board, media_id, title, full_desc, link):
-                            sheet.update_cell(row_num, status_col, 'DONE')
+                            writer.update_cell(row_num, status_col, 'DONE')
                         else:
-                            sheet.update_cell(row_num, status_col, 'FAIL_PIN')
+                            writer.update_cell(row_num, status_col, 'FAIL_PIN')
                     else:
-                        sheet.update_cell(row_num, status_col, 'FAIL_UPLOAD')
-                    
-                    if os.path.exists(temp_file): os.remove(temp_file)
+                        writer.update_cell(row_num, status_col, 'FAIL_UPLOAD')
                 else:
-                    sheet.update_cell(row_num, status_col, 'FAIL_DL')
+                    writer.update_cell(row_num, status_col, 'FAIL_DL')
 
     except Exception as e:
         print(f"❌ System Error: {e}")
+    finally:
+        writer.flush()
 
 if __name__ == "__main__":
     run_pinterest_bot()
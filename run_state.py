@@ -0,0 +1,95 @@
+import os
+import json
+import time
+from datetime import datetime
+
+# ==============================================================================
+# 💾 LOCAL RUN STATE (SURVIVES BETWEEN CRON RUNS VIA actions/cache)
+# ==============================================================================
+
+STATE_DIR = os.environ.get("BOT_STATE_DIR", ".bot_state")
+
+# Analytics still refresh this often even when the sheet never changes
+ANALYTICS_EVERY = int(os.environ.get("ANALYTICS_EVERY_MIN", "60")) * 60
+
+def state_path(filename):
+    os.makedirs(STATE_DIR, exist_ok=True)
+    return os.path.join(STATE_DIR, filename)
+
+def load_state(name):
+    try:
+        with open(state_path(f"{name}.json"), "r") as f:
+            return json.load(f)
+    except Exception:
+        return {}
+
+def save_state(name, data):
+    """Atomic write so a killed run never leaves half a JSON file behind"""
+    path = state_path(f"{name}.json")
+    tmp = f"{path}.tmp"
+    try:
+        with open(tmp, "w") as f:
+            json.dump(data, f, indent=2)
+        os.replace(tmp, path)
+    except Exception as e:
+        print(f"⚠️ State Save Error ({name}): {e}")
+
+# ==============================================================================
+# 🔍 CHANGE DETECTION
+# ==============================================================================
+
+_SESSIONS = {}  # id(creds) -> AuthorizedSession, reused by daemon cycles
+
+def get_sheet_modified_time(creds, spreadsheet_id):
+    """
+    Drive modifiedTime of the spreadsheet. One small GET, no discovery build.
+    Returns None if Drive can't tell us (then the run just goes ahead).
+    """
+    try:
+        from google.auth.transport.requests import AuthorizedSession
+        session = _SESSIONS.get(id(creds))
+        if session is None:
+            session = _SESSIONS[id(creds)] = AuthorizedSession(creds)
+        r = session.get(
+            f"https://www.googleapis.com/drive/v3/files/{spreadsheet_id}",
+            params={"fields": "modifiedTime", "supportsAllDrives": "true"},
+            timeout=10,
+        )
+        if r.status_code == 200:
+            return r.json().get("modifiedTime")
+        print(f"⚠️ Drive modifiedTime Failed: {r.status_code}")
+    except Exception as e:
+        print(f"⚠️ Drive modifiedTime Error: {e}")
+    return None
+
+def next_due_time(times):
+    """Earliest schedule among PENDING rows, as ISO text for the state file"""
+    times = [t for t in times if t]
+    return min(times).isoformat() if times else None
+
+def nothing_due(state, now, window):
+    """True if the cached next due time is still beyond the sniper window"""
+    next_due = state.get("next_due")
+    if not next_due: return True
+    try:
+        return (datetime.fromisoformat(next_due) - now).total_seconds() > window
+    except ValueError:
+        return False
+
+def analytics_stale(state):
+    """
+    True when a tracked post is due for a refresh (analytics.AnalyticsSchedule),
+    or the sheet hasn't been scanned for new posts in ANALYTICS_EVERY.
+    """
+    due = state.get("analytics_due")
+    if due is not None and time.time() >= due: return True
+    return time.time() - state.get("last_analytics", 0) >= ANALYTICS_EVERY
+
+def should_skip_run(state, modified_time, now, window):
+    """
+    Skip when the sheet is untouched since last run, the next post isn't due
+    yet and analytics were refreshed recently.
+    """
+    if not state or not modified_time: return False
+    if modified_time != state.get("modified_time"): return False
+    return nothing_due(state, now, window) and not analytics_stale(state)
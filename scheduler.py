@@ -0,0 +1,105 @@
+import time
+import heapq
+import itertools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# ==============================================================================
+# ⏰ PRIORITY-QUEUE SCHEDULER (REPLACES INLINE check_time_and_wait SLEEPS)
+# ==============================================================================
+
+class JobScheduler:
+    """
+    Min-heap of jobs keyed by scheduled datetime.
+    Due jobs are dispatched right away, the loop only sleeps until the next
+    deadline, and downloads for upcoming jobs run in the background so the
+    upload can fire at the exact minute.
+    """
+
+    def __init__(self, now_fn, prefetch=None, prefetch_ahead=300, tick=5, stop_event=None):
+        self.now_fn = now_fn
+        self.prefetch_fn = prefetch
+        self.prefetch_ahead = prefetch_ahead
+        self.tick = tick
+        self.stop_event = stop_event or threading.Event()
+        self.heap = []
+        self.downloads = {}  # seq -> Future
+        self._seq = itertools.count()
+        # One worker: the Drive client (httplib2) is not thread-safe
+        self.executor = ThreadPoolExecutor(max_workers=1) if prefetch else None
+
+    def __len__(self):
+        return len(self.heap)
+
+    def add(self, when, job):
+        heapq.heappush(self.heap, (when, next(self._seq), job))
+
+    def _start_prefetch(self, now):
+        if not self.executor: return
+        for when, seq, job in sorted(self.heap):
+            if (when - now).total_seconds() > self.prefetch_ahead: break
+            if seq not in self.downloads:
+                self.downloads[seq] = self.executor.submit(self.prefetch_fn, job)
+
+    def run(self, dispatch, idle=None):
+        """
+        dispatch(job, download) is called for each job when it is due.
+        download is the prefetch Future (None without a prefetch function).
+        idle() is called while waiting for the next deadline.
+        """
+        announced = None
+        try:
+            while self.heap and not self.stop_event.is_set():
+                now = self.now_fn()
+                self._start_prefetch(now)
+
+                when, seq, job = self.heap[0]
+                wait = (when - now).total_seconds()
+                if wait <= 0:
+                    heapq.heappop(self.heap)
+                    try:
+                        dispatch(job, self.downloads.pop(seq, None))
+                    except Exception as e:
+                        print(f"      ❌ Job Error: {e}")
+                    continue
+
+                if announced != seq:
+                    print(f"   ⏳ Next job at {when.strftime('%H:%M')} ({int(wait)}s), {len(self.heap)} queued...")
+                    announced = seq
+                self.stop_event.wait(min(wait, self.tick))
+                if idle: idle()
+        finally:
+            if self.executor:
+                for future in self.downloads.values(): future.cancel()
+                self.executor.shutdown(wait=True)
+
+# ==============================================================================
+# 🔁 DAEMON LOOP (ONE WARM PROCESS INSTEAD OF A COLD START EVERY 5 MINS)
+# ==============================================================================
+
+def run_daemon(cycle, interval):
+    """
+    Calls cycle(stop_event) every `interval` seconds until SIGTERM/SIGINT.
+    A signal lets the current job finish, then the loop exits.
+    """
+    import signal
+
+    stop_event = threading.Event()
+
+    def _stop(signum, frame):
+        print(f"🛑 Signal {signum} received, finishing current job...")
+        stop_event.set()
+
+    signal.signal(signal.SIGTERM, _stop)
+    signal.signal(signal.SIGINT, _stop)
+
+    print(f"😈 Daemon mode: polling every {interval}s.")
+    while not stop_event.is_set():
+        started = time.time()
+        try:
+            cycle(stop_event)
+        except Exception as e:
+            print(f"❌ Cycle Error: {e}")
+        print(f"🔁 Cycle took {time.time() - started:.1f}s, next poll in {interval}s.")
+        stop_event.wait(interval)
+    print("👋 Daemon stopped.")
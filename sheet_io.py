@@ -0,0 +1,122 @@
+import time
+from gspread.utils import rowcol_to_a1
+
+# ==============================================================================
+# 📝 BUFFERED SHEET WRITES (ONE batch_update INSTEAD OF MANY update_cell)
+# ==============================================================================
+
+class SheetWriteBuffer:
+    """
+    Collects cell changes and sends them to the sheet in one batch_update call.
+    Cells written twice keep only the last value, side-by-side cells in the
+    same row are merged into one range.
+    """
+
+    def __init__(self, sheet, max_pending=200, retries=3):
+        self.sheet = sheet
+        self.max_pending = max_pending
+        self.retries = retries
+        self.pending = {}  # (row, col) -> value
+
+    def update_cell(self, row, col, value):
+        # col 0 means "column not found in headers", same as the old checks
+        if not row or not col or col < 1: return
+        self.pending[(row, col)] = value
+        if len(self.pending) >= self.max_pending:
+            self.flush()
+
+    def _ranges(self):
+        """Groups pending cells into contiguous row ranges."""
+        data = []
+        for row, col in sorted(self.pending):
+            value = self.pending[(row, col)]
+            last = data[-1] if data else None
+            if last and last["row"] == row and last["end"] == col - 1:
+                last["values"].append(value)
+                last["end"] = col
+            else:
+                data.append({"row": row, "start": col, "end": col, "values": [value]})
+
+        return [
+            {
+                "range": f"{rowcol_to_a1(d['row'], d['start'])}:{rowcol_to_a1(d['row'], d['end'])}",
+                "values": [d["values"]],
+            }
+            for d in data
+        ]
+
+    def flush(self):
+        """Writes everything pending. Returns False if the sheet kept refusing."""
+        if not self.pending: return True
+
+        flushing = dict(self.pending)
+        data = self._ranges()
+        for attempt in range(self.retries):
+            try:
+                self.sheet.batch_update(data, value_input_option="USER_ENTERED")
+                # Only drop what was sent, new writes may have come in meanwhile
+                for key, value in flushing.items():
+                    if self.pending.get(key) == value: del self.pending[key]
+                print(f"      💾 Sheet synced: {len(flushing)} cells in {len(data)} ranges.")
+                return True
+            except Exception as e:
+                print(f"      ⚠️ Sheet batch write failed (try {attempt + 1}): {e}")
+                if attempt + 1 < self.retries: time.sleep(2 ** attempt * 5)
+        return False
+
+# ==============================================================================
+# 🔎 TWO-PHASE SCAN (READ FEW COLUMNS, THEN ONLY THE ROWS WE NEED)
+# ==============================================================================
+
+def col_letter(col):
+    """1 -> A, 27 -> AA"""
+    return rowcol_to_a1(1, col)[:-1]
+
+def scan_columns(sheet, headers, columns):
+    """
+    Phase 1: batch_get only a few columns instead of get_all_records().
+    columns = {"Status": ["Status"], "Date": ["Schedule_Date", "Date"]}
+    Returns one dict per sheet row (row number in "_row"), missing columns read as "".
+    """
+    found = {}
+    for key, names in columns.items():
+        for name in names:
+            if name in headers:
+                found[key] = headers.index(name) + 1
+                break
+
+    scan = []
+    if not found: return scan
+
+    keys = list(found)
+    ranges = [f"{col_letter(found[k])}2:{col_letter(found[k])}" for k in keys]
+    results = sheet.batch_get(ranges)
+
+    total = max((len(r) for r in results), default=0)
+    for n in range(total):
+        item = {"_row": n + 2}
+        for key in columns:
+            item[key] = ""
+        for key, values in zip(keys, results):
+            if n < len(values) and values[n]:
+                item[key] = values[n][0]
+        scan.append(item)
+    return scan
+
+def fetch_rows(sheet, headers, row_numbers, chunk=100):
+    """
+    Phase 2: pulls full rows only for the given row numbers.
+    Returns {row_number: {header: value}}, shaped like get_all_records() rows.
+    """
+    rows = {}
+    row_numbers = sorted(set(row_numbers))
+    last_col = col_letter(len(headers))
+
+    # batchGet is a GET request, so keep the range list (URL) short
+    for start in range(0, len(row_numbers), chunk):
+        part = row_numbers[start:start + chunk]
+        results = sheet.batch_get([f"A{r}:{last_col}{r}" for r in part])
+        for r, values in zip(part, results):
+            raw = values[0] if values else []
+            rows[r] = {h: (raw[k] if k < len(raw) else "") for k, h in enumerate(headers)}
+    return rows
@@ -0,0 +1,153 @@
+import os
+import sys
+import uuid
+import mimetypes
+
+# ==============================================================================
+# 🌊 STREAMING MULTIPART UPLOADS (CONSTANT MEMORY, ANY VIDEO SIZE)
+# ==============================================================================
+
+# Bytes read from disk per read() call
+CHUNK_SIZE = int(os.environ.get("UPLOAD_CHUNK_KB", "1024")) * 1024
+
+class MultipartStream:
+    """
+    multipart/form-data body that requests sends by calling read() on it.
+    Form fields and part headers are built up front (a few hundred bytes),
+    the file itself is read from disk in CHUNK_SIZE pieces while sending,
+    so `files={...}` never loads the whole video into RAM.
+    """
+
+    def __init__(self, fields, file_field, file_path, filename=None, file_type=None, chunk_size=CHUNK_SIZE):
+        self.boundary = uuid.uuid4().hex
+        self.chunk_size = chunk_size
+        self.file_path = file_path
+        filename = filename or os.path.basename(file_path)
+        file_type = file_type or mimetypes.guess_type(filename)[0] or "application/octet-stream"
+
+        head = b""
+        for name, value in (fields or {}).items():
+            head += (
+                f"--{self.boundary}\r\n"
+                f'Content-Disposition: form-data; name="{name}"\r\n\r\n'
+                f"{value}\r\n"
+            ).encode("utf-8")
+        head += (
+            f"--{self.boundary}\r\n"
+            f'Content-Disposition: form-data; name="{file_field}"; filename="{filename}"\r\n'
+            f"Content-Type: {file_type}\r\n\r\n"
+        ).encode("utf-8")
+        tail = f"\r\n--{self.boundary}--\r\n".encode("utf-8")
+
+        self.file_size = os.path.getsize(file_path)
+        self.length = len(head) + self.file_size + len(tail)
+        self._parts = [head, None, tail]  # None = the file
+        self._current = b""
+        self._pos = 0
+        self._file = None
+
+    @property
+    def content_type(self):
+        return f"multipart/form-data; boundary={self.boundary}"
+
+    def __len__(self):
+        return self.length
+
+    def _next_piece(self):
+        """Next block of body bytes, b"" once everything has been sent"""
+        while self._parts:
+            part = self._parts[0]
+            if part is not None:
+                self._parts.pop(0)
+                return part
+            if self._file is None:
+                self._file = open(self.file_path, "rb")
+            data = self._file.read(self.chunk_size)
+            if data: return data
+            self._file.close()
+            self._parts.pop(0)
+        return b""
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            size = self.chunk_size
+        out = []
+        while size > 0:
+            if self._pos >= len(self._current):
+                self._current, self._pos = self._next_piece(), 0
+                if not self._current: break
+            data = self._current[self._pos:self._pos + size]
+            self._pos += len(data)
+            size -= len(data)
+            out.append(data)
+        return b"".join(out)
+
+    def close(self):
+        if self._file and not self._file.closed:
+            self._file.close()
+
+def post_multipart(session, url, file_field, file_path, fields=None, **kwargs):
+    """
+    Drop-in for session.post(url, data=fields, files={file_field: f}).
+    `session` can be a requests.Session or the requests module itself.
+    """
+    body = MultipartStream(fields, file_field, file_path)
+    headers = dict(kwargs.pop("headers", None) or {})
+    headers["Content-Type"] = body.content_type
+    headers["Content-Length"] = str(len(body))
+    try:
+        return session.post(url, data=body, headers=headers, **kwargs)
+    finally:
+        body.close()
+
+# ==============================================================================
+# 📏 MEMORY BENCHMARK: python streaming_upload.py --bench [SIZE_MB ...]
+# ==============================================================================
+
+def _bench(sizes_mb):
+    import tempfile
+    import tracemalloc
+
+    def peak_mb(fn):
+        tracemalloc.start()
+        fn()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        return peak / (1024 * 1024)
+
+    try:
+        import requests
+    except ImportError:
+        requests = None
+        print("⚠️ requests not installed, only the streaming path is measured.")
+
+    print(f"{'Video':>10} | {'files= (old)':>14} | {'MultipartStream':>16}")
+    for size_mb in sizes_mb:
+        with tempfile.NamedTemporaryFile(suffix=".mp4", delete=False) as tmp:
+            block = os.urandom(1024 * 1024)
+            for _ in range(size_mb): tmp.write(block)
+        try:
+            def old_way():
+                # What requests does for files={...}: the whole body as one bytes object
+                with open(tmp.name, "rb") as f:
+                    requests.Request("POST", "https://example.com", data={"description": "x"},
+                                     files={"source": f}).prepare()
+
+            def new_way():
+                # Same reads http.client makes while sending the body
+                body = MultipartStream({"description": "x"}, "source", tmp.name)
+                while body.read(8192): pass
+                body.close()
+
+            old = f"{peak_mb(old_way):.1f} MB" if requests else "n/a"
+            new = f"{peak_mb(new_way):.1f} MB"
+            print(f"{size_mb:>7} MB | {old:>14} | {new:>16}")
+        finally:
+            os.remove(tmp.name)
+
+if __name__ == "__main__":
+    if "--bench" in sys.argv:
+        sizes = [int(a) for a in sys.argv[1:] if a.isdigit()] or [50, 200]
+        _bench(sizes)
+    else:
+        print("Usage: python streaming_upload.py --bench [SIZE_MB ...]")
@@ -0,0 +1,49 @@
+import os
+import sys
+import types
+import pytest
+
+# The bots are flat modules in the repo root
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+@pytest.fixture
+def fake_modules(monkeypatch):
+    """
+    fake_modules({"gspread.utils": {"rowcol_to_a1": ...}, ...}) puts stand-in
+    modules in sys.modules for this test only, so the bots import without the
+    Google/Meta client libraries or any credentials. Parent packages are
+    created as needed, everything is restored after the test.
+    """
+    installed = {}
+
+    def install(modules):
+        for name, attrs in modules.items():
+            parts = name.split(".")
+            for depth in range(1, len(parts) + 1):
+                full = ".".join(parts[:depth])
+                if full not in installed:
+                    installed[full] = types.ModuleType(full)
+                    monkeypatch.setitem(sys.modules, full, installed[full])
+                    if depth > 1: setattr(installed[".".join(parts[:depth - 1])], parts[depth - 1], installed[full])
+            for attr, value in attrs.items():
+                setattr(installed[name], attr, value)
+        return installed
+
+    return install
+
+@pytest.fixture
+def mb(monkeypatch, tmp_path, fake_modules):
+    """master_bot imported against stand-in Google/HTTP modules"""
+    fake_modules({
+        "requests": {"Session": lambda: None},
+        "gspread": {},
+        "gspread.utils": {"rowcol_to_a1": lambda row, col: f"R{row}C{col}"},
+        "google.oauth2.service_account": {"Credentials": object},
+        "googleapiclient.discovery": {"build": lambda *a, **k: None},
+        "googleapiclient.http": {"MediaIoBaseDownload": object},
+    })
+    for module in ("master_bot", "sheet_io", "graph_api"):
+        monkeypatch.delitem(sys.modules, module, raising=False)
+    monkeypatch.chdir(tmp_path)
+    import master_bot
+    return master_bot
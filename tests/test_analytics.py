@@ -0,0 +1,42 @@
+import time
+import run_state
+from analytics import AnalyticsSchedule, MAX_MISSES, MISS_BACKOFF, REFRESH_OLD
+
+def test_posts_without_numbers_back_off_instead_of_pinning_next_due(tmp_path, monkeypatch):
+    analytics = AnalyticsSchedule("bot", str(tmp_path / "analytics.db"))
+    now = time.time()
+    due = analytics.due(["yt:alive", "yt:deleted"], now=now)
+    assert due == {"yt:alive", "yt:deleted"}
+
+    # Only the live video came back with stats
+    analytics.refreshed({"yt:alive"}, now=now)
+    analytics.missed(due - {"yt:alive"}, now=now)
+
+    assert analytics.next_due() == now + MISS_BACKOFF
+    monkeypatch.setattr(run_state, "ANALYTICS_EVERY", 10 ** 9)
+    assert not run_state.analytics_stale({"analytics_due": analytics.next_due(), "last_analytics": now})
+    assert analytics.due(["yt:alive", "yt:deleted"], now=now + 60) == set()
+
+    # Each further miss doubles the wait, up to a day
+    analytics.missed({"yt:deleted"}, now=now + MISS_BACKOFF)
+    assert analytics.due(["yt:deleted"], now=now + 2 * MISS_BACKOFF) == set()
+    assert analytics.due(["yt:deleted"], now=now + 3 * MISS_BACKOFF) == {"yt:deleted"}
+
+def test_post_is_retired_after_max_misses(tmp_path):
+    analytics = AnalyticsSchedule("bot", str(tmp_path / "analytics.db"))
+    now = time.time()
+    analytics.due(["fb:gone"], now=now)
+    for n in range(MAX_MISSES):
+        analytics.missed({"fb:gone"}, now=now + n * REFRESH_OLD)
+
+    assert analytics.due(["fb:gone"], now=now + 100 * REFRESH_OLD) == set()
+    assert analytics.next_due() is None
+
+def test_a_refresh_clears_the_misses(tmp_path):
+    analytics = AnalyticsSchedule("bot", str(tmp_path / "analytics.db"))
+    now = time.time()
+    analytics.due(["yt:flaky"], now=now)
+    analytics.missed({"yt:flaky"}, now=now)
+    analytics.missed({"yt:flaky"}, now=now)
+    analytics.refreshed({"yt:flaky"}, now=now)
+    assert analytics.next_due() == now + REFRESH_OLD
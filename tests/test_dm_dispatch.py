@@ -0,0 +1,117 @@
+import time
+import threading
+import pytest
+import dm_dispatch
+from dm_store import DMStore
+from dm_dispatch import DMDispatcher, TokenBucket
+
+class SlowGraph:
+    """Counts DMs, each one takes long enough for the other thread to catch up"""
+
+    def __init__(self, error=None):
+        self.sent = []
+        self.error = error
+        self.lock = threading.Lock()
+
+    def send(self, ig_id, comment_id, text):
+        time.sleep(0.2)
+        if self.error: return {"error": {"message": self.error}}
+        with self.lock: self.sent.append(comment_id)
+        return {"recipient_id": "user"}
+
+COMMENT = {"id": "c1", "text": "price please", "username": "buyer"}
+
+def test_same_comment_from_two_threads_gets_one_dm(mb, tmp_path):
+    store = DMStore(str(tmp_path / "dm.db"))
+    graph = SlowGraph()
+    send = DMDispatcher(graph.send).send
+    start = threading.Barrier(2)
+    results = []
+
+    def worker():
+        start.wait()
+        results.append(mb.handle_comment(store, "URBAN GLINT", "ig1", dict(COMMENT), "SC1", {}, send=send))
+
+    threads = [threading.Thread(target=worker) for _ in range(2)]
+    for t in threads: t.start()
+    for t in threads: t.join()
+
+    assert graph.sent == ["c1"]
+    assert sorted(results) == ["sent", "skipped"]
+    assert [(r["comment_id"], r["message"]) for r in store.unmirrored()] == [("c1", "Sent")]
+
+def test_failed_send_releases_the_claim(mb, tmp_path):
+    store = DMStore(str(tmp_path / "dm.db"))
+    failing = SlowGraph(error="boom")
+    assert mb.handle_comment(store, "URBAN GLINT", "ig1", dict(COMMENT), "SC1", {}, send=failing.send) == "failed"
+    assert store.unmirrored() == []
+
+    graph = SlowGraph()
+    assert mb.handle_comment(store, "URBAN GLINT", "ig1", dict(COMMENT), "SC1", {}, send=graph.send) == "sent"
+    assert graph.sent == ["c1"]
+
+class Clock:
+    """Stands in for the time module inside dm_dispatch: sleep() only moves the clock"""
+
+    def __init__(self):
+        self.now = 1000.0
+        self.slept = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.slept.append(seconds)
+        self.now += seconds
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(dm_dispatch, "time", clock)
+    return clock
+
+def test_default_rate_stays_under_the_hourly_private_reply_limit():
+    assert dm_dispatch.DM_RATE * 3600 + dm_dispatch.DM_BURST <= dm_dispatch.DM_PER_HOUR
+
+def test_bucket_allows_a_burst_then_paces_at_the_rate(clock):
+    bucket = TokenBucket(rate=2, burst=3)
+    times = []
+    for _ in range(7):
+        bucket.acquire()
+        times.append(clock.now - 1000)
+    assert times[:3] == [0, 0, 0]
+    assert times[3:] == pytest.approx([0.5, 1.0, 1.5, 2.0])
+
+    # Idle time refills it, but never past the burst size
+    clock.now += 60
+    start = clock.now
+    for _ in range(4): bucket.acquire()
+    assert clock.now - start == pytest.approx(0.5)
+
+def test_pause_holds_every_sender_back(clock):
+    bucket = TokenBucket(rate=10, burst=5)
+    bucket.pause(30)
+    start = clock.now
+    bucket.acquire()
+    assert clock.now - start >= 30
+
+@pytest.mark.parametrize("code", [613, 4, 17, 429])
+def test_throttled_dm_is_retried_not_failed(clock, mb, tmp_path, code):
+    calls = []
+
+    def send(ig_id, comment_id, text):
+        calls.append(clock.now)
+        if len(calls) < 3: return {"error": {"code": code, "message": "slow down"}}
+        return {"recipient_id": "user"}
+
+    store = DMStore(str(tmp_path / "dm.db"))
+    dispatcher = DMDispatcher(send, rate=100, burst=10, retries=4)
+    assert mb.handle_comment(store, "URBAN GLINT", "ig1", dict(COMMENT), "SC1", {}, send=dispatcher.send) == "sent"
+    assert len(calls) == 3
+    assert calls[1] - calls[0] >= 5 and calls[2] - calls[1] >= 10  # Backoff doubles
+
+def test_throttle_gives_up_after_the_retries(clock):
+    calls = []
+    dispatcher = DMDispatcher(lambda *a: calls.append(a) or {"error": {"code": 613}}, rate=100, burst=10, retries=2)
+    assert dispatcher.send("ig1", "c1", "hi")["error"]["code"] == 613
+    assert len(calls) == 3
@@ -0,0 +1,135 @@
+import json
+import types
+import pytest
+from urllib.parse import urlparse, parse_qs
+from dm_store import DMStore
+from dm_dispatch import DMDispatcher
+
+PAGE = 2
+
+def comment(n):
+    return {"id": f"c{n}", "text": "buy please", "username": f"user{n}", "timestamp": f"2026-01-01T00:00:{n:02d}+0000"}
+
+class FakeInstagram:
+    """One reel whose comments come back newest first, PAGE per page, with id-based cursors"""
+
+    def __init__(self, count):
+        self.comments = [comment(n) for n in range(count, 0, -1)]
+
+    def add(self, n):
+        self.comments.insert(0, comment(n))
+
+    def page(self, after=None):
+        ids = [c["id"] for c in self.comments]
+        start = ids.index(after) + 1 if after else 0
+        data = self.comments[start:start + PAGE]
+        body = {"data": data}
+        if start + PAGE < len(self.comments):
+            last = data[-1]["id"]
+            body["paging"] = {"next": f"https://graph.example/m1/comments?after={last}", "cursors": {"after": last}}
+        return body
+
+    def _after(self, url):
+        return parse_qs(urlparse(url).query).get("after", [None])[0]
+
+    def post(self, url, data=None, timeout=None, **kwargs):
+        bodies = []
+        for call in json.loads(data["batch"]):
+            if "/media?" in call["relative_url"]:
+                bodies.append({"data": [{"id": "m1", "shortcode": "S1", "comments_count": len(self.comments)}]})
+            else:
+                bodies.append(self.page(self._after("https://x/" + call["relative_url"])))
+        return types.SimpleNamespace(json=lambda: [{"code": 200, "body": json.dumps(b)} for b in bodies])
+
+    def get(self, url, timeout=None, **kwargs):
+        body = self.page(self._after(url))
+        return types.SimpleNamespace(json=lambda: body)
+
+class FakeLog:
+    def __init__(self):
+        self.rows = []
+
+    def get(self, a1):
+        start = int(a1[1:].split(":")[0])
+        return [[r[0]] for r in self.rows[start - 2:]]
+
+    def append_rows(self, rows, **kwargs):
+        self.rows.extend(rows)
+
+@pytest.fixture
+def dm_run(mb, tmp_path, monkeypatch):
+    """run_instagram_auto_dm against FakeInstagram, returns (run, instagram, sent, log)"""
+    instagram = FakeInstagram(7)
+    store = DMStore(str(tmp_path / "dm.db"))
+    log = FakeLog()
+    sent = []
+
+    def send(ig_id, comment_id, text):
+        sent.append(comment_id)
+        if comment_id == "c2": return {"error": {"code": 551, "message": "This person isn't available right now."}}
+        return {"recipient_id": "u"}
+
+    monkeypatch.setattr(mb, "HTTP", instagram)
+    monkeypatch.setattr(mb, "BRAND_CONFIG", {"A": {"ig_id": "ig1"}})
+    monkeypatch.setattr(mb, "DM_COMMENT_PAGES", 2)
+    monkeypatch.setattr(mb, "DM_DISPATCH", DMDispatcher(send, rate=1000, burst=100))
+    monkeypatch.setattr(mb, "load_product_map", lambda sheet: {})
+    monkeypatch.setattr(mb, "get_dm_log_sheet", lambda sheet: log)
+    monkeypatch.setattr(mb, "get_dm_store", lambda: store)
+    return (lambda: mb.run_instagram_auto_dm(object())), instagram, sent, log
+
+def test_burst_deeper_than_the_page_budget_is_finished_next_run(dm_run):
+    run, instagram, sent, log = dm_run
+
+    # 7 new comments, 2 pages of 2 per run: the 4 newest now, the rest next run
+    run()
+    assert set(sent) == {"c7", "c6", "c5", "c4"}
+
+    instagram.add(8)
+    run()
+    assert set(sent[4:]) == {"c3", "c2", "c1"}
+
+    # Caught up: the comment that came in meanwhile is read from the top
+    run()
+    assert sent[7:] == ["c8"]
+    run()
+    assert len(sent) == 8
+
+def test_undeliverable_dm_is_logged_and_does_not_block_the_mark(dm_run):
+    run, instagram, sent, log = dm_run
+    run()
+    run()
+    assert sorted(sent) == [f"c{n}" for n in range(1, 8)]
+    assert [r[2] for r in log.rows if r[0] == "c2"] == ["Not sent: This person isn't available right now."]
+
+    # The mark moved on: nothing is read or sent again
+    run()
+    assert len(sent) == 7
+
+def test_poller_with_its_own_db_skips_replies_logged_elsewhere(dm_run, mb, tmp_path):
+    run, instagram, sent, log = dm_run
+
+    # A webhook on another machine answered the newest comments and mirrored them
+    log.rows += [[f"c{n}", f"user{n}", "Sent", "-"] for n in (7, 6, 5)]
+    run()
+    run()
+    assert sorted(sent) == ["c1", "c2", "c3", "c4"]
+
+    # Later syncs only read the rows appended since
+    store = DMStore(str(tmp_path / "other.db"))
+    assert mb.sync_dm_store(store, log)
+    assert store.log_rows_synced() == len(log.rows)
+    log.rows.append(["c9", "user9", "Sent", "-"])
+    reads = []
+    log.get = lambda a1, get=log.get: reads.append(a1) or get(a1)
+    mb.sync_dm_store(store, log)
+    assert reads == [f"A{len(log.rows) + 1}:A"]
+    assert store.replied_among(["c9"]) == {"c9"}
+
+def test_answered_comments_never_reach_the_dm_workers(dm_run, mb, monkeypatch):
+    run, instagram, sent, log = dm_run
+    log.rows += [[f"c{n}", f"user{n}", "Sent", "-"] for n in (7, 5)]
+    handled = []
+    monkeypatch.setattr(mb, "handle_comment", lambda store, brand, ig_id, c, *a: handled.append(c["id"]) or "sent")
+    run()
+    assert sorted(handled) == ["c4", "c6"]
@@ -0,0 +1,72 @@
+import sys
+import json
+import types
+import pytest
+
+class FakeGraph:
+    """Graph /batch + single GETs over containers {id: status_code}"""
+
+    def __init__(self, containers):
+        self.containers = containers
+        self.published = []
+
+    def _call(self, method, url, body=""):
+        path = url.split("?")[0]
+        if method == "POST" and path.endswith("/media_publish"):
+            creation_id = body.split("creation_id=")[1]
+            self.published.append(creation_id)
+            return {"id": f"media-{creation_id}"}
+        if path.startswith("media-"):
+            return {"shortcode": "SC"}
+        return {"status_code": self.containers[path]}
+
+    def post(self, url, data=None, timeout=None, **kwargs):
+        calls = json.loads(data["batch"])
+        bodies = [self._call(c["method"], c["relative_url"], c.get("body", "")) for c in calls]
+        return types.SimpleNamespace(json=lambda: [{"code": 200, "body": json.dumps(b)} for b in bodies])
+
+    def get(self, url, params=None, timeout=None, **kwargs):
+        body = self._call("GET", url.rsplit("/", 1)[-1])
+        return types.SimpleNamespace(json=lambda: body)
+
+@pytest.fixture
+def graph_api(monkeypatch, fake_modules):
+    fake_modules({"requests": {}})
+    monkeypatch.delitem(sys.modules, "graph_api", raising=False)
+    import graph_api
+    return graph_api
+
+def test_killed_run_container_is_not_published_again(graph_api):
+    graph = FakeGraph({"c-live": "PUBLISHED", "c-new": "FINISHED"})
+    publisher = graph_api.ReelPublisher("token", first_delay=0, session=graph)
+    done = {}
+    for container_id in graph.containers:
+        publisher.add(container_id, lambda success, link, c=container_id: done.setdefault(c, (success, link)), ig_user_id="ig1")
+    publisher.drain()
+
+    assert graph.published == ["c-new"]
+    assert done == {"c-live": (True, graph_api.already_published_link("c-live")),
+                    "c-new": (True, "https://www.instagram.com/reel/SC/")}
+
+def test_wait_for_container_reports_published_separately(graph_api):
+    graph = FakeGraph({"c-live": "PUBLISHED", "c-new": "FINISHED", "c-bad": "ERROR"})
+    assert graph_api.wait_for_container("c-live", "token", session=graph) == "PUBLISHED"
+    assert graph_api.wait_for_container("c-new", "token", session=graph) == "FINISHED"
+    assert graph_api.wait_for_container("c-bad", "token", session=graph) == "ERROR"
+
+def test_batch_mode_upload_comes_back_as_a_queued_reel(mb, monkeypatch, tmp_path):
+    from job_journal import JobJournal, UPLOADED
+    journal = JobJournal("bot", str(tmp_path / "jobs.db"))
+    monkeypatch.setattr(mb, "IG_BATCH_PUBLISH", True)
+    monkeypatch.setattr(mb, "start_instagram_upload", lambda *a: "c-new")
+    job = {"row": 5, "brand": "A", "ig_id": "ig1", "ig_caption": "hi", "container_id": None}
+    journal.claim(5, "Instagram", "drive-url")
+
+    result = mb.publish_instagram(job, "video.mp4", journal)
+    assert isinstance(result, mb.QueuedReel) and result.container_id == "c-new"
+    assert journal.get(5, "Instagram")["state"] == UPLOADED
+    assert journal.reusable_container(5, "Instagram", "drive-url") == "c-new"
+
+    # A failed upload is still the plain (success, link, duration) tuple
+    monkeypatch.setattr(mb, "start_instagram_upload", lambda *a: None)
+    assert mb.publish_instagram(dict(job, row=6), "video.mp4", journal) == (False, "", 0)
@@ -0,0 +1,43 @@
+from metrics_store import MetricsStore, bucket_start
+
+HOUR = 3600
+T0 = bucket_start(1_700_000_000, "day") + HOUR  # 01:00 IST on some day
+
+def day_totals(store):
+    """{bucket: (views, likes)} over every brand + platform"""
+    totals = {}
+    for r in store.rollups("day"):
+        views, likes = totals.get(r["bucket"], (0, 0))
+        totals[r["bucket"]] = (views + (r["views"] or 0), likes + (r["likes"] or 0))
+    return totals
+
+def test_first_sample_only_sets_the_baseline(tmp_path):
+    store = MetricsStore("bot", str(tmp_path / "metrics.db"))
+    store.record([("yt:a", "brand", 1000, 50)], ts=T0)
+    assert day_totals(store) == {}
+    assert store.top()[0]["views"] == 1000
+
+    store.record([("yt:a", "brand", 1300, 70)], ts=T0 + HOUR)
+    assert day_totals(store) == {bucket_start(T0, "day"): (300, 20)}
+
+    # Nothing pruned: a rebuild gives the same numbers
+    store.rebuild_rollups()
+    assert day_totals(store) == {bucket_start(T0, "day"): (300, 20)}
+
+def test_rebuild_keeps_old_buckets_and_post_latest(tmp_path):
+    store = MetricsStore("bot", str(tmp_path / "metrics.db"))
+    day = 86400
+    store.record([("yt:a", "brand", 100, 10), ("fb:b", "brand", None, 5)], ts=T0)
+    store.record([("yt:a", "brand", 400, 30), ("fb:b", "brand", None, 9)], ts=T0 + day)
+    store.record([("yt:a", "brand", 900, 35), ("fb:b", "brand", None, 12)], ts=T0 + 2 * day)
+    before = day_totals(store)
+
+    # The first day's samples have aged out of the raw table
+    store.db.execute("DELETE FROM samples WHERE ts < ?", (T0 + day,))
+    assert store.rebuild_rollups() == 4
+
+    # Day 1's growth came from pruned samples: kept as it was, day 2 recomputed
+    assert day_totals(store) == before
+    assert before[bucket_start(T0 + 2 * day, "day")] == (500, 8)
+    assert {r["key"]: (r["views"], r["likes"]) for r in store.top()} == {"yt:a": (900, 35), "fb:b": (None, 12)}
+    assert store.top()[0]["first_ts"] == T0
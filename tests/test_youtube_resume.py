@@ -0,0 +1,122 @@
+import os
+import re
+import sys
+import types
+import importlib.util
+import pytest
+
+WORKFLOWS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".github", "workflows")
+CHUNK = 1000
+VIDEO = b"x" * (3 * CHUNK)
+
+class Killed(BaseException):
+    """The runner being killed (not an Exception, so the bot can't catch it)"""
+
+class FakeYouTube:
+    """videos().insert() whose uploads live in `sessions` {uri: bytes acked}"""
+
+    def __init__(self):
+        self.sessions = {}
+        self.kill_after = None  # Chunks this run may send before it gets killed
+        self.sent = 0
+        self.resumed_from = []
+
+    def videos(self):
+        return self
+
+    def insert(self, part, body, media_body):
+        return FakeInsert(self)
+
+class FakeInsert:
+    def __init__(self, server):
+        self.server = server
+        self.resumable_uri = None
+        self.resumable_progress = 0
+        self._in_error_state = False
+
+    def next_chunk(self, num_retries=0):
+        server = self.server
+        if self._in_error_state:
+            self.resumable_progress = server.sessions[self.resumable_uri]
+            server.resumed_from.append(self.resumable_progress)
+            self._in_error_state = False
+        if self.resumable_uri is None:
+            self.resumable_uri = f"session-{len(server.sessions) + 1}"
+            server.sessions[self.resumable_uri] = 0
+        if server.kill_after is not None and server.sent >= server.kill_after:
+            raise Killed()
+
+        server.sent += 1
+        self.resumable_progress = min(len(VIDEO), self.resumable_progress + CHUNK)
+        server.sessions[self.resumable_uri] = self.resumable_progress
+        if self.resumable_progress >= len(VIDEO):
+            return None, {"id": "vid123"}
+        return types.SimpleNamespace(progress=lambda: self.resumable_progress / len(VIDEO)), None
+
+class FakeSheet:
+    COLUMNS = {8: "Status", 9: "Video Link"}
+
+    def __init__(self, rows):
+        self.rows = rows
+
+    def get_all_records(self):
+        return [dict(r) for r in self.rows]
+
+    def batch_update(self, data, value_input_option=None):
+        for item in data:
+            col, row = re.match(r"([A-Z])(\d+):", item["range"]).groups()
+            for offset, value in enumerate(item["values"][0]):
+                self.rows[int(row) - 2][self.COLUMNS[ord(col) - 64 + offset]] = value
+
+def load_workflow(name, tmp_path, monkeypatch, fake_modules, youtube, sheet):
+    fake_modules({
+        "gspread": {"authorize": lambda creds: types.SimpleNamespace(
+            open=lambda name: types.SimpleNamespace(get_worksheet=lambda i: sheet))},
+        "gspread.utils": {"rowcol_to_a1": lambda row, col: f"{chr(64 + col)}{row}"},
+        "requests": {"get": lambda url: types.SimpleNamespace(content=VIDEO)},
+        "gdown": {},
+        "oauth2client.service_account": {"ServiceAccountCredentials": types.SimpleNamespace(
+            from_json_keyfile_dict=lambda info, scope: None)},
+        "google.oauth2.credentials": {"Credentials": types.SimpleNamespace(
+            from_authorized_user_info=lambda info: None)},
+        "googleapiclient.discovery": {"build": lambda *a, **k: youtube},
+        "googleapiclient.errors": {"HttpError": type("HttpError", (Exception,), {})},
+        "googleapiclient.http": {"MediaFileUpload": lambda path, chunksize, resumable: None},
+    })
+    for module in ("sheet_io", "youtube_resume"):
+        monkeypatch.delitem(sys.modules, module, raising=False)
+    monkeypatch.setenv("GCP_CREDENTIALS", "{}")
+    monkeypatch.setenv("YOUTUBE_TOKEN_JSON", "{}")
+
+    import run_state
+    import video_cache
+    monkeypatch.setattr(run_state, "STATE_DIR", str(tmp_path / "state"))
+    spec = importlib.util.spec_from_file_location(f"workflow_{name[:-3]}", os.path.join(WORKFLOWS, name))
+    workflow = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(workflow)
+    monkeypatch.setattr(workflow, "VIDEO_CACHE", video_cache.VideoCache(str(tmp_path / "cache")))
+    return workflow
+
+@pytest.mark.parametrize("name", ["content_youtube.py", "drop_youtube.py"])
+def test_killed_upload_resumes_on_next_run(name, tmp_path, monkeypatch, fake_modules):
+    youtube = FakeYouTube()
+    sheet = FakeSheet([{"Platform": "YouTube", "Status": "PENDING", "Account Name": "acc",
+                        "Video URL": "https://example.com/reel.mp4", "Caption": "t", "Tags": "#a"}])
+    workflow = load_workflow(name, tmp_path, monkeypatch, fake_modules, youtube, sheet)
+    row_key = f"{workflow.SHEET_NAME}:2"
+
+    # Run 1 dies after the first chunk, with the session already in the journal
+    youtube.kill_after = 1
+    with pytest.raises(Killed):
+        workflow.main()
+    assert sheet.rows[0]["Status"] == "Uploading..."
+    assert workflow.has_pending_upload(row_key)
+
+    # Run 2 picks the row up again and continues the same session
+    youtube.kill_after = None
+    workflow.main()
+    assert sheet.rows[0]["Status"] == "DONE"
+    assert sheet.rows[0]["Video Link"] == "https://youtu.be/vid123"
+    assert list(youtube.sessions) == ["session-1"]
+    assert youtube.resumed_from == [CHUNK]
+    assert not workflow.has_pending_upload(row_key)
@@ -0,0 +1,143 @@
+import os
+import re
+import json
+import time
+import hashlib
+from contextlib import contextmanager
+
+try:
+    import fcntl  # Linux/macOS (GitHub runners, Docker)
+except ImportError:
+    fcntl = None
+
+# ==============================================================================
+# 🎞️ SHARED VIDEO CACHE (ONE DOWNLOAD PER DRIVE FILE, ALL BOTS/PLATFORMS)
+# ==============================================================================
+
+CACHE_DIR = os.environ.get("VIDEO_CACHE_DIR", ".video_cache")
+MAX_BYTES = int(os.environ.get("VIDEO_CACHE_MAX_MB", "2048")) * 1024 * 1024
+
+# Files used in the last 30 mins are never evicted (another bot may be uploading them)
+IN_USE_GRACE = 30 * 60
+
+def extract_drive_id(url):
+    """Drive file ID from /d/<id>/ or ?id=<id> links, else None"""
+    url = str(url or "")
+    m = re.search(r"/d/([a-zA-Z0-9_-]+)", url) or re.search(r"[?&]id=([a-zA-Z0-9_-]+)", url)
+    return m.group(1) if m else None
+
+def cache_key_for_url(url):
+    """Drive file ID when there is one, otherwise a hash of the URL"""
+    return extract_drive_id(url) or "url-" + hashlib.sha1(str(url).encode("utf-8")).hexdigest()[:20]
+
+def file_md5(path, chunk_size=1024 * 1024):
+    md5 = hashlib.md5()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            md5.update(chunk)
+    return md5.hexdigest()
+
+class VideoCache:
+    """
+    On-disk cache keyed by Drive file ID, checked against Drive md5/size.
+    Per-key file locks make parallel processes share one download, and the
+    least recently used files are evicted once the byte budget is exceeded.
+    """
+
+    def __init__(self, cache_dir=CACHE_DIR, max_bytes=MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def path_for(self, key):
+        return os.path.join(self.cache_dir, f"{key}.mp4")
+
+    @contextmanager
+    def _lock(self, name):
+        with open(os.path.join(self.cache_dir, f"{name}.lock"), "a") as lock_file:
+            if fcntl: fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl: fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _read_meta(self, key):
+        try:
+            with open(self.path_for(key) + ".json", "r") as f:
+                return json.load(f)
+        except Exception:
+            return {}
+
+    def get(self, key, md5=None, size=None):
+        """Cached path if present and matching Drive's md5/size, else None"""
+        path = self.path_for(key)
+        if not os.path.exists(path): return None
+
+        meta = self._read_meta(key)
+        if size and os.path.getsize(path) != int(size): return None
+        if md5 and meta.get("md5") != md5: return None
+
+        os.utime(path, None)  # Mark as recently used (LRU)
+        return path
+
+    def fetch(self, key, download_fn, md5=None, size=None):
+        """
+        Returns a local path for `key`, calling download_fn(dest) -> bool only
+        on a cache miss. The download goes to a .part file and is renamed in
+        place once verified, so readers never see half a video.
+        """
+        with self._lock(key):
+            hit = self.get(key, md5, size)
+            if hit:
+                print(f"      ♻️ Cache hit: {key}")
+                return hit
+
+            path = self.path_for(key)
+            tmp = f"{path}.{os.getpid()}.part"
+            try:
+                if not download_fn(tmp) or not os.path.exists(tmp):
+                    return None
+
+                actual_md5 = file_md5(tmp)
+                if size and os.path.getsize(tmp) != int(size):
+                    print(f"      ❌ Size mismatch for {key}, discarding download.")
+                    return None
+                if md5 and actual_md5 != md5:
+                    print(f"      ❌ MD5 mismatch for {key}, discarding download.")
+                    return None
+
+                os.replace(tmp, path)
+                with open(path + ".json", "w") as f:
+                    json.dump({"md5": actual_md5, "size": os.path.getsize(path)}, f)
+            finally:
+                if os.path.exists(tmp): os.remove(tmp)
+
+        self.evict(keep=key)
+        return path
+
+    def evict(self, keep=None):
+        """Drops least recently used videos until the cache fits the byte budget"""
+        with self._lock("_evict"):
+            files = []
+            for name in os.listdir(self.cache_dir):
+                if not name.endswith(".mp4"): continue
+                full = os.path.join(self.cache_dir, name)
+                try:
+                    st = os.stat(full)
+                    files.append((st.st_mtime, st.st_size, name[:-4], full))
+                except FileNotFoundError:
+                    continue
+
+            total = sum(f[1] for f in files)
+            now = time.time()
+            for mtime, size, key, full in sorted(files):
+                if total <= self.max_bytes: break
+                if key == keep or now - mtime < IN_USE_GRACE: continue
+                # Lock files stay: deleting one could split lockers across two inodes
+                with self._lock(key):
+                    for path in (full, full + ".json"):
+                        if os.path.exists(path): os.remove(path)
+                total -= size
+                print(f"      🧹 Evicted {key} from video cache.")
+
+VIDEO_CACHE = VideoCache()
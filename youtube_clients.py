@@ -0,0 +1,63 @@
+import threading
+from datetime import datetime, timedelta
+from contextlib import contextmanager
+from google.oauth2.credentials import Credentials as UserCredentials
+from google.auth.transport.requests import Request
+from googleapiclient.discovery import build
+
+# ==============================================================================
+# 🔴 YOUTUBE CLIENT POOL (ONE LOGIN PER BRAND, NOT PER VIDEO)
+# ==============================================================================
+
+class YouTubeClientPool:
+    """
+    Per-brand YouTube clients shared by uploads and analytics.
+    Credentials are created once per brand and refreshed under a lock only
+    when the access token is about to expire. Built clients are lent out
+    one thread at a time (httplib2 is not thread-safe) and handed back
+    afterwards, so a client is only built when every existing one is busy.
+    """
+
+    def __init__(self, config, refresh_margin=300):
+        self.config = config  # Normalized (UPPERCASE) brand key -> OAuth secrets
+        self.refresh_margin = timedelta(seconds=refresh_margin)
+        self.lock = threading.Lock()
+        self._creds = {}
+        self._creds_locks = {}
+        self._idle = {}  # brand key -> [built clients not in use]
+
+    def _brand_lock(self, brand_key):
+        with self.lock:
+            return self._creds_locks.setdefault(brand_key, threading.Lock())
+
+    def credentials(self, brand_key):
+        """Brand credentials, refreshed only if expired or expiring soon"""
+        with self._brand_lock(brand_key):
+            creds = self._creds.get(brand_key)
+            if creds is None:
+                data = self.config[brand_key]
+                creds = self._creds[brand_key] = UserCredentials(
+                    None,
+                    refresh_token=data["refresh_token"],
+                    client_id=data["client_id"],
+                    client_secret=data["client_secret"],
+                    token_uri="https://oauth2.googleapis.com/token",
+                )
+            if not creds.token or not creds.expiry or creds.expiry - datetime.utcnow() < self.refresh_margin:
+                creds.refresh(Request())
+            return creds
+
+    @contextmanager
+    def client(self, brand_key):
+        """with pool.client("BRAND") as youtube: ..."""
+        creds = self.credentials(brand_key)
+        with self.lock:
+            idle = self._idle.setdefault(brand_key, [])
+            youtube = idle.pop() if idle else None
+        if youtube is None:
+            youtube = build("youtube", "v3", credentials=creds)
+        try:
+            yield youtube
+        finally:
+            with self.lock:
+                self._idle[brand_key].append(youtube)
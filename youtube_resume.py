@@ -0,0 +1,80 @@
+import os
+import time
+import threading
+from googleapiclient.errors import HttpError
+from googleapiclient.http import MediaFileUpload
+from run_state import load_state, save_state
+from video_cache import file_md5
+
+# ==============================================================================
+# 🔴 RESUMABLE YOUTUBE UPLOADS (JOURNALED SESSION URI + OFFSET)
+# ==============================================================================
+
+# YouTube wants chunks in multiples of 256 KB
+_CHUNK_UNIT = 256 * 1024
+YT_CHUNK_SIZE = max(1, int(os.environ.get("YT_CHUNK_KB", "8192")) * 1024 // _CHUNK_UNIT) * _CHUNK_UNIT
+
+# YouTube keeps an upload session for about a week, we stop trusting it sooner
+YT_SESSION_TTL = int(os.environ.get("YT_SESSION_TTL_HOURS", "72")) * 3600
+
+JOURNAL_NAME = "yt_upload_journal"
+_journal_lock = threading.Lock()  # Parallel fan-out uploads share one journal file
+
+def _journal_update(key, entry=None):
+    """entry=None drops the key. Expired sessions are cleaned on every write."""
+    with _journal_lock:
+        journal = load_state(JOURNAL_NAME)
+        now = time.time()
+        journal = {k: v for k, v in journal.items() if now - v.get("created", 0) < YT_SESSION_TTL}
+        if entry is None: journal.pop(key, None)
+        else: journal[key] = entry
+        save_state(JOURNAL_NAME, journal)
+
+def has_pending_upload(row_key):
+    """True if an unfinished upload for this row is in the journal"""
+    now = time.time()
+    return any(k.startswith(f"{row_key}:") and now - v.get("created", 0) < YT_SESSION_TTL
+               for k, v in load_state(JOURNAL_NAME).items())
+
+def resumable_insert(youtube, body, file_path, row_key, part="snippet,status", chunk_size=YT_CHUNK_SIZE):
+    """
+    videos().insert() in chunk_size pieces. The session URI and byte offset
+    go to the journal (keyed by row + file md5) after every chunk, so a
+    killed run resumes from the last byte YouTube acknowledged.
+    Returns the API response dict.
+    """
+    key = f"{row_key}:{file_md5(file_path)}"
+    saved = load_state(JOURNAL_NAME).get(key)
+    if saved and time.time() - saved.get("created", 0) >= YT_SESSION_TTL:
+        saved = None
+
+    for attempt in range(2):
+        media = MediaFileUpload(file_path, chunksize=chunk_size, resumable=True)
+        request = youtube.videos().insert(part=part, body=body, media_body=media)
+        if saved:
+            print(f"      ⏩ Resuming YT upload from journal ({saved.get('progress', 0)} bytes acked last time)")
+            request.resumable_uri = saved["uri"]
+            # Makes next_chunk() ask YouTube for the real offset before sending
+            request._in_error_state = True
+
+        try:
+            response = None
+            while response is None:
+                status, response = request.next_chunk(num_retries=3)
+                if response is None and request.resumable_uri:
+                    saved = {"uri": request.resumable_uri, "progress": request.resumable_progress,
+                             "created": (saved or {}).get("created", time.time())}
+                    _journal_update(key, saved)
+                if status:
+                    print(f"      🚀 YT Uploading: {int(status.progress() * 100)}%")
+        except HttpError as e:
+            # Session expired/unknown on YouTube's side: start a fresh one once
+            if saved and attempt == 0 and e.resp.status in (400, 404, 410):
+                print(f"      ⚠️ YT session gone ({e.resp.status}), starting over.")
+                _journal_update(key, None)
+                saved = None
+                continue
+            raise
+
+        _journal_update(key, None)
+        return response